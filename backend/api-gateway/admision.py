@@ -0,0 +1,186 @@
+import asyncio
+import bisect
+import time
+import logging
+from collections import deque
+from typing import Dict, Optional
+from fastapi.responses import JSONResponse
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) del histograma de espera en cola
+BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class Rechazo(Exception):
+    def __init__(self, detalle: str, retry_after: int = 1):
+        super().__init__(detalle)
+        self.detalle = detalle
+        self.retry_after = retry_after
+
+
+class ClasePrioridad:
+    """Una clase de tráfico: cupos propios, cola acotada y deadline de espera"""
+
+    def __init__(self, nombre: str, prioridad: int, max_concurrencia: int, max_cola: int, deadline: float):
+        self.nombre = nombre
+        self.prioridad = prioridad
+        self.max_concurrencia = max_concurrencia
+        self.max_cola = max_cola
+        self.deadline = deadline
+        self.cola: deque = deque()
+        self.en_curso = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+        self.expiradas = 0
+        self.histograma = [0] * (len(BUCKETS_MS) + 1)
+
+    def observar_espera(self, segundos: float):
+        self.histograma[bisect.bisect_left(BUCKETS_MS, segundos * 1000)] += 1
+
+    def stats(self) -> Dict:
+        etiquetas = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "prioridad": self.prioridad,
+            "en_curso": self.en_curso,
+            "en_cola": len(self.cola),
+            "admitidas": self.admitidas,
+            "rechazadas_cola_llena": self.rechazadas,
+            "expiradas_en_cola": self.expiradas,
+            "espera_histograma": dict(zip(etiquetas, self.histograma)),
+        }
+
+
+class Admision:
+    """
+    Planificador de admisión del gateway.
+
+    Cada petición se clasifica (interactivo, bulk, ia...) y ocupa un cupo de
+    su clase y del total. Si no hay cupo espera en la cola de su clase hasta
+    su deadline; con la cola llena se descarta de inmediato (503). Al liberarse
+    un cupo se despacha primero la clase de mayor prioridad (menor número).
+    """
+
+    def __init__(self):
+        self.clases: Dict[str, ClasePrioridad] = {
+            nombre: ClasePrioridad(nombre, **c.model_dump())
+            for nombre, c in config.ADMISION_CLASES.items()
+        }
+        self.en_curso = 0
+
+    def clasificar(self, path: str) -> Optional[str]:
+        if any(path.startswith(p) for p in config.ADMISION_EXENTAS):
+            return None
+        for prefijo, clase in config.ADMISION_RUTAS.items():
+            if path.startswith(prefijo):
+                return clase
+        return config.ADMISION_CLASE_DEFECTO
+
+    def _hay_cupo(self, clase: ClasePrioridad) -> bool:
+        return (
+            self.en_curso < config.ADMISION_MAX_CONCURRENCIA
+            and clase.en_curso < clase.max_concurrencia
+        )
+
+    def _ocupar(self, clase: ClasePrioridad, espera: float):
+        self.en_curso += 1
+        clase.en_curso += 1
+        clase.admitidas += 1
+        clase.observar_espera(espera)
+
+    async def entrar(self, nombre: str):
+        clase = self.clases[nombre]
+
+        # Sin nadie antes en la fila (misma clase o clases prioritarias) se admite directo
+        if self._hay_cupo(clase) and not self._esperando(clase):
+            self._ocupar(clase, 0.0)
+            return
+
+        if len(clase.cola) >= clase.max_cola:
+            clase.rechazadas += 1
+            raise Rechazo(f"Gateway saturado ({nombre})")
+
+        futuro = asyncio.get_running_loop().create_future()
+        entrada = (futuro, time.perf_counter())
+        clase.cola.append(entrada)
+        self._despachar()
+        try:
+            await asyncio.wait_for(asyncio.shield(futuro), timeout=clase.deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if futuro.done():
+                # Se le asignó cupo justo al vencer: se devuelve
+                self.salir(nombre)
+            else:
+                futuro.cancel()
+                clase.cola.remove(entrada)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            clase.expiradas += 1
+            raise Rechazo(f"Tiempo de espera agotado en la cola ({nombre})", retry_after=int(clase.deadline) or 1)
+
+    def salir(self, nombre: str):
+        clase = self.clases[nombre]
+        self.en_curso -= 1
+        clase.en_curso -= 1
+        self._despachar()
+
+    def _esperando(self, clase: ClasePrioridad) -> bool:
+        if clase.cola:
+            return True
+        return any(
+            c.cola and c.en_curso < c.max_concurrencia
+            for c in self.clases.values()
+            if c.prioridad < clase.prioridad
+        )
+
+    def _despachar(self):
+        for clase in sorted(self.clases.values(), key=lambda c: c.prioridad):
+            while clase.cola and self._hay_cupo(clase):
+                futuro, encolada = clase.cola.popleft()
+                self._ocupar(clase, time.perf_counter() - encolada)
+                futuro.set_result(True)
+            if self.en_curso >= config.ADMISION_MAX_CONCURRENCIA:
+                return
+
+    def stats(self) -> Dict:
+        return {
+            "en_curso": self.en_curso,
+            "max_concurrencia": config.ADMISION_MAX_CONCURRENCIA,
+            "clases": {nombre: c.stats() for nombre, c in self.clases.items()},
+        }
+
+
+class AdmisionMiddleware:
+    """Middleware ASGI: el cupo se mantiene mientras dura la respuesta completa"""
+
+    def __init__(self, app, admision: Admision):
+        self.app = app
+        self.admision = admision
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.ADMISION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        clase = self.admision.clasificar(scope["path"])
+        if clase is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.admision.entrar(clase)
+        except Rechazo as r:
+            logger.warning(r.detalle)
+            response = JSONResponse(
+                {"detail": r.detalle},
+                status_code=503,
+                headers={"Retry-After": str(r.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admision.salir(clase)
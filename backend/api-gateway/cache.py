@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Caché LRU acotada por número de entradas (y opcionalmente por bytes),
+    con expiración por entrada.
+
+    No es thread-safe: está pensada para usarse desde el event loop.
+    """
+
+    def __init__(self, max_items: int, ttl: float, max_bytes: Optional[int] = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entrada = self._data.get(key)
+        if entrada is None:
+            self.misses += 1
+            return None
+
+        valor, expira, _ = entrada
+        if expira <= time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return valor
+
+    def set(self, key: Hashable, valor: Any, ttl: Optional[float] = None, size: int = 0):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        self.pop(key)
+        self._data[key] = (valor, time.monotonic() + ttl, size)
+        self.bytes += size
+
+        while len(self._data) > self.max_items or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            _, (_, _, liberados) = self._data.popitem(last=False)
+            self.bytes -= liberados
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        entrada = self._data.pop(key, None)
+        if entrada is not None:
+            self.bytes -= entrada[2]
+
+    def pop_where(self, condicion: Callable[[Hashable], bool]) -> int:
+        """Elimina las entradas cuya clave cumple la condición"""
+        claves = [key for key in self._data if condicion(key)]
+        for key in claves:
+            self.pop(key)
+        return len(claves)
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        return {
+            "entradas": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
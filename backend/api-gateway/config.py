@@ -0,0 +1,108 @@
+from pydantic_settings import BaseSettings
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List
+
+class ClaseAdmision(BaseModel):
+    """Clase de prioridad del planificador de admisión"""
+    prioridad: int              # menor número = mayor prioridad
+    max_concurrencia: int
+    max_cola: int
+    deadline: float             # segundos máximos de espera en cola
+
+class Config(BaseSettings):
+    """Configuración centralizada del API Gateway"""
+
+    # ========== MICROSERVICIOS ==========
+    AUTH_URL: Optional[str] = None
+    CREAR_URL: Optional[str] = None
+    CONSULTAR_URL: Optional[str] = None
+    MODIFICAR_URL: Optional[str] = None
+    ELIMINAR_URL: Optional[str] = None
+    LOGS_URL: Optional[str] = None
+    RAG_URL: Optional[str] = None
+
+    @property
+    def UPSTREAMS(self) -> Dict[str, Optional[str]]:
+        return {
+            "auth": self.AUTH_URL,
+            "crear": self.CREAR_URL,
+            # Progreso (SSE) de las importaciones: conexiones largas con pool
+            # y bulkhead propios para no ocupar los cupos de "crear"
+            "importaciones": self.CREAR_URL,
+            "consultar": self.CONSULTAR_URL,
+            # Imágenes del almacén de fotos: descargas de bytes que no deben
+            # competir con las consultas por los cupos de "consultar"
+            "fotos": self.CONSULTAR_URL,
+            "modificar": self.MODIFICAR_URL,
+            "eliminar": self.ELIMINAR_URL,
+            "logs": self.LOGS_URL,
+            "rag": self.RAG_URL,
+        }
+
+    # ========== POOL DE CONEXIONES ==========
+    POOL_MAX_CONNECTIONS: int = Field(default=100)
+    POOL_MAX_KEEPALIVE: int = Field(default=20)
+    POOL_KEEPALIVE_EXPIRY: float = Field(default=30.0)
+    HTTP2_ENABLED: bool = Field(default=False)
+
+    # ========== VALIDACIÓN DE TOKENS ==========
+    # Con JWT_VERIFY_KEY la firma se valida localmente; si no, vía auth-service
+    JWT_VERIFY_KEY: Optional[str] = None
+    JWT_ALGORITHMS: List[str] = Field(default_factory=lambda: ["HS256"])
+    TOKEN_CACHE_TTL: float = Field(default=60.0)
+    TOKEN_CACHE_MAX: int = Field(default=10000)
+    # Secreto compartido para firmar la identidad enviada a los microservicios
+    # (obligatorio: sin él los servicios rechazan la identidad con 401)
+    GATEWAY_SHARED_SECRET: Optional[str] = None
+
+    # ========== CACHÉ DE PERSONAS ==========
+    PERSONAS_CACHE_ENABLED: bool = Field(default=True)
+    PERSONAS_CACHE_TTL: float = Field(default=30.0)
+    PERSONAS_CACHE_MAX_ITEMS: int = Field(default=1000)
+    PERSONAS_CACHE_MAX_BYTES: int = Field(default=64 * 1024 * 1024)
+
+    # ========== CARGA DE ARCHIVOS ==========
+    UPLOAD_MAX_BYTES: int = Field(default=256 * 1024 * 1024)
+    UPLOAD_CHUNK_SIZE: int = Field(default=64 * 1024)
+
+    # ========== CIRCUIT BREAKERS Y BULKHEADS ==========
+    BREAKER_WINDOW: int = Field(default=20)
+    BREAKER_MIN_CALLS: int = Field(default=10)
+    BREAKER_FAILURE_RATIO: float = Field(default=0.5)
+    BREAKER_SLOW_CALL_SECONDS: float = Field(default=10.0)
+    BREAKER_OPEN_SECONDS: float = Field(default=30.0)
+    BREAKER_HALF_OPEN_CALLS: int = Field(default=1)
+    # Máximo de llamadas concurrentes por upstream, ej: {"rag": 10}
+    BULKHEAD_DEFAULT: int = Field(default=50)
+    BULKHEAD_LIMITS: Dict[str, int] = Field(default_factory=lambda: {"rag": 10})
+    BULKHEAD_MAX_WAIT: float = Field(default=0.5)
+
+    # ========== ADMISIÓN Y PRIORIDADES ==========
+    ADMISION_ENABLED: bool = Field(default=True)
+    ADMISION_MAX_CONCURRENCIA: int = Field(default=200)
+    ADMISION_CLASES: Dict[str, ClaseAdmision] = Field(default_factory=lambda: {
+        "interactivo": ClaseAdmision(prioridad=0, max_concurrencia=150, max_cola=500, deadline=2.0),
+        "bulk": ClaseAdmision(prioridad=1, max_concurrencia=4, max_cola=10, deadline=30.0),
+        "ia": ClaseAdmision(prioridad=2, max_concurrencia=8, max_cola=20, deadline=10.0),
+    })
+    # Prefijo de ruta -> clase; lo que no coincide va a la clase por defecto
+    ADMISION_RUTAS: Dict[str, str] = Field(default_factory=lambda: {
+        "/personas/crear-todas": "bulk",
+        "/consulta-natural": "ia",
+    })
+    ADMISION_CLASE_DEFECTO: str = Field(default="interactivo")
+    # Los streams de eventos duran lo que dura la importación: no ocupan cupo
+    ADMISION_EXENTAS: List[str] = Field(default_factory=lambda: ["/health", "/gateway/", "/eventos/"])
+
+    # ========== TIMEOUTS ==========
+    # Sin valor = sin timeout (comportamiento histórico del gateway).
+    # UPSTREAM_TIMEOUTS permite sobreescribirlo por servicio, ej: {"rag": 60}
+    UPSTREAM_TIMEOUT: Optional[float] = None
+    UPSTREAM_TIMEOUTS: Dict[str, float] = Field(default_factory=dict)
+    POOL_ACQUIRE_TIMEOUT: Optional[float] = None
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+
+config = Config()
@@ -1,35 +1,42 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from contextlib import asynccontextmanager
 import httpx
 import logging
-from typing import Optional
-from pydantic_settings import BaseSettings
-from pydantic import Field
+import secrets
+from typing import Optional, AsyncIterator
 from fastapi import File, UploadFile, Form
-# =====================================================
-# CONFIGURACIÓN CENTRALIZADA
-# =====================================================
-class Config(BaseSettings):
-    AUTH_URL: Optional[str] = None
-    CREAR_URL: Optional[str] = None
-    CONSULTAR_URL: Optional[str] = None
-    MODIFICAR_URL: Optional[str] = None
-    ELIMINAR_URL: Optional[str] = None
-    LOGS_URL: Optional[str] = None
-    RAG_URL: Optional[str] = None
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from config import config
+from upstream_pool import UpstreamPools
+from token_edge import TokenVerifier, Identidad
+from persona_cache import PersonaCache
+from compartido.singleflight import SingleFlight
+from resiliencia import Resiliencia
+from admision import Admision, AdmisionMiddleware
 
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
+pools = UpstreamPools()
+resiliencia = Resiliencia()
+verifier = TokenVerifier(pools, resiliencia)
+persona_cache = PersonaCache()
+coalescer = SingleFlight()
+admision = Admision()
 
-config = Config()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await pools.iniciar()
+    yield
+    await pools.cerrar()
 
 # =====================================================
 # FASTAPI
 # =====================================================
-app = FastAPI(title="API Gateway")
+app = FastAPI(title="API Gateway", lifespan=lifespan)
 
+# Se registra antes que CORS para que los 503 de admisión lleven sus cabeceras
+app.add_middleware(AdmisionMiddleware, admision=admision)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -41,124 +48,477 @@ app.add_middleware(
 security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
+async def verificar_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Identidad:
+    """Valida el token en el borde (firma local o auth-service con caché)"""
+    return await verifier.verificar(credentials.credentials)
+
 # =====================================================
 # FUNCIONES AUXILIARES
 # =====================================================
-async def _forward_request(
+# Cabeceras que no se deben reenviar entre saltos (RFC 7230) o que el
+# servidor del gateway vuelve a generar
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "date", "server",
+}
+
+async def _proxy_request(
     method: str,
-    url: str,
-    token: Optional[str] = None,
+    upstream: str,
+    path: str,
+    identidad: Optional[Identidad] = None,
     json: Optional[dict] = None,
     params: Optional[dict] = None,
-    files: Optional[dict] = None,
-    data: Optional[dict] = None,
+    content: Optional[AsyncIterator[bytes]] = None,
+    content_type: Optional[str] = None,
+    accept: Optional[str] = None,
+    extra_headers: Optional[dict] = None,
 ):
-    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    """
+    Proxy en streaming: reenvía status, cabeceras y el cuerpo por chunks
+    tal cual llega del microservicio, sin decodificar ni re-serializar JSON.
+    """
+    headers = identidad.headers() if identidad else {}
+    headers.update(extra_headers or {})
+    if content_type:
+        headers["Content-Type"] = content_type
+    if accept:
+        headers["Accept"] = accept
 
+    client = pools.get(upstream)
+    if client is None:
+        raise HTTPException(status_code=503, detail=f"Servicio no configurado: {upstream}")
+
+    request = client.build_request(
+        method, path, params=params, json=json, content=content, headers=headers
+    )
+    permiso = await resiliencia.entrar(upstream)
     try:
-        async with httpx.AsyncClient(timeout=None) as client:
-            response = await client.request(
-                method,
-                url,
-                params=params,
-                json=json,
-                data=data,
-                files=files,
-                headers=headers,
-                follow_redirects=True,
-            )
+        response = await client.send(request, stream=True, follow_redirects=True)
+    except httpx.RequestError:
+        permiso.registrar(False)
+        permiso.liberar()
+        raise HTTPException(status_code=503, detail=f"Servicio no disponible: {upstream}{path}")
+    except BaseException:
+        permiso.liberar()
+        raise
+    permiso.registrar(response.status_code < 500)
 
-            # Levanta error si el microservicio respondió 4xx o 5xx
-            response.raise_for_status()
+    # El cupo del bulkhead se mantiene hasta terminar de reenviar el cuerpo.
+    # cerrar() corre al terminar relay() y como tarea de fondo (por si el
+    # cuerpo nunca se empezó a enviar); solo la primera llamada cierra
+    cerrado = False
 
-            # 🔥 Si la respuesta es JSON, devuélvelo como dict
-            if "application/json" in response.headers.get("content-type", ""):
-                return response.json()
+    async def cerrar():
+        nonlocal cerrado
+        if cerrado:
+            return
+        cerrado = True
+        await response.aclose()
+        permiso.liberar()
 
-            # 🔥 Si no (ej: texto), retorna el contenido bruto
-            return response.text
+    async def relay():
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        finally:
+            await cerrar()
 
-    except httpx.RequestError:
-        raise HTTPException(status_code=503, detail=f"Servicio no disponible: {url}")
+    return StreamingResponse(
+        relay(),
+        status_code=response.status_code,
+        headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP},
+        background=BackgroundTask(cerrar),
+    )
+
+NDJSON = "application/x-ndjson"
+
+def _acepta_ndjson(accept: Optional[str]) -> bool:
+    """Las lecturas NDJSON no se cachean ni colapsan: se reenvían en streaming"""
+    return bool(accept) and NDJSON in accept
+
+async def _cached_read(
+    clave: tuple,
+    upstream: str,
+    path: str,
+    identidad: Identidad,
+    documento: str,
+    params: Optional[dict] = None,
+):
+    """
+    Lectura read-through: sirve desde la caché de personas si hay entrada
+    vigente y, si no, consulta al microservicio y guarda las respuestas 200.
+    """
+    cacheada = persona_cache.get(clave)
+    if cacheada is not None:
+        status, cuerpo, content_type = cacheada
+        return Response(
+            cuerpo,
+            status_code=status,
+            headers={"Content-Type": content_type, "X-Cache": "HIT"},
+            # La consulta no llega a consultar-service, se audita desde aquí
+            # (igual que las lecturas colapsadas en la de otra petición)
+            background=BackgroundTask(_registrar_consulta, identidad, documento),
+        )
 
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(
-            status_code=e.response.status_code,
-            detail=e.response.text
+    generacion = persona_cache.generacion
+    status, cuerpo, content_type, compartida = await _coalesced_read(clave, upstream, path, identidad, params)
+    if status == 200:
+        persona_cache.set(clave, status, cuerpo, content_type, generacion)
+
+    return Response(
+        cuerpo,
+        status_code=status,
+        headers={"Content-Type": content_type, "X-Cache": "MISS"},
+        background=BackgroundTask(_registrar_consulta, identidad, documento) if compartida else None,
+    )
+
+async def _coalesced_read(
+    clave: tuple,
+    upstream: str,
+    path: str,
+    identidad: Identidad,
+    params: Optional[dict] = None,
+):
+    """
+    GET bufferizado y colapsado: lecturas idénticas en vuelo (misma ruta,
+    parámetros y ámbito del usuario) comparten una sola llamada al upstream.
+    Retorna (status, cuerpo, content-type, compartida), donde compartida
+    indica que la respuesta vino de la llamada de otra petición.
+    """
+    client = pools.get(upstream)
+    if client is None:
+        raise HTTPException(status_code=503, detail=f"Servicio no configurado: {upstream}")
+
+    propia = False
+
+    async def leer():
+        nonlocal propia
+        propia = True
+        try:
+            async with resiliencia.proteger(upstream) as permiso:
+                response = await client.get(path, params=params, headers=identidad.headers(), follow_redirects=True)
+                permiso.registrar(response.status_code < 500)
+        except httpx.RequestError:
+            raise HTTPException(status_code=503, detail=f"Servicio no disponible: {upstream}{path}")
+        return (
+            response.status_code,
+            response.content,
+            response.headers.get("content-type", "application/json"),
         )
+
+    status, cuerpo, content_type = await coalescer.do(clave, leer)
+    return status, cuerpo, content_type, not propia
+
+async def _registrar_consulta(identidad: Identidad, documento: str):
+    client = pools.get("logs")
+    if client is None:
+        return
+    try:
+        async with resiliencia.proteger("logs") as permiso:
+            response = await client.post(
+                "/registrar",
+                json={
+                    "tipo_operacion": "CONSULTAR",
+                    "usuario_email": identidad.email,
+                    "documento_afectado": documento,
+                },
+                headers=identidad.headers(),
+            )
+            permiso.registrar(response.status_code < 500)
+    except Exception as e:
+        logger.warning(f"No se registró log: {str(e)}")
+
+async def _multipart_stream(
+    archivo: UploadFile, campos: dict, boundary: str
+) -> AsyncIterator[bytes]:
+    """
+    Genera el cuerpo multipart leyendo el archivo por chunks desde el spool
+    de Starlette, así el gateway nunca tiene el archivo completo en memoria.
+    """
+    for nombre, valor in campos.items():
+        yield (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{nombre}"\r\n\r\n'
+            f"{valor}\r\n"
+        ).encode("utf-8")
+
+    filename = (archivo.filename or "archivo").replace('"', "%22")
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="archivo"; filename="{filename}"\r\n'
+        f"Content-Type: {archivo.content_type or 'application/octet-stream'}\r\n\r\n"
+    ).encode("utf-8")
+
+    enviados = 0
+    while chunk := await archivo.read(config.UPLOAD_CHUNK_SIZE):
+        enviados += len(chunk)
+        if enviados > config.UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Archivo supera el tamaño máximo permitido")
+        yield chunk
+
+    yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
 # ===================================================
 # ENDPOINTS
 # =====================================================
 @app.post("/auth/login")
 async def login(request: dict):
-    return await _forward_request("POST", f"{config.AUTH_URL}/autenticar", json=request)
+    return await _proxy_request("POST", "auth", "/autenticar", json=request)
 
 @app.post("/auth/signup")
 async def signup(request: dict):
-    return await _forward_request("POST", f"{config.AUTH_URL}/signup", json=request)
+    return await _proxy_request("POST", "auth", "/signup", json=request)
 
 @app.post("/auth/verify-email")
 async def verify_email(request: dict):
-    return await _forward_request("POST", f"{config.AUTH_URL}/verify-email", json=request)
+    return await _proxy_request("POST", "auth", "/verify-email", json=request)
 
 @app.post("/personas/crear")
-async def crear_persona(request: dict, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request("POST", f"{config.CREAR_URL}/crear", token=credentials.credentials, json=request)
+async def crear_persona(request: dict, identidad: Identidad = Depends(verificar_token)):
+    respuesta = await _proxy_request("POST", "crear", "/crear", identidad=identidad, json=request)
+    persona_cache.invalidar(request.get("nro_doc"))
+    return respuesta
 
 @app.post("/personas/crear-todas")
 async def crear_persona_multiple(
     archivo: UploadFile = File(...),
     delimitador: str = Form(","),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    identidad: Identidad = Depends(verificar_token)
 ):
-    return await _forward_request(
-        "POST",
-        f"{config.CREAR_URL}/cargar-archivo",
-        token=credentials.credentials,
-        files={"archivo": (archivo.filename, await archivo.read(), archivo.content_type)},
-        data={"delimitador": delimitador}
+    if archivo.size is not None and archivo.size > config.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Archivo supera el tamaño máximo permitido")
+
+    boundary = secrets.token_hex(16)
+    respuesta = await _proxy_request(
+        "POST", "crear", "/cargar-archivo",
+        identidad=identidad,
+        content=_multipart_stream(archivo, {"delimitador": delimitador}, boundary),
+        content_type=f"multipart/form-data; boundary={boundary}",
+    )
+    persona_cache.invalidar()
+    return respuesta
+
+# ========== IMPORTACIONES EN SEGUNDO PLANO ==========
+# La versión asíncrona de crear-todas: responde 202 con el id de la
+# importación y la carga sigue en crear-service aunque el cliente se vaya.
+
+@app.post("/personas/crear-todas/importaciones")
+async def crear_importacion(
+    archivo: UploadFile = File(...),
+    delimitador: str = Form(","),
+    identidad: Identidad = Depends(verificar_token)
+):
+    if archivo.size is not None and archivo.size > config.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Archivo supera el tamaño máximo permitido")
+
+    boundary = secrets.token_hex(16)
+    respuesta = await _proxy_request(
+        "POST", "crear", "/importaciones",
+        identidad=identidad,
+        content=_multipart_stream(archivo, {"delimitador": delimitador}, boundary),
+        content_type=f"multipart/form-data; boundary={boundary}",
+    )
+    # Las inserciones siguen después de responder: las lecturas en caché
+    # quedan acotadas por PERSONAS_CACHE_TTL
+    persona_cache.invalidar()
+    return respuesta
+
+@app.get("/personas/importaciones")
+async def listar_importaciones(identidad: Identidad = Depends(verificar_token)):
+    return await _proxy_request("GET", "crear", "/importaciones", identidad=identidad)
+
+@app.get("/personas/importaciones/{id_importacion}")
+async def progreso_importacion(id_importacion: str, identidad: Identidad = Depends(verificar_token)):
+    return await _proxy_request("GET", "crear", f"/importaciones/{id_importacion}", identidad=identidad)
+
+@app.get("/personas/importaciones/{id_importacion}/errores")
+async def errores_importacion(id_importacion: str, identidad: Identidad = Depends(verificar_token)):
+    return await _proxy_request("GET", "crear", f"/importaciones/{id_importacion}/errores", identidad=identidad)
+
+@app.post("/personas/importaciones/{id_importacion}/cancelar")
+async def cancelar_importacion(id_importacion: str, identidad: Identidad = Depends(verificar_token)):
+    return await _proxy_request("POST", "crear", f"/importaciones/{id_importacion}/cancelar", identidad=identidad)
+
+@app.post("/personas/importaciones/{id_importacion}/reanudar")
+async def reanudar_importacion(id_importacion: str, identidad: Identidad = Depends(verificar_token)):
+    respuesta = await _proxy_request("POST", "crear", f"/importaciones/{id_importacion}/reanudar", identidad=identidad)
+    persona_cache.invalidar()
+    return respuesta
+
+@app.get("/eventos/importaciones/{id_importacion}")
+async def eventos_importacion(id_importacion: str, identidad: Identidad = Depends(verificar_token)):
+    """Progreso en Server-Sent Events, reenviado chunk a chunk sin buffer"""
+    return await _proxy_request(
+        "GET", "importaciones", f"/importaciones/{id_importacion}/eventos",
+        identidad=identidad,
+        accept="text/event-stream",
     )
 
 @app.get("/personas/consultar/{nro_doc}")
-async def consultar_persona(nro_doc: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request("GET", f"{config.CONSULTAR_URL}/consultar/{nro_doc}", token=credentials.credentials)
+async def consultar_persona(
+    nro_doc: str,
+    fields: Optional[str] = None,
+    identidad: Identidad = Depends(verificar_token)
+):
+    params = {"fields": fields} if fields else None
+    clave = persona_cache.clave_documento(identidad, nro_doc, fields)
+    return await _cached_read(clave, "consultar", f"/consultar/{nro_doc}", identidad, nro_doc, params)
 
 @app.get("/personas/consultar-todas")
-async def consultar_persona2(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request("GET", f"{config.CONSULTAR_URL}/consultar_todas", token=credentials.credentials)
+async def consultar_persona2(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    identidad: Identidad = Depends(verificar_token)
+):
+    params = {k: v for k, v in {"limit": limit, "cursor": cursor, "fields": fields}.items() if v is not None}
+    if _acepta_ndjson(accept):
+        return await _proxy_request(
+            "GET", "consultar", "/consultar_todas", identidad=identidad,
+            params={"fields": fields} if fields else None, accept=NDJSON
+        )
+    clave = persona_cache.clave_todas(identidad, limit, cursor, fields)
+    return await _cached_read(clave, "consultar", "/consultar_todas", identidad, "TODOS", params)
+
+@app.get("/personas/fotos/{hash_foto}")
+async def foto_persona(
+    hash_foto: str,
+    ancho: Optional[int] = None,
+    range: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    identidad: Identidad = Depends(verificar_token)
+):
+    """
+    Foto del almacén (o su miniatura). Pide token como el resto de las
+    rutas de personas: el frontend la descarga con fetch y la muestra como
+    blob. Se reenvían las cabeceras condicionales y de rango para que el
+    navegador reutilice su caché y pida por partes.
+    """
+    condicionales = {"Range": range, "If-Range": if_range, "If-None-Match": if_none_match}
+    return await _proxy_request(
+        "GET", "fotos", f"/fotos/{hash_foto}", identidad=identidad,
+        params={"ancho": ancho} if ancho is not None else None,
+        extra_headers={k: v for k, v in condicionales.items() if v is not None},
+    )
 
 @app.put("/personas/modificar/{nro_doc}")
-async def modificar_persona(nro_doc: str, request: dict, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request("PUT", f"{config.MODIFICAR_URL}/modificar/{nro_doc}", token=credentials.credentials, json=request)
+async def modificar_persona(nro_doc: str, request: dict, identidad: Identidad = Depends(verificar_token)):
+    respuesta = await _proxy_request("PUT", "modificar", f"/modificar/{nro_doc}", identidad=identidad, json=request)
+    persona_cache.invalidar(nro_doc)
+    return respuesta
 
 @app.delete("/personas/eliminar/{nro_doc}")
-async def eliminar_persona(nro_doc: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request("DELETE", f"{config.ELIMINAR_URL}/eliminar/{nro_doc}", token=credentials.credentials)
+async def eliminar_persona(nro_doc: str, identidad: Identidad = Depends(verificar_token)):
+    respuesta = await _proxy_request("DELETE", "eliminar", f"/eliminar/{nro_doc}", identidad=identidad)
+    persona_cache.invalidar(nro_doc)
+    return respuesta
 
 @app.post("/consulta-natural")
-async def consulta_natural(request: dict, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request("POST", f"{config.RAG_URL}/consultar", token=credentials.credentials, json=request)
+async def consulta_natural(request: dict, identidad: Identidad = Depends(verificar_token)):
+    return await _proxy_request("POST", "rag", "/consultar", identidad=identidad, json=request)
 
 @app.post("/logs/registrar")
-async def registrar_log(request: dict, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request("POST", f"{config.LOGS_URL}/registrar", token=credentials.credentials, json=request)
+async def registrar_log(request: dict, identidad: Identidad = Depends(verificar_token)):
+    return await _proxy_request("POST", "logs", "/registrar", identidad=identidad, json=request)
 
 @app.get("/logs")
 async def consultar_logs(
     tipo_operacion: Optional[str] = None,
     documento: Optional[str] = None,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    identidad: Identidad = Depends(verificar_token)
+):
+    params = {k: v for k, v in {
+        "tipo_operacion": tipo_operacion, "documento": documento,
+        "fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta,
+        "limit": limit, "cursor": cursor,
+    }.items() if v is not None}
+    if _acepta_ndjson(accept):
+        return await _proxy_request("GET", "logs", "/consultar", identidad=identidad, params=params, accept=NDJSON)
+    clave = ("logs", "/consultar", tipo_operacion, documento, fecha_desde, fecha_hasta, limit, cursor, identidad.scope)
+    status, cuerpo, content_type, _ = await _coalesced_read(clave, "logs", "/consultar", identidad, params)
+    return Response(cuerpo, status_code=status, headers={"Content-Type": content_type})
+
+@app.get("/logs/estadisticas")
+async def estadisticas_logs(
+    granularidad: Optional[str] = None,
+    tipo_operacion: Optional[str] = None,
+    usuario_email: Optional[str] = None,
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    detalle: Optional[bool] = None,
+    identidad: Identidad = Depends(verificar_token)
 ):
-    params = {"tipo_operacion": tipo_operacion, "documento": documento}
-    return await _forward_request("GET", f"{config.LOGS_URL}/consultar", token=credentials.credentials, params=params)
+    params = {k: v for k, v in {
+        "granularidad": granularidad, "tipo_operacion": tipo_operacion,
+        "usuario_email": usuario_email, "fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta,
+        "detalle": detalle,
+    }.items() if v is not None}
+    clave = ("logs", "/estadisticas", granularidad, tipo_operacion, usuario_email, fecha_desde, fecha_hasta, detalle, identidad.scope)
+    status, cuerpo, content_type, _ = await _coalesced_read(clave, "logs", "/estadisticas", identidad, params)
+    return Response(cuerpo, status_code=status, headers={"Content-Type": content_type})
 
 @app.get("/logs/usuario/{usuario_email}")
-async def consultar_logs_usuario(usuario_email: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    return await _forward_request(
-        "GET", f"{config.LOGS_URL}/consultar-por-usuario",
-        token=credentials.credentials,
-        params={"usuario_email": usuario_email}
+async def consultar_logs_usuario(
+    usuario_email: str,
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    identidad: Identidad = Depends(verificar_token)
+):
+    params = {k: v for k, v in {
+        "usuario_email": usuario_email, "fecha_desde": fecha_desde,
+        "fecha_hasta": fecha_hasta, "limit": limit, "cursor": cursor,
+    }.items() if v is not None}
+    if _acepta_ndjson(accept):
+        return await _proxy_request(
+            "GET", "logs", "/consultar-por-usuario", identidad=identidad,
+            params=params, accept=NDJSON
+        )
+    clave = ("logs", "/consultar-por-usuario", usuario_email, fecha_desde, fecha_hasta, limit, cursor, identidad.scope)
+    status, cuerpo, content_type, _ = await _coalesced_read(
+        clave, "logs", "/consultar-por-usuario", identidad, params=params
     )
+    return Response(cuerpo, status_code=status, headers={"Content-Type": content_type})
+
+@app.get("/gateway/pools")
+async def estado_pools():
+    """Ocupación y tiempos de espera de los pools hacia cada microservicio"""
+    return pools.estado()
+
+@app.get("/gateway/tokens")
+async def estado_tokens():
+    """Modo de validación y métricas de la caché de tokens"""
+    return verifier.stats()
+
+@app.get("/gateway/cache")
+async def estado_cache():
+    """Hits, misses, evictions e invalidaciones de la caché de personas"""
+    return persona_cache.stats()
+
+@app.get("/gateway/coalescing")
+async def estado_coalescing():
+    """Lecturas al upstream realizadas y lecturas colapsadas en ellas"""
+    return coalescer.stats()
+
+@app.get("/gateway/circuitos")
+async def estado_circuitos():
+    """Estado de los circuit breakers y bulkheads de cada upstream"""
+    return resiliencia.stats()
+
+@app.get("/gateway/admision")
+async def estado_admision():
+    """Cupos, profundidad de cola e histograma de espera por clase"""
+    return admision.stats()
 
 @app.get("/health")
 async def health_check():
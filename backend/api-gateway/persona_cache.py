@@ -0,0 +1,74 @@
+from typing import Dict, Optional, Tuple
+from cache import TTLCache
+from config import config
+from token_edge import Identidad
+
+
+class PersonaCache:
+    """
+    Caché read-through de las consultas de personas en el gateway.
+
+    Las claves van por usuario porque ROBLE aplica visibilidad por token.
+    Toda escritura que pasa por el gateway (crear, cargar archivo, modificar,
+    eliminar) invalida las entradas afectadas.
+    """
+
+    TODAS = "todas"
+    DOCUMENTO = "doc"
+
+    def __init__(self):
+        self.cache = TTLCache(
+            max_items=config.PERSONAS_CACHE_MAX_ITEMS,
+            ttl=config.PERSONAS_CACHE_TTL,
+            max_bytes=config.PERSONAS_CACHE_MAX_BYTES,
+        )
+        self.invalidaciones = 0
+        # Cambia con cada escritura; evita guardar lecturas que empezaron antes
+        self.generacion = 0
+
+    def clave_documento(self, identidad: Identidad, nro_doc: str, fields: Optional[str] = None) -> Tuple:
+        return (self.DOCUMENTO, identidad.scope, nro_doc, fields)
+
+    def clave_todas(
+        self,
+        identidad: Identidad,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Tuple:
+        # Cada página y cada proyección del listado es una entrada propia
+        return (self.TODAS, identidad.scope, limit, cursor, fields)
+
+    def get(self, clave: Tuple) -> Optional[Tuple[int, bytes, str]]:
+        """(status, cuerpo, content-type) cacheado o None"""
+        if not config.PERSONAS_CACHE_ENABLED:
+            return None
+        return self.cache.get(clave)
+
+    def set(self, clave: Tuple, status: int, cuerpo: bytes, content_type: str, generacion: int):
+        if not config.PERSONAS_CACHE_ENABLED or generacion != self.generacion:
+            return
+        self.cache.set(clave, (status, cuerpo, content_type), size=len(cuerpo))
+
+    def invalidar(self, nro_doc: Optional[str] = None):
+        """
+        Invalida los listados completos de todos los usuarios y, si se indica,
+        las consultas del documento; sin documento se vacía la caché.
+        """
+        self.generacion += 1
+        if nro_doc is None:
+            eliminadas = len(self.cache)
+            self.cache.clear()
+        else:
+            eliminadas = self.cache.pop_where(
+                lambda clave: clave[0] == self.TODAS
+                or (clave[0] == self.DOCUMENTO and clave[2] == nro_doc)
+            )
+        self.invalidaciones += eliminadas
+
+    def stats(self) -> Dict:
+        return {
+            "habilitada": config.PERSONAS_CACHE_ENABLED,
+            "invalidaciones": self.invalidaciones,
+            **self.cache.stats(),
+        }
@@ -0,0 +1,216 @@
+import asyncio
+import math
+import time
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+from fastapi import HTTPException
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por upstream sobre una ventana de las últimas llamadas.
+
+    Cuenta como falla un error de conexión, un 5xx o una llamada más lenta
+    que BREAKER_SLOW_CALL_SECONDS. Al superar BREAKER_FAILURE_RATIO se abre
+    y rechaza todo durante BREAKER_OPEN_SECONDS; luego deja pasar unas pocas
+    llamadas de prueba (semiabierto) que deciden si se cierra o se reabre.
+    """
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.estado = self.CERRADO
+        self.ventana = deque(maxlen=config.BREAKER_WINDOW)
+        self.abierto_desde = 0.0
+        self.pruebas_en_curso = 0
+        self.aperturas = 0
+        self.rechazos = 0
+
+    def permitir(self) -> bool:
+        """True si la llamada puede pasar (en semiabierto, como llamada de prueba)"""
+        if self.estado == self.ABIERTO:
+            if time.monotonic() - self.abierto_desde < config.BREAKER_OPEN_SECONDS:
+                self.rechazos += 1
+                return False
+            self.estado = self.SEMIABIERTO
+            self.pruebas_en_curso = 0
+            logger.info(f"Circuito '{self.nombre}' semiabierto")
+
+        if self.estado == self.SEMIABIERTO:
+            if self.pruebas_en_curso >= config.BREAKER_HALF_OPEN_CALLS:
+                self.rechazos += 1
+                return False
+            self.pruebas_en_curso += 1
+
+        return True
+
+    def registrar(self, exito: bool, prueba: bool):
+        if prueba:
+            if self.estado != self.SEMIABIERTO:
+                return
+            self.pruebas_en_curso -= 1
+            if exito:
+                self._cerrar()
+            else:
+                self._abrir()
+            return
+
+        if self.estado != self.CERRADO:
+            return
+
+        self.ventana.append(exito)
+        fallas = self.ventana.count(False)
+        if (
+            len(self.ventana) >= config.BREAKER_MIN_CALLS
+            and fallas / len(self.ventana) >= config.BREAKER_FAILURE_RATIO
+        ):
+            self._abrir()
+
+    def retry_after(self) -> int:
+        restante = config.BREAKER_OPEN_SECONDS - (time.monotonic() - self.abierto_desde)
+        return max(1, math.ceil(restante))
+
+    def _abrir(self):
+        self.estado = self.ABIERTO
+        self.abierto_desde = time.monotonic()
+        self.aperturas += 1
+        logger.warning(f"Circuito '{self.nombre}' abierto")
+
+    def _cerrar(self):
+        self.estado = self.CERRADO
+        self.ventana.clear()
+        logger.info(f"Circuito '{self.nombre}' cerrado")
+
+    def stats(self) -> Dict:
+        return {
+            "estado": self.estado,
+            "llamadas_ventana": len(self.ventana),
+            "fallas_ventana": self.ventana.count(False),
+            "aperturas": self.aperturas,
+            "rechazos": self.rechazos,
+        }
+
+
+class Bulkhead:
+    """Límite de llamadas concurrentes hacia un upstream"""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.limite = config.BULKHEAD_LIMITS.get(nombre, config.BULKHEAD_DEFAULT)
+        self.semaforo = asyncio.Semaphore(self.limite)
+        self.en_uso = 0
+        self.rechazos = 0
+
+    async def adquirir(self) -> bool:
+        try:
+            await asyncio.wait_for(self.semaforo.acquire(), timeout=config.BULKHEAD_MAX_WAIT)
+        except asyncio.TimeoutError:
+            self.rechazos += 1
+            return False
+        self.en_uso += 1
+        return True
+
+    def liberar(self):
+        self.en_uso -= 1
+        self.semaforo.release()
+
+    def stats(self) -> Dict:
+        return {"limite": self.limite, "en_uso": self.en_uso, "rechazos": self.rechazos}
+
+
+class Permiso:
+    """Una llamada admitida: registra su resultado y libera el bulkhead una sola vez"""
+
+    def __init__(self, breaker: CircuitBreaker, bulkhead: Bulkhead, prueba: bool):
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+        self.prueba = prueba
+        self.inicio = time.perf_counter()
+        self.registrado = False
+        self.liberado = False
+
+    def registrar(self, exito: bool):
+        if self.registrado:
+            return
+        self.registrado = True
+        if time.perf_counter() - self.inicio > config.BREAKER_SLOW_CALL_SECONDS:
+            exito = False
+        self.breaker.registrar(exito, self.prueba)
+
+    def liberar(self):
+        if self.liberado:
+            return
+        self.liberado = True
+        self.bulkhead.liberar()
+        # Una prueba que no llegó a registrar resultado (ej: cancelada) no
+        # debe dejar el circuito semiabierto bloqueado
+        if self.prueba and not self.registrado and self.breaker.estado == CircuitBreaker.SEMIABIERTO:
+            self.breaker.pruebas_en_curso -= 1
+
+
+class Resiliencia:
+    """Circuit breaker + bulkhead de cada upstream del gateway"""
+
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.bulkheads: Dict[str, Bulkhead] = {}
+
+    def _de(self, upstream: str):
+        if upstream not in self.breakers:
+            self.breakers[upstream] = CircuitBreaker(upstream)
+            self.bulkheads[upstream] = Bulkhead(upstream)
+        return self.breakers[upstream], self.bulkheads[upstream]
+
+    async def entrar(self, upstream: str) -> Permiso:
+        """Admite la llamada o falla rápido con 503 + Retry-After"""
+        breaker, bulkhead = self._de(upstream)
+
+        if not breaker.permitir():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Servicio {upstream} temporalmente no disponible",
+                headers={"Retry-After": str(breaker.retry_after())},
+            )
+
+        prueba = breaker.estado == CircuitBreaker.SEMIABIERTO
+        if not await bulkhead.adquirir():
+            if prueba:
+                breaker.pruebas_en_curso -= 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Servicio {upstream} saturado",
+                headers={"Retry-After": "1"},
+            )
+
+        return Permiso(breaker, bulkhead, prueba)
+
+    @asynccontextmanager
+    async def proteger(self, upstream: str):
+        """
+        Para llamadas bufferizadas: el llamador registra el resultado con
+        permiso.registrar(); una excepción sin registrar cuenta como falla.
+        """
+        permiso = await self.entrar(upstream)
+        try:
+            yield permiso
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            permiso.registrar(False)
+            raise
+        finally:
+            permiso.liberar()
+
+    def stats(self) -> Dict:
+        return {
+            nombre: {**self.breakers[nombre].stats(), "bulkhead": self.bulkheads[nombre].stats()}
+            for nombre in self.breakers
+        }
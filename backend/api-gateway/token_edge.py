@@ -0,0 +1,131 @@
+import hashlib
+import hmac
+import time
+import logging
+import httpx
+import jwt
+from typing import Dict, Optional
+from fastapi import HTTPException
+from cache import TTLCache
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Identidad:
+    """Usuario validado en el borde, que se propaga a los microservicios"""
+
+    def __init__(self, token: str, email: str, exp: Optional[int] = None):
+        self.token = token
+        self.email = email
+        self.exp = exp
+
+    @property
+    def scope(self) -> str:
+        """Ámbito de visibilidad del usuario (ROBLE filtra por token)"""
+        if self.email and self.email != "desconocido":
+            return self.email
+        return hashlib.sha256(self.token.encode("utf-8")).hexdigest()
+
+    def headers(self) -> Dict[str, str]:
+        """Authorization más la identidad en cabeceras de confianza"""
+        exp = str(self.exp or "")
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "X-Usuario-Email": self.email,
+            "X-Token-Exp": exp,
+        }
+        if config.GATEWAY_SHARED_SECRET:
+            headers["X-Identidad-Firma"] = firmar_identidad(self.email, exp, self.token)
+        return headers
+
+
+def firmar_identidad(email: str, exp: str, token: str) -> str:
+    """HMAC de email|exp|sha256(token) con el secreto compartido del gateway"""
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    mensaje = f"{email}|{exp}|{token_hash}".encode("utf-8")
+    return hmac.new(config.GATEWAY_SHARED_SECRET.encode("utf-8"), mensaje, hashlib.sha256).hexdigest()
+
+
+class TokenVerifier:
+    """
+    Valida cada token una sola vez en el gateway.
+
+    Con JWT_VERIFY_KEY la firma se verifica localmente; si no, se consulta
+    al auth-service (/validar-token) y el resultado se guarda en una caché
+    LRU+TTL indexada por el hash del token.
+    """
+
+    def __init__(self, pools, resiliencia):
+        self.pools = pools
+        self.resiliencia = resiliencia
+        self.cache = TTLCache(max_items=config.TOKEN_CACHE_MAX, ttl=config.TOKEN_CACHE_TTL)
+
+    async def verificar(self, token: str) -> Identidad:
+        if config.JWT_VERIFY_KEY:
+            return self._verificar_local(token)
+
+        clave = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        identidad = self.cache.get(clave)
+        if identidad is not None:
+            return identidad
+
+        roble_data = await self._verificar_remoto(token)
+        claims = self._claims_sin_verificar(token)
+
+        if not isinstance(roble_data, dict):
+            roble_data = {}
+        email = roble_data.get("email") or claims.get("email", "desconocido")
+        exp = claims.get("exp")
+        identidad = Identidad(token, email, exp)
+
+        ttl = config.TOKEN_CACHE_TTL
+        if exp:
+            ttl = min(ttl, exp - time.time())
+        self.cache.set(clave, identidad, ttl)
+        return identidad
+
+    def stats(self) -> Dict:
+        return {"modo": "local" if config.JWT_VERIFY_KEY else "auth-service", **self.cache.stats()}
+
+    # ========== AUXILIARES ==========
+
+    def _verificar_local(self, token: str) -> Identidad:
+        try:
+            claims = jwt.decode(token, config.JWT_VERIFY_KEY, algorithms=config.JWT_ALGORITHMS)
+        except jwt.PyJWTError as e:
+            logger.warning(f"Token rechazado en el gateway: {str(e)}")
+            raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+        return Identidad(token, claims.get("email", "desconocido"), claims.get("exp"))
+
+    async def _verificar_remoto(self, token: str) -> Optional[Dict]:
+        client = self.pools.get("auth")
+        if client is None:
+            raise HTTPException(status_code=503, detail="Servicio no configurado: auth")
+
+        try:
+            async with self.resiliencia.proteger("auth") as permiso:
+                response = await client.get(
+                    "/validar-token",
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                permiso.registrar(response.status_code < 500)
+        except httpx.RequestError:
+            raise HTTPException(status_code=503, detail="Servicio no disponible: auth/validar-token")
+
+        # Un 5xx es que no se pudo verificar (ej: ROBLE caído), no un token inválido
+        if response.status_code >= 500:
+            raise HTTPException(status_code=503, detail="Servicio no disponible: auth/validar-token")
+        if response.status_code != 200:
+            raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+        return response.json().get("roble_data")
+
+    @staticmethod
+    def _claims_sin_verificar(token: str) -> Dict:
+        # El token ya fue validado por ROBLE; solo se leen sus claims
+        try:
+            return jwt.decode(token, options={"verify_signature": False})
+        except jwt.PyJWTError:
+            return {}
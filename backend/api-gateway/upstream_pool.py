@@ -0,0 +1,130 @@
+import time
+import logging
+import httpx
+from typing import Dict, Optional
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Métricas de uso de un pool: peticiones y tiempo de espera por conexión"""
+
+    def __init__(self):
+        self.peticiones = 0
+        self.conexiones_nuevas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def registrar_espera(self, segundos: float):
+        self.espera_total += segundos
+        self.espera_max = max(self.espera_max, segundos)
+
+    def to_dict(self) -> Dict:
+        promedio = self.espera_total / self.peticiones if self.peticiones else 0.0
+        return {
+            "peticiones": self.peticiones,
+            "conexiones_nuevas": self.conexiones_nuevas,
+            "espera_promedio_ms": round(promedio * 1000, 3),
+            "espera_max_ms": round(self.espera_max * 1000, 3),
+        }
+
+
+class UpstreamPools:
+    """
+    Un httpx.AsyncClient (pool keep-alive) por microservicio.
+
+    Se crean en el lifespan de la app y se cierran al apagarla, así cada
+    petición proxied reutiliza conexiones en vez de abrir un socket nuevo.
+    """
+
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.stats: Dict[str, PoolStats] = {}
+
+    async def iniciar(self):
+        limits = httpx.Limits(
+            max_connections=config.POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=config.POOL_MAX_KEEPALIVE,
+            keepalive_expiry=config.POOL_KEEPALIVE_EXPIRY,
+        )
+
+        for nombre, base_url in config.UPSTREAMS.items():
+            if not base_url:
+                logger.warning(f"Upstream '{nombre}' sin URL configurada, se omite")
+                continue
+
+            stats = PoolStats()
+            self.stats[nombre] = stats
+            self.clients[nombre] = httpx.AsyncClient(
+                base_url=base_url,
+                limits=limits,
+                timeout=self._timeout(nombre),
+                http2=config.HTTP2_ENABLED,
+                event_hooks={"request": [self._hook_medicion(stats)]},
+            )
+            logger.info(f"Pool creado para '{nombre}' -> {base_url}")
+
+    async def cerrar(self):
+        for nombre, client in self.clients.items():
+            await client.aclose()
+            logger.info(f"Pool cerrado para '{nombre}'")
+        self.clients.clear()
+
+    def get(self, nombre: str) -> Optional[httpx.AsyncClient]:
+        return self.clients.get(nombre)
+
+    def estado(self) -> Dict:
+        """Ocupación actual y tiempos de espera de cada pool"""
+        return {
+            nombre: {**self._ocupacion(client), **self.stats[nombre].to_dict()}
+            for nombre, client in self.clients.items()
+        }
+
+    # ========== AUXILIARES ==========
+
+    def _timeout(self, nombre: str) -> httpx.Timeout:
+        segundos = config.UPSTREAM_TIMEOUTS.get(nombre, config.UPSTREAM_TIMEOUT)
+        return httpx.Timeout(segundos, pool=config.POOL_ACQUIRE_TIMEOUT)
+
+    def _hook_medicion(self, stats: PoolStats):
+        """
+        Mide cuánto espera cada petición hasta tener una conexión lista
+        (cola del pool), descontando el tiempo de conexión TCP/TLS.
+        """
+        async def on_request(request: httpx.Request):
+            inicio = time.perf_counter()
+            conexion = {"inicio": None, "duracion": 0.0}
+            stats.peticiones += 1
+
+            async def trace(evento: str, info: dict):
+                if evento == "connection.connect_tcp.started":
+                    conexion["inicio"] = time.perf_counter()
+                elif evento in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                    if conexion["inicio"] is not None:
+                        conexion["duracion"] = time.perf_counter() - conexion["inicio"]
+                    if evento == "connection.connect_tcp.complete":
+                        stats.conexiones_nuevas += 1
+                elif evento.endswith("send_request_headers.started"):
+                    espera = time.perf_counter() - inicio - conexion["duracion"]
+                    stats.registrar_espera(max(espera, 0.0))
+
+            request.extensions["trace"] = trace
+
+        return on_request
+
+    @staticmethod
+    def _ocupacion(client: httpx.AsyncClient) -> Dict:
+        # httpx no expone el pool de httpcore públicamente
+        pool = getattr(client._transport, "_pool", None)
+        if pool is None:
+            return {}
+
+        conexiones = pool.connections
+        en_cola = [r for r in getattr(pool, "_requests", []) if r.is_queued()]
+        return {
+            "conexiones_abiertas": len(conexiones),
+            "conexiones_ocupadas": sum(1 for c in conexiones if not c.is_idle()),
+            "conexiones_inactivas": sum(1 for c in conexiones if c.is_idle()),
+            "peticiones_en_cola": len(en_cola),
+        }
@@ -31,6 +31,12 @@ class Config(BaseSettings):
     # ========== TIMEOUTS ==========
     HTTP_TIMEOUT:  Optional[int] = None
 
+    # ========== POOL ROBLE ==========
+    ROBLE_POOL_MAX_CONNECTIONS: int = Field(default=50)
+    ROBLE_POOL_MAX_KEEPALIVE: int = Field(default=20)
+    # Reintentos de verificaciones de token ante errores de red o 502/503/504
+    ROBLE_REINTENTOS: int = Field(default=2)
+
     # ========== LOGGING ==========
     DEBUG: bool = Field(default=False)
 
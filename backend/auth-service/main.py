@@ -2,17 +2,24 @@ from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional, Dict, Any
+from contextlib import asynccontextmanager
 import logging
 from roble_client import RobleAuthClient
+from compartido.roble_http import RobleAuthError, RobleConexionError, RobleHTTPError
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Servicio de Autenticación")
-security = HTTPBearer()
+roble_client = RobleAuthClient()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await roble_client.http.iniciar()
+    yield
+    await roble_client.http.cerrar()
 
-roble_client = RobleAuthClient()
+app = FastAPI(title="Servicio de Autenticación", lifespan=lifespan)
+security = HTTPBearer()
 
 
 
@@ -84,6 +91,12 @@ async def login(request: LoginRequest):
         
     except HTTPException:
         raise
+    except RobleAuthError:
+        logger.warning(f"Credenciales rechazadas para: {request.email}")
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
+    except RobleConexionError as e:
+        logger.error(f"ROBLE no disponible en login: {str(e)}")
+        raise HTTPException(status_code=503, detail="ROBLE no disponible")
     except Exception as e:
         logger.error(f"Error en login: {str(e)}")
         raise HTTPException(
@@ -148,7 +161,6 @@ async def validar_token_roble(
     token = credentials.credentials
     
     try:
-        print("hola")
         logger.info("Validando token...")
         
         roble_data = await roble_client.verify_token(token)
@@ -160,6 +172,16 @@ async def validar_token_roble(
             roble_data=roble_data
         )
         
+    except (RobleConexionError, RobleHTTPError) as e:
+        # Si ROBLE no pudo responder no se sabe si el token es válido
+        if isinstance(e, RobleConexionError) or e.status_code >= 500:
+            logger.error(f"ROBLE no disponible validando token: {str(e)}")
+            raise HTTPException(status_code=503, detail="ROBLE no disponible")
+        logger.error(f"Error validando token: {str(e)}")
+        raise HTTPException(
+            status_code=401,
+            detail="Token inválido o expirado"
+        )
     except Exception as e:
         logger.error(f"Error validando token: {str(e)}")
         raise HTTPException(
@@ -193,6 +215,12 @@ async def logout_roble(
         )
 
 
+@app.get("/metricas")
+async def metricas():
+    """Llamadas a ROBLE y tiempos por operación"""
+    return {"roble_http": roble_client.http.stats()}
+
+
 @app.get("/health")
 async def health_check():
     return {
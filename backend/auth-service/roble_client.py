@@ -1,112 +1,56 @@
-import httpx
-from typing import Dict, Optional
+from typing import Dict
 from config import config
+from compartido.roble_http import RobleClient
 
 
 class RobleAuthClient:
     def __init__(self):
-        self.timeout = config.HTTP_TIMEOUT
+        # Pool compartido por todas las llamadas del proceso
+        self.http = RobleClient(
+            base_url=config.ROBLE_API_URL or "",
+            timeout=config.HTTP_TIMEOUT,
+            max_conexiones=config.ROBLE_POOL_MAX_CONNECTIONS,
+            max_keepalive=config.ROBLE_POOL_MAX_KEEPALIVE,
+            reintentos=config.ROBLE_REINTENTOS,
+        )
     
     async def login(self, email: str, password: str) -> Dict:
-
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    config.ROBLE_AUTH_LOGIN,
-                    json={
-                        "email": email,
-                        "password": password
-                    }
-                )
-                
-                if response.status_code not in [200, 201]:
-                    raise Exception(
-                        f"ROBLE retornó {response.status_code}: {response.text}"
-                    )
-                
-                return response.json()
-                
-        except httpx.RequestError as e:
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
+        return await self.http.json(
+            "POST",
+            config.ROBLE_AUTH_LOGIN,
+            json={
+                "email": email,
+                "password": password
+            }
+        )
         
     async def signup(self, email: str, password: str, name: str) -> Dict:
         """
         Crea un usuario nuevo en Roble usando el endpoint /signup
         """
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    config.ROBLE_AUTH_SIGNUP, 
-                    json={
-                        "email": email,
-                        "password": password,
-                        "name": name
-                    }
-                )
-
-                if response.status_code not in [200, 201]:
-                    raise Exception(
-                        f"Error en signup: {response.status_code} - {response.text}"
-                    )
-
-                return response.json()
-
-        except httpx.RequestError as e:
-            raise Exception(f"Error conectando a ROBLE en signup: {str(e)}")
+        return await self.http.json(
+            "POST",
+            config.ROBLE_AUTH_SIGNUP,
+            json={
+                "email": email,
+                "password": password,
+                "name": name
+            }
+        )
         
     async def verify_email(self, email: str, code: str) -> Dict:
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    config.ROBLE_AUTH_VERIFY_EMAIL,
-                    json={
-                        "email": email,
-                        "code": code
-                    }
-                )
-
-                if response.status_code not in [200, 201]:
-                    raise Exception(
-                        f"ROBLE retornó {response.status_code}: {response.text}"
-                    )
-
-                return response.json()
-
-        except httpx.RequestError as e:
-            raise Exception(f"Error verificando email en ROBLE: {str(e)}")
+        return await self.http.json(
+            "POST",
+            config.ROBLE_AUTH_VERIFY_EMAIL,
+            json={
+                "email": email,
+                "code": code
+            }
+        )
     
     async def verify_token(self, token: str) -> Dict:
-        try:
-            headers = {"Authorization": f"Bearer {token}"}
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    config.ROBLE_AUTH_VERIFY,
-                    headers=headers
-                )
-                
-                if response.status_code not in [200,201]:
-                    raise Exception(f"Token inválido: {response.status_code}")
-                print(response.json())
-                return response.json()
-                
-        except httpx.RequestError as e:
-            raise Exception(f"Error verificando token: {str(e)}")
+        return await self.http.json("GET", config.ROBLE_AUTH_VERIFY, token)
     
     async def logout(self, token: str) -> bool:
-        try:
-            headers = {"Authorization": f"Bearer {token}"}
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    config.ROBLE_AUTH_LOGOUT,
-                    headers=headers
-                )
-                
-                if response.status_code not in [200, 201]:
-                    raise Exception(f"Error en logout: {response.status_code}")
-                
-                return True
-                
-        except httpx.RequestError as e:
-            raise Exception(f"Error en logout: {str(e)}")
\ No newline at end of file
+        await self.http.request("POST", config.ROBLE_AUTH_LOGOUT, token)
+        return True
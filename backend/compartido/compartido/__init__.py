@@ -0,0 +1,4 @@
+"""
+Código común de los microservicios. Se instala en cada imagen
+(pip install) en vez de copiar los módulos a cada servicio.
+"""
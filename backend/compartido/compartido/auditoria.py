@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import httpx
+
+from compartido.identidad import cabeceras_identidad
+
+logger = logging.getLogger(__name__)
+
+
+class EmisorAuditoria:
+    """
+    Envía los eventos de auditoría al servicio de logs fuera del camino de
+    la petición: emitir() los deja en una cola acotada y retorna de
+    inmediato, y una tarea de fondo los manda por lotes (al juntar `lote`
+    eventos o a los `segundos_lote` del primero) con un pool de conexiones
+    propio. Si la cola está llena el evento se descarta y se cuenta.
+
+    Cada evento sale con el token y la identidad firmada de su
+    usuario_email: el servicio de logs solo acepta eventos del usuario
+    verificado.
+
+    Se abre y se cierra en el lifespan de la app; al cerrar se drenan los
+    eventos pendientes hasta `segundos_drenaje`.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str],
+        timeout: Optional[float] = None,
+        capacidad: int = 10000,
+        lote: int = 100,
+        segundos_lote: float = 0.5,
+        concurrencia: int = 8,
+        segundos_drenaje: float = 5.0,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.lote = max(1, lote)
+        self.segundos_lote = segundos_lote
+        self.concurrencia = max(1, concurrencia)
+        self.segundos_drenaje = segundos_drenaje
+        self._cola: asyncio.Queue = asyncio.Queue(maxsize=max(1, capacidad))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.emitidos = 0
+        self.enviados = 0
+        self.fallidos = 0
+        self.descartados = 0
+        self.lotes = 0
+
+    async def iniciar(self):
+        self._arrancar()
+
+    def _arrancar(self):
+        if self._tarea is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrencia, max_keepalive_connections=self.concurrencia),
+        )
+        self._tarea = asyncio.create_task(self._trabajar())
+
+    async def cerrar(self):
+        if self._tarea is None:
+            return
+        try:
+            await asyncio.wait_for(self._cola.join(), self.segundos_drenaje)
+        except asyncio.TimeoutError:
+            logger.warning(f"Auditoría: {self._cola.qsize()} eventos sin enviar al cerrar")
+        self._tarea.cancel()
+        await asyncio.gather(self._tarea, return_exceptions=True)
+        self._tarea = None
+        await self._client.aclose()
+        self._client = None
+
+    # ========== EMISIÓN ==========
+
+    def emitir(self, token: str, **evento) -> bool:
+        """
+        Encola el evento (campos de /registrar) sin esperar. Retorna False
+        si se descartó por cola llena. Se puede llamar desde otro hilo.
+        """
+        evento.setdefault("fecha_transaccion", datetime.now(timezone.utc).isoformat())
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Fuera del event loop (tareas de fondo síncronas de Starlette)
+            if self._loop is None:
+                self.descartados += 1
+                return False
+            self._loop.call_soon_threadsafe(self._encolar, token, evento)
+            return True
+        # Si la app no pasó por el lifespan (scripts, pruebas) se abre al primer uso
+        self._arrancar()
+        return self._encolar(token, evento)
+
+    async def encolar(self, token: str, **evento):
+        """Como emitir() pero espera lugar en la cola en vez de descartar (cargas masivas)"""
+        self._arrancar()
+        evento.setdefault("fecha_transaccion", datetime.now(timezone.utc).isoformat())
+        await self._cola.put((token, evento))
+        self.emitidos += 1
+
+    def _encolar(self, token: str, evento: Dict) -> bool:
+        try:
+            self._cola.put_nowait((token, evento))
+        except asyncio.QueueFull:
+            self.descartados += 1
+            if self.descartados % 1000 == 1:
+                logger.warning(f"Auditoría: cola llena, {self.descartados} eventos descartados")
+            return False
+        self.emitidos += 1
+        return True
+
+    # ========== ENVÍO ==========
+
+    async def _trabajar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._cola.get()]
+            limite = loop.time() + self.segundos_lote
+            while len(lote) < self.lote:
+                try:
+                    lote.append(self._cola.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._enviar(lote)
+            except Exception as e:
+                self.fallidos += len(lote)
+                logger.warning(f"Auditoría: no se registró un lote de {len(lote)} eventos: {str(e)}")
+            finally:
+                self.lotes += 1
+                for _ in lote:
+                    self._cola.task_done()
+
+    async def _enviar(self, lote: List[Tuple[str, Dict]]):
+        # Una llamada a /registrar-lote por usuario: cada evento se autentica
+        # con el token y la identidad de quien hizo la operación
+        por_usuario: Dict[Tuple[str, str], List[Dict]] = {}
+        for token, evento in lote:
+            por_usuario.setdefault((token, evento.get("usuario_email") or ""), []).append(evento)
+        semaforo = asyncio.Semaphore(self.concurrencia)
+
+        async def enviar(usuario, eventos):
+            async with semaforo:
+                try:
+                    response = await self._client.post(
+                        f"{self.url}/registrar-lote", json=eventos,
+                        headers=cabeceras_identidad(*usuario),
+                    )
+                    response.raise_for_status()
+                    resultado = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    self.fallidos += len(eventos)
+                    return [str(e)] * len(eventos)
+                errores = [r.get("motivo") for r in resultado.get("resultados", []) if r.get("status") != "registrado"]
+                self.enviados += len(eventos) - len(errores)
+                self.fallidos += len(errores)
+                return errores
+
+        errores = [e for errores in await asyncio.gather(*(enviar(u, ev) for u, ev in por_usuario.items())) for e in errores]
+        if errores:
+            logger.warning(f"Auditoría: {len(errores)} de {len(lote)} eventos no se registraron ({errores[0]})")
+
+    def stats(self) -> Dict:
+        return {
+            "en_cola": self._cola.qsize(),
+            "emitidos": self.emitidos,
+            "enviados": self.enviados,
+            "fallidos": self.fallidos,
+            "descartados": self.descartados,
+            "lotes": self.lotes,
+        }
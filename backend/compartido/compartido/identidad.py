@@ -0,0 +1,112 @@
+import hashlib
+import hmac
+import logging
+import time
+import jwt
+from typing import Dict, List, Optional
+from fastapi import Depends, Header, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+security = HTTPBearer()
+
+
+class ConfigIdentidad(BaseSettings):
+    """Variables de entorno de la verificación de identidad, las mismas en todos los servicios"""
+
+    # Secreto compartido con el gateway para validar la identidad firmada
+    GATEWAY_SHARED_SECRET: Optional[str] = None
+    # Sin secreto compartido, clave para verificar el JWT localmente
+    JWT_VERIFY_KEY: Optional[str] = None
+    JWT_ALGORITHMS: List[str] = Field(default_factory=lambda: ["HS256"])
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+config = ConfigIdentidad()
+
+
+def email_usuario(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    x_usuario_email: Optional[str] = Header(None),
+    x_token_exp: Optional[str] = Header(None),
+    x_identidad_firma: Optional[str] = Header(None),
+) -> str:
+    """
+    Email del usuario validado por el API Gateway.
+
+    Con GATEWAY_SHARED_SECRET se exige la identidad firmada por el gateway;
+    sin él, el token se verifica localmente con JWT_VERIFY_KEY. Si no hay
+    ninguno de los dos, o la identidad no es válida o el token venció,
+    se responde 401.
+    """
+    token = credentials.credentials
+
+    if config.GATEWAY_SHARED_SECRET:
+        return _identidad_firmada(token, x_usuario_email, x_token_exp, x_identidad_firma)
+    if config.JWT_VERIFY_KEY:
+        return _identidad_jwt(token)
+
+    logger.error("Sin GATEWAY_SHARED_SECRET ni JWT_VERIFY_KEY no se puede verificar la identidad")
+    raise HTTPException(status_code=401, detail="Identidad no verificada")
+
+
+def _identidad_firmada(token, email, exp, firma):
+    if not email or not firma:
+        logger.warning("Petición sin identidad firmada por el gateway")
+        raise HTTPException(status_code=401, detail="Identidad no verificada")
+
+    if not hmac.compare_digest(firmar_identidad(email, exp or "", token), firma):
+        logger.warning("Firma de identidad inválida")
+        raise HTTPException(status_code=401, detail="Identidad no verificada")
+
+    # exp vacío: el gateway no conoce el vencimiento del token
+    if exp:
+        try:
+            vencido = int(exp) <= time.time()
+        except ValueError:
+            vencido = True
+        if vencido:
+            raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    return email
+
+
+def _identidad_jwt(token):
+    try:
+        claims = jwt.decode(token, config.JWT_VERIFY_KEY, algorithms=config.JWT_ALGORITHMS)
+    except jwt.PyJWTError as e:
+        logger.warning(f"Token rechazado: {str(e)}")
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    if not claims.get("email"):
+        raise HTTPException(status_code=401, detail="Token sin email")
+    return claims["email"]
+
+
+def firmar_identidad(email: str, exp: str, token: str) -> str:
+    """HMAC de email|exp|sha256(token) con GATEWAY_SHARED_SECRET (la firma del gateway)"""
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    mensaje = f"{email}|{exp}|{token_hash}".encode("utf-8")
+    return hmac.new(config.GATEWAY_SHARED_SECRET.encode("utf-8"), mensaje, hashlib.sha256).hexdigest()
+
+
+def cabeceras_identidad(token: str, email: str) -> Dict[str, str]:
+    """
+    Authorization más la identidad firmada de `email`, para llamar a otro
+    servicio en nombre del usuario ya verificado (como lo hace el gateway).
+    Sin vencimiento: la llamada puede salir después de la petición que la
+    originó (auditoría en segundo plano). Sin GATEWAY_SHARED_SECRET solo va
+    el token y el destino lo verifica con JWT_VERIFY_KEY.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    if config.GATEWAY_SHARED_SECRET:
+        headers.update({
+            "X-Usuario-Email": email,
+            "X-Token-Exp": "",
+            "X-Identidad-Firma": firmar_identidad(email, "", token),
+        })
+    return headers
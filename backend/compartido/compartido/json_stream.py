@@ -0,0 +1,110 @@
+import json
+import re
+import logging
+from typing import AsyncIterator, Dict, Optional
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+NDJSON = "application/x-ndjson"
+
+# Se acumulan líneas hasta este tamaño antes de escribir al socket
+NDJSON_CHUNK_BYTES = 64 * 1024
+
+# Siguiente carácter relevante dentro y fuera de un string JSON
+_EN_STRING = re.compile(rb'["\\]')
+_FUERA_STRING = re.compile(rb'[{}"]')
+
+
+async def iterar_array_json(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    """
+    Decodifica incrementalmente un array JSON de objetos (la respuesta de
+    ROBLE /read) y entrega cada objeto apenas está completo.
+
+    Solo se mantiene en memoria el objeto en curso, no el array entero.
+    Si la respuesta es un único objeto (no un array) se entrega ese objeto.
+    """
+    buffer = bytearray()
+    inicio = -1          # posición del '{' del objeto en curso
+    profundidad = 0
+    en_string = False
+    pos = 0
+
+    async for chunk in chunks:
+        buffer.extend(chunk)
+
+        while True:
+            patron = _EN_STRING if en_string else _FUERA_STRING
+            m = patron.search(buffer, pos)
+            if m is None:
+                pos = len(buffer)
+                break
+            pos = m.start()
+            c = buffer[pos]
+
+            if en_string:
+                if c == 0x5C:                  # \ escapa el siguiente byte
+                    if pos + 1 >= len(buffer):
+                        break
+                    pos += 2
+                    continue
+                en_string = False              # "
+            elif c == 0x22:
+                en_string = True
+            elif c == 0x7B:                    # {
+                if profundidad == 0:
+                    inicio = pos
+                profundidad += 1
+            else:                              # }
+                profundidad -= 1
+                if profundidad == 0:
+                    yield json.loads(buffer[inicio:pos + 1])
+                    del buffer[:pos + 1]
+                    pos, inicio = 0, -1
+                    continue
+            pos += 1
+
+        # Fuera de un objeto lo que queda son separadores ([ , ] espacios)
+        if profundidad == 0 and not en_string:
+            buffer.clear()
+            pos = 0
+
+
+def acepta_ndjson(accept: Optional[str]) -> bool:
+    """True si el cliente pidió la respuesta como NDJSON (cabecera Accept)"""
+    return bool(accept) and NDJSON in accept
+
+
+async def respuesta_ndjson(registros: AsyncIterator[Dict], background=None) -> StreamingResponse:
+    """
+    Respuesta NDJSON (un objeto JSON por línea) que se escribe a medida que
+    llegan los registros, con memoria constante.
+
+    Se espera el primer registro antes de responder para que un error de
+    ROBLE al abrir la consulta todavía se pueda devolver como status HTTP;
+    un error a mitad del envío solo puede cortar la respuesta.
+    """
+    iterador = registros.__aiter__()
+    try:
+        primero = [await iterador.__anext__()]
+    except StopAsyncIteration:
+        primero = []
+
+    async def lineas():
+        buffer = bytearray()
+        try:
+            for registro in primero:
+                buffer += json.dumps(registro, ensure_ascii=False).encode("utf-8") + b"\n"
+            async for registro in iterador:
+                buffer += json.dumps(registro, ensure_ascii=False).encode("utf-8") + b"\n"
+                if len(buffer) >= NDJSON_CHUNK_BYTES:
+                    yield bytes(buffer)
+                    buffer.clear()
+            if buffer:
+                yield bytes(buffer)
+        except Exception as e:
+            logger.error(f"Error enviando NDJSON: {str(e)}")
+        finally:
+            await iterador.aclose()
+
+    return StreamingResponse(lineas(), media_type=NDJSON, background=background)
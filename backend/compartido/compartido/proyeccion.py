@@ -0,0 +1,39 @@
+import re
+from typing import Dict, List, Optional
+
+_CAMPO = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parsear_campos(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Lista de columnas a partir del parámetro `fields` ("nro_doc,tipo_doc").
+    None si no se pidió proyección; ValueError si algún nombre no es válido.
+    """
+    if fields is None:
+        return None
+    campos = []
+    for campo in fields.split(","):
+        campo = campo.strip()
+        if not campo:
+            continue
+        if not _CAMPO.match(campo):
+            raise ValueError(f"campo inválido: {campo}")
+        if campo not in campos:
+            campos.append(campo)
+    if not campos:
+        raise ValueError("fields no puede estar vacío")
+    return campos
+
+
+def proyectar(registro: Dict, campos: Optional[List[str]]) -> Dict:
+    """Deja solo las columnas pedidas (las que el registro no tenga se omiten)"""
+    if campos is None or not isinstance(registro, dict):
+        return registro
+    return {campo: registro[campo] for campo in campos if campo in registro}
+
+
+def params_lectura(params: Dict, campos: Optional[List[str]], parametro: Optional[str]) -> Dict:
+    """Agrega la proyección a los parámetros de /read si ROBLE la soporta"""
+    if campos is not None and parametro:
+        params[parametro] = ",".join(campos)
+    return params
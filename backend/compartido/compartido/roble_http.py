@@ -0,0 +1,244 @@
+import asyncio
+import functools
+import random
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# ========== ERRORES ==========
+
+class RobleError(Exception):
+    """Error base de las llamadas a ROBLE"""
+
+
+class RobleConexionError(RobleError):
+    """ROBLE no respondió (conexión rechazada, timeout, DNS...)"""
+
+
+class RobleHTTPError(RobleError):
+    """ROBLE respondió con un status no esperado"""
+
+    def __init__(self, status_code: int, texto: str):
+        super().__init__(f"Error en ROBLE ({status_code}): {texto}")
+        self.status_code = status_code
+        self.texto = texto
+
+
+class RobleAuthError(RobleHTTPError):
+    """Token o credenciales rechazados por ROBLE (401/403)"""
+
+
+class RobleNoEncontrado(RobleHTTPError):
+    """El recurso no existe en ROBLE (404)"""
+
+
+def _error_para(status_code: int, texto: str) -> RobleHTTPError:
+    if status_code in (401, 403):
+        return RobleAuthError(status_code, texto)
+    if status_code == 404:
+        return RobleNoEncontrado(status_code, texto)
+    return RobleHTTPError(status_code, texto)
+
+
+# ========== MIDDLEWARES ==========
+# Un middleware recibe la petición y la función que la envía (el resto de
+# la cadena) y retorna la respuesta: puede modificar la petición, medirla,
+# reintentarla o cortar la cadena.
+
+Siguiente = Callable[[httpx.Request], Awaitable[httpx.Response]]
+Middleware = Callable[[httpx.Request, Siguiente], Awaitable[httpx.Response]]
+
+
+class AuthBearer:
+    """Agrega el token del usuario (extensión 'roble_token') como Bearer"""
+
+    async def __call__(self, request: httpx.Request, siguiente: Siguiente) -> httpx.Response:
+        token = request.extensions.get("roble_token")
+        if token:
+            request.headers["Authorization"] = f"Bearer {token}"
+        return await siguiente(request)
+
+
+class Temporizador:
+    """
+    Llamadas, errores y latencia por operación (último segmento de la ruta:
+    read, insert, login...). En streaming mide hasta recibir las cabeceras.
+    """
+
+    def __init__(self):
+        self.operaciones: Dict[str, Dict] = {}
+
+    async def __call__(self, request: httpx.Request, siguiente: Siguiente) -> httpx.Response:
+        operacion = request.url.path.rstrip("/").rsplit("/", 1)[-1] or "/"
+        m = self.operaciones.setdefault(
+            operacion, {"llamadas": 0, "errores": 0, "ms_total": 0.0, "ms_max": 0.0}
+        )
+        inicio = time.perf_counter()
+        try:
+            response = await siguiente(request)
+        except BaseException:
+            m["errores"] += 1
+            raise
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            m["llamadas"] += 1
+            m["ms_total"] += ms
+            m["ms_max"] = max(m["ms_max"], ms)
+        if response.status_code >= 500:
+            m["errores"] += 1
+        return response
+
+    def stats(self) -> Dict:
+        return {
+            operacion: {
+                **m,
+                "ms_total": round(m["ms_total"], 1),
+                "ms_max": round(m["ms_max"], 1),
+                "ms_promedio": round(m["ms_total"] / m["llamadas"], 1) if m["llamadas"] else 0.0,
+            }
+            for operacion, m in self.operaciones.items()
+        }
+
+
+class Reintentos:
+    """
+    Reintenta con backoff exponencial (y jitter) los errores de conexión y
+    los 502/503/504, solo en métodos idempotentes: un insert no se repite.
+    """
+
+    STATUS_REINTENTABLES = {502, 503, 504}
+
+    def __init__(self, intentos: int = 2, backoff: float = 0.2, metodos: Iterable[str] = ("GET",)):
+        self.intentos = intentos
+        self.backoff = backoff
+        self.metodos = {m.upper() for m in metodos}
+        self.reintentos = 0
+
+    async def __call__(self, request: httpx.Request, siguiente: Siguiente) -> httpx.Response:
+        if request.method not in self.metodos:
+            return await siguiente(request)
+
+        for intento in range(self.intentos + 1):
+            ultimo = intento == self.intentos
+            try:
+                response = await siguiente(request)
+            except httpx.RequestError:
+                if ultimo:
+                    raise
+            else:
+                if ultimo or response.status_code not in self.STATUS_REINTENTABLES:
+                    return response
+                await response.aclose()
+
+            self.reintentos += 1
+            espera = self.backoff * (2 ** intento)
+            await asyncio.sleep(espera * random.uniform(0.5, 1.5))
+
+
+# ========== CLIENTE ==========
+
+class RobleClient:
+    """
+    Cliente HTTP compartido hacia ROBLE: un solo pool de conexiones por
+    proceso (abierto y cerrado en el lifespan de la app), errores tipados y
+    una cadena de middlewares (por defecto: tiempos, reintentos y token).
+    """
+
+    def __init__(
+        self,
+        base_url: str = "",
+        timeout: Optional[float] = None,
+        max_conexiones: int = 50,
+        max_keepalive: int = 20,
+        reintentos: int = 2,
+        middlewares: Optional[List[Middleware]] = None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_keepalive)
+        self.temporizador = Temporizador()
+        self.reintentos = Reintentos(reintentos)
+        self.middlewares: List[Middleware] = (
+            middlewares if middlewares is not None
+            else [self.temporizador, self.reintentos, AuthBearer()]
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def iniciar(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+
+    async def cerrar(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _cliente(self) -> httpx.AsyncClient:
+        # Si la app no pasó por el lifespan (scripts, pruebas) se abre al primer uso
+        if self._client is None:
+            await self.iniciar()
+        return self._client
+
+    async def _enviar(self, request: httpx.Request, stream: bool) -> httpx.Response:
+        client = await self._cliente()
+
+        async def enviar(req: httpx.Request) -> httpx.Response:
+            return await client.send(req, stream=stream)
+
+        cadena = enviar
+        for middleware in reversed(self.middlewares):
+            cadena = functools.partial(middleware, siguiente=cadena)
+        return await cadena(request)
+
+    async def _abrir(self, method: str, url: str, token: Optional[str], stream: bool, ok, **kwargs) -> httpx.Response:
+        client = await self._cliente()
+        request = client.build_request(method, url, extensions={"roble_token": token}, **kwargs)
+        try:
+            response = await self._enviar(request, stream)
+        except httpx.RequestError as e:
+            raise RobleConexionError(f"Error conectando a ROBLE: {str(e)}") from e
+
+        if response.status_code not in ok:
+            if stream:
+                await response.aread()
+                await response.aclose()
+            raise _error_para(response.status_code, response.text)
+        return response
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        token: Optional[str] = None,
+        ok: Iterable[int] = (200, 201),
+        **kwargs,
+    ) -> httpx.Response:
+        """Petición bufferizada; RobleHTTPError si el status no está en `ok`"""
+        return await self._abrir(method, url, token, False, tuple(ok), **kwargs)
+
+    async def json(self, method: str, url: str, token: Optional[str] = None, **kwargs):
+        """Como request() pero retorna el cuerpo ya decodificado"""
+        response = await self.request(method, url, token, **kwargs)
+        return response.json()
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, token: Optional[str] = None, ok: Iterable[int] = (200, 201), **kwargs):
+        """Respuesta en streaming; los errores de red a mitad del cuerpo también se tipan"""
+        response = await self._abrir(method, url, token, True, tuple(ok), **kwargs)
+        try:
+            yield response
+        except httpx.RequestError as e:
+            raise RobleConexionError(f"Error conectando a ROBLE: {str(e)}") from e
+        finally:
+            await response.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "pool_abierto": self._client is not None,
+            "reintentos": self.reintentos.reintentos,
+            "operaciones": self.temporizador.stats(),
+        }
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Colapsa llamadas idénticas concurrentes en una sola.
+
+    La primera llamada con una clave ejecuta la función; las que llegan
+    mientras sigue en vuelo esperan ese mismo resultado (o excepción).
+    El resultado es compartido: los llamadores no deben modificarlo.
+    """
+
+    def __init__(self):
+        self._en_vuelo: Dict[Hashable, asyncio.Task] = {}
+        self.llamadas = 0
+        self.coalescidas = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        tarea = self._en_vuelo.get(key)
+        if tarea is None:
+            self.llamadas += 1
+            # En una tarea aparte para que cancelar al primer llamador
+            # no cancele a los demás que esperan
+            tarea = asyncio.ensure_future(fn())
+            self._en_vuelo[key] = tarea
+            tarea.add_done_callback(lambda t: self._terminar(key, t))
+        else:
+            self.coalescidas += 1
+
+        return await asyncio.shield(tarea)
+
+    def _terminar(self, key: Hashable, tarea: asyncio.Task):
+        if self._en_vuelo.get(key) is tarea:
+            del self._en_vuelo[key]
+        if not tarea.cancelled():
+            tarea.exception()  # evita "exception was never retrieved"
+
+    def stats(self) -> Dict:
+        return {
+            "llamadas": self.llamadas,
+            "coalescidas": self.coalescidas,
+            "en_vuelo": len(self._en_vuelo),
+        }
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+import httpx
+
+from compartido import identidad
+from compartido.auditoria import EmisorAuditoria
+from compartido.identidad import firmar_identidad
+
+
+def test_envia_cada_usuario_con_su_identidad_firmada(monkeypatch):
+    monkeypatch.setattr(identidad.config, "GATEWAY_SHARED_SECRET", "secreto")
+    recibidos = []
+
+    def responder(request):
+        eventos = json.loads(request.content)
+        recibidos.append((dict(request.headers), eventos))
+        return httpx.Response(200, json={"resultados": [{"status": "registrado"} for _ in eventos]})
+
+    async def emitir():
+        emisor = EmisorAuditoria("http://logs", lote=10, segundos_lote=0.01)
+        await emisor.iniciar()
+        await emisor._client.aclose()
+        emisor._client = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+        emisor.emitir("tok-a", tipo_operacion="CREAR", usuario_email="a@x")
+        emisor.emitir("tok-b", tipo_operacion="CREAR", usuario_email="b@x")
+        emisor.emitir("tok-a", tipo_operacion="ELIMINAR", usuario_email="a@x")
+        await emisor.cerrar()
+        return emisor.stats()
+
+    stats = asyncio.run(emitir())
+
+    assert stats["enviados"] == 3
+    por_usuario = {headers["x-usuario-email"]: (headers, eventos) for headers, eventos in recibidos}
+    assert sorted(por_usuario) == ["a@x", "b@x"]
+    headers, eventos = por_usuario["a@x"]
+    assert headers["authorization"] == "Bearer tok-a"
+    assert headers["x-identidad-firma"] == firmar_identidad("a@x", "", "tok-a")
+    assert [e["tipo_operacion"] for e in eventos] == ["CREAR", "ELIMINAR"]
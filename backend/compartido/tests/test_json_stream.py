@@ -0,0 +1,65 @@
+import asyncio
+import json
+import tracemalloc
+
+from compartido.json_stream import iterar_array_json, respuesta_ndjson
+
+MB = 1024 * 1024
+
+# Registro de ~2 KB, como una persona con una foto pequeña
+FOTO = "A" * 2000
+
+
+async def _respuesta_roble(n, tamano_chunk=64 * 1024):
+    """Array JSON de `n` registros generado al vuelo, en chunks como los de httpx"""
+    pendiente = bytearray(b"[")
+    for i in range(n):
+        if i:
+            pendiente += b","
+        pendiente += json.dumps({"nro_doc": str(i), "nombre": f"Persona {i}", "foto": FOTO}).encode("utf-8")
+        while len(pendiente) >= tamano_chunk:
+            yield bytes(pendiente[:tamano_chunk])
+            del pendiente[:tamano_chunk]
+    pendiente += b"]"
+    yield bytes(pendiente)
+
+
+async def _consumir(n):
+    respuesta = await respuesta_ndjson(iterar_array_json(_respuesta_roble(n)))
+    lineas = enviados = 0
+    async for parte in respuesta.body_iterator:
+        lineas += parte.count(b"\n")
+        enviados += len(parte)
+    return lineas, enviados
+
+
+def _medir(n):
+    """(líneas, bytes enviados, pico de memoria) de pasar `n` registros por ROBLE -> NDJSON"""
+    tracemalloc.start()
+    try:
+        lineas, enviados = asyncio.run(_consumir(n))
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return lineas, enviados, pico
+
+
+def test_ndjson_memoria_constante():
+    _, _, pico_pequena = _medir(2_000)
+    lineas, enviados, pico_grande = _medir(40_000)
+
+    assert lineas == 40_000
+    assert enviados > 70 * MB
+    # 20 veces más datos, el mismo pico: no se acumula la respuesta
+    assert pico_grande < pico_pequena + 1 * MB
+    assert pico_grande < 2 * MB
+
+
+def test_ndjson_entrega_cada_registro():
+    async def leer():
+        respuesta = await respuesta_ndjson(iterar_array_json(_respuesta_roble(300, tamano_chunk=7)))
+        return b"".join([parte async for parte in respuesta.body_iterator])
+
+    registros = [json.loads(linea) for linea in asyncio.run(leer()).splitlines()]
+    assert [r["nro_doc"] for r in registros] == [str(i) for i in range(300)]
+    assert all(r["foto"] == FOTO for r in registros)
@@ -0,0 +1,541 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as hora, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+ZONA = pytz.timezone("America/Bogota")
+
+# Columnas indexadas por las que se puede filtrar (igualdad)
+FILTROS = ("tipo_operacion", "usuario_email", "documento_afectado")
+
+_PARTICION = re.compile(r"logs-(\d{4})-(\d{2})\.db")
+_CARGA_INICIAL = "carga_inicial.json"
+_MIN, _MAX = -(2 ** 63), 2 ** 63 - 1
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    fecha INTEGER NOT NULL,
+    huella TEXT NOT NULL UNIQUE,
+    tipo_operacion TEXT,
+    usuario_email TEXT,
+    documento_afectado TEXT,
+    registro TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs_fecha ON logs (fecha, huella);
+CREATE INDEX IF NOT EXISTS logs_tipo ON logs (tipo_operacion, fecha, huella);
+CREATE INDEX IF NOT EXISTS logs_usuario ON logs (usuario_email, fecha, huella);
+CREATE INDEX IF NOT EXISTS logs_documento ON logs (documento_afectado, fecha, huella);
+CREATE TABLE IF NOT EXISTS resumen (
+    granularidad TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    tipo_operacion TEXT NOT NULL,
+    usuario_email TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    latencia_n INTEGER NOT NULL,
+    latencia_suma REAL NOT NULL,
+    latencia_min REAL,
+    latencia_max REAL,
+    PRIMARY KEY (granularidad, bucket, tipo_operacion, usuario_email)
+) WITHOUT ROWID;
+"""
+# Versión del esquema (PRAGMA user_version); las bases de la versión 0
+# no tenían la tabla resumen y se reconstruye a partir de los logs
+_VERSION = 1
+
+# Tamaño de cada bucket de las estadísticas en µs. El día es el de Bogotá.
+GRANULARIDADES = {"minuto": 60 * 1_000_000, "hora": 3600 * 1_000_000, "dia": 86400 * 1_000_000}
+
+# Posición de un log en el orden de las consultas: (fecha en µs UTC, huella)
+Clave = Tuple[int, str]
+
+
+# ========== FECHAS Y CURSORES ==========
+
+def microsegundos(fecha: datetime) -> int:
+    if fecha.tzinfo is None:
+        fecha = ZONA.localize(fecha)
+    delta = fecha.astimezone(timezone.utc) - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def parsear_fecha(texto: Optional[str], fin_del_dia: bool = False) -> Optional[int]:
+    """
+    Fecha de un filtro (ISO; sin zona horaria es hora de Bogotá) en µs UTC.
+    Una fecha sin hora es el día completo: con `fin_del_dia` su último
+    instante. ValueError si no es una fecha válida.
+    """
+    if not texto:
+        return None
+    try:
+        fecha = datetime.fromisoformat(texto.strip())
+    except ValueError:
+        raise ValueError(f"Fecha inválida: {texto}")
+    if fin_del_dia and len(texto.strip()) == 10:
+        fecha = datetime.combine(fecha.date(), hora.max)
+    return microsegundos(fecha)
+
+
+def clave_de(registro: Dict) -> Clave:
+    """
+    Fecha del log y huella de su contenido: la misma para el log que se
+    envió a ROBLE y para el que se lee de ROBLE, así no se duplica.
+    """
+    fecha = registro.get("fecha_transaccion")
+    try:
+        us = microsegundos(datetime.fromisoformat(str(fecha))) if fecha else 0
+    except ValueError:
+        us = 0
+    huella = hashlib.sha1(json.dumps([
+        us,
+        registro.get("tipo_operacion"),
+        registro.get("usuario_email"),
+        _texto(registro.get("documento_afectado")),
+        registro.get("pregunta_rag"),
+    ], default=str).encode("utf-8")).hexdigest()
+    return us, huella
+
+
+def codificar_cursor(clave: Clave) -> str:
+    """Cursor opaco a partir del último log de la página"""
+    crudo = json.dumps({"f": clave[0], "h": clave[1]}).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Clave:
+    """Clave a partir del cursor; ValueError si el cursor no es válido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return int(datos["f"]), str(datos["h"])
+    except Exception:
+        raise ValueError("cursor inválido")
+
+
+def pagina_en_memoria(
+    registros: Iterable[Dict],
+    desde: Optional[int],
+    hasta: Optional[int],
+    limite: Optional[int],
+    despues_de: Optional[Clave],
+) -> Tuple[List[Dict], Optional[Clave]]:
+    """
+    Mismo filtro de fechas, orden y cursor que el almacén, sobre logs ya
+    leídos (mientras el almacén local no tiene la carga inicial)
+    """
+    desde = _MIN if desde is None else desde
+    hasta = _MAX if hasta is None else hasta
+    filas = sorted(
+        ((clave, r) for r in registros for clave in (clave_de(r),) if desde <= clave[0] <= hasta),
+        key=lambda fila: fila[0],
+    )
+    if despues_de is not None:
+        filas = [fila for fila in filas if fila[0] > despues_de]
+    if limite is None or len(filas) <= limite:
+        return [r for _, r in filas], None
+    return [r for _, r in filas[:limite]], filas[limite - 1][0]
+
+
+# ========== ESTADÍSTICAS ==========
+
+def bucket_de(fecha_us: int, granularidad: str) -> int:
+    """Inicio (µs UTC) del bucket de `granularidad` que contiene la fecha"""
+    if granularidad == "dia":
+        dia = datetime.fromtimestamp(fecha_us / 1_000_000, tz=timezone.utc).astimezone(ZONA).date()
+        return microsegundos(datetime.combine(dia, hora.min))
+    tamano = GRANULARIDADES[granularidad]
+    return fecha_us // tamano * tamano
+
+
+def duracion_de(registro: Dict) -> Optional[float]:
+    """Latencia del log (duracion_ms) si la trae y es válida"""
+    valor = registro.get("duracion_ms")
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor < 0:
+        return None
+    return float(valor)
+
+
+def acumular(resumen: Dict[tuple, list], fecha_us: int, tipo: Optional[str], usuario: Optional[str],
+             duracion: Optional[float], granularidades: Iterable[str] = GRANULARIDADES):
+    """Suma un log a `resumen`: {(granularidad, bucket, tipo, usuario): [cantidad, n, suma, min, max]}"""
+    for granularidad in granularidades:
+        clave = (granularidad, bucket_de(fecha_us, granularidad), tipo or "", usuario or "")
+        fila = resumen.get(clave)
+        if fila is None:
+            fila = resumen[clave] = [0, 0, 0.0, None, None]
+        fila[0] += 1
+        if duracion is not None:
+            fila[1] += 1
+            fila[2] += duracion
+            fila[3] = duracion if fila[3] is None else min(fila[3], duracion)
+            fila[4] = duracion if fila[4] is None else max(fila[4], duracion)
+
+
+def _combinar(destino: list, origen: list):
+    destino[0] += origen[0]
+    destino[1] += origen[1]
+    destino[2] += origen[2]
+    for i, elegir in ((3, min), (4, max)):
+        if origen[i] is not None:
+            destino[i] = origen[i] if destino[i] is None else elegir(destino[i], origen[i])
+
+
+def estadisticas_en_memoria(
+    registros: Iterable[Dict],
+    granularidad: str,
+    filtros: Dict[str, str],
+    desde: Optional[int] = None,
+    hasta: Optional[int] = None,
+) -> Dict[tuple, list]:
+    """
+    Mismas estadísticas que el almacén, sobre logs ya leídos (mientras el
+    almacén local no tiene la carga inicial)
+    """
+    desde = _MIN if desde is None else bucket_de(desde, granularidad)
+    hasta = _MAX if hasta is None else hasta
+    resumen: Dict[tuple, list] = {}
+    vistos = set()
+    for registro in registros:
+        if any(registro.get(campo) != valor for campo, valor in filtros.items()):
+            continue
+        fecha, huella = clave_de(registro)
+        if huella in vistos:
+            continue
+        vistos.add(huella)
+        if desde <= bucket_de(fecha, granularidad) <= hasta:
+            acumular(resumen, fecha, registro.get("tipo_operacion"), registro.get("usuario_email"),
+                     duracion_de(registro), (granularidad,))
+    return resumen
+
+
+def _texto(valor) -> Optional[str]:
+    if valor is None or isinstance(valor, str):
+        return valor
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+# ========== ALMACÉN ==========
+
+class AlmacenLogs:
+    """
+    Copia local y consultable de los logs de auditoría (ROBLE sigue siendo
+    la fuente de verdad). Una base SQLite por mes (logs-AAAA-MM.db) con
+    índices por fecha y por tipo_operacion, usuario_email y
+    documento_afectado (cada uno seguido de la fecha): una consulta solo
+    abre los meses de su rango y recorre un índice.
+
+    Las consultas ordenan por (fecha, huella) y paginan con esa clave
+    (keyset), no con offset. Cada base guarda además, al insertar, cuántos
+    logs hubo por tipo_operacion, usuario_email y minuto/hora/día (y la
+    latencia si el log trae duracion_ms): las estadísticas se responden de
+    ahí sin recorrer los logs. Todo el acceso a SQLite pasa por un único
+    hilo, fuera del event loop.
+
+    Hasta completar la carga inicial desde ROBLE (`listo`) las consultas
+    deben seguir yendo a ROBLE.
+    """
+
+    def __init__(self, directorio: str, tamano_lote: int = 1000):
+        self.directorio = directorio
+        self.tamano_lote = tamano_lote
+        self.listo = False
+        self.cargando = False
+        self._conexiones: Dict[str, sqlite3.Connection] = {}
+        self._particiones: List[str] = []
+        self._hilo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="almacen-logs")
+        self.insertados = 0
+        self.duplicados = 0
+        self.consultas = 0
+        self.ms_consultas = 0.0
+
+    def iniciar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        self._particiones = sorted(
+            n[5:12] for n in os.listdir(self.directorio) if _PARTICION.fullmatch(n)
+        )
+        try:
+            with open(os.path.join(self.directorio, _CARGA_INICIAL)) as f:
+                self.listo = bool(json.load(f).get("completa"))
+        except (FileNotFoundError, ValueError):
+            self.listo = False
+        logger.info(f"Almacén de logs: {len(self._particiones)} particiones, carga inicial {'completa' if self.listo else 'pendiente'}")
+
+    async def cerrar(self):
+        await self._en_hilo(self._cerrar_conexiones)
+        self._hilo.shutdown(wait=True)
+
+    def _cerrar_conexiones(self):
+        for conexion in self._conexiones.values():
+            conexion.close()
+        self._conexiones.clear()
+
+    async def _en_hilo(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._hilo, funcion, *args)
+
+    # ========== ESCRITURA ==========
+
+    async def agregar(self, registros: List[Dict]):
+        """Agrega logs ya confirmados por ROBLE. Un error solo se registra."""
+        if not registros:
+            return
+        try:
+            await self._en_hilo(self._insertar, registros)
+        except Exception as e:
+            logger.error(f"Almacén de logs: no se pudieron indexar {len(registros)} logs: {str(e)}")
+
+    async def cargar(self, registros: AsyncIterator[Dict]):
+        """
+        Carga inicial: todo lo que ya hay en ROBLE. Los logs que también
+        llegaron por el despachador no se duplican (misma huella).
+        """
+        self.cargando = True
+        total = 0
+        try:
+            lote = []
+            async for registro in registros:
+                lote.append(registro)
+                if len(lote) >= self.tamano_lote:
+                    await self._en_hilo(self._insertar, lote)
+                    total += len(lote)
+                    lote = []
+            if lote:
+                await self._en_hilo(self._insertar, lote)
+                total += len(lote)
+            await self._en_hilo(self._marcar_carga, total)
+            self.listo = True
+            logger.info(f"Almacén de logs: carga inicial completa ({total} logs)")
+        finally:
+            self.cargando = False
+
+    def _marcar_carga(self, total: int):
+        ruta = os.path.join(self.directorio, _CARGA_INICIAL)
+        with open(ruta + ".tmp", "w") as f:
+            json.dump({"completa": True, "registros": total, "fecha": datetime.now(ZONA).isoformat()}, f)
+        os.replace(ruta + ".tmp", ruta)
+
+    def _insertar(self, registros: List[Dict]):
+        por_particion: Dict[str, List[Tuple[tuple, Optional[float]]]] = {}
+        for registro in registros:
+            fecha, huella = clave_de(registro)
+            por_particion.setdefault(_particion(fecha), []).append(((
+                fecha,
+                huella,
+                registro.get("tipo_operacion"),
+                registro.get("usuario_email"),
+                _texto(registro.get("documento_afectado")),
+                json.dumps(registro, ensure_ascii=False, default=str),
+            ), duracion_de(registro)))
+        for particion, filas in por_particion.items():
+            conexion = self._conexion(particion, crear=True)
+            # Los logs y sus estadísticas en la misma transacción; solo
+            # suman los que no estaban (el log repetido no cuenta dos veces)
+            resumen: Dict[tuple, list] = {}
+            nuevos = 0
+            with conexion:
+                for fila, duracion in filas:
+                    cursor = conexion.execute(
+                        "INSERT OR IGNORE INTO logs (fecha, huella, tipo_operacion, usuario_email, "
+                        "documento_afectado, registro) VALUES (?, ?, ?, ?, ?, ?)",
+                        fila,
+                    )
+                    if cursor.rowcount:
+                        nuevos += 1
+                        acumular(resumen, fila[0], fila[2], fila[3], duracion)
+                _guardar_resumen(conexion, resumen)
+            self.insertados += nuevos
+            self.duplicados += len(filas) - nuevos
+
+    def _conexion(self, particion: str, crear: bool = False) -> Optional[sqlite3.Connection]:
+        conexion = self._conexiones.get(particion)
+        if conexion is not None:
+            return conexion
+        ruta = os.path.join(self.directorio, f"logs-{particion}.db")
+        if not crear and not os.path.exists(ruta):
+            return None
+        conexion = sqlite3.connect(ruta)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        version = conexion.execute("PRAGMA user_version").fetchone()[0]
+        conexion.executescript(_ESQUEMA)
+        if version < _VERSION:
+            _reconstruir_resumen(conexion)
+        self._conexiones[particion] = conexion
+        if particion not in self._particiones:
+            self._particiones = sorted(self._particiones + [particion])
+        return conexion
+
+    # ========== CONSULTA ==========
+
+    async def consultar(
+        self,
+        filtros: Dict[str, str],
+        desde: Optional[int] = None,
+        hasta: Optional[int] = None,
+        limite: Optional[int] = None,
+        despues_de: Optional[Clave] = None,
+    ) -> Tuple[List[Dict], Optional[Clave]]:
+        """
+        Logs que cumplen `filtros` (igualdad) con fecha en [desde, hasta],
+        en orden, a partir de `despues_de`. Retorna (logs, clave del último)
+        si hay más de `limite`; sin límite, todos y None.
+        """
+        inicio = time.perf_counter()
+        try:
+            return await self._en_hilo(self._consultar, filtros, desde, hasta, limite, despues_de)
+        finally:
+            self.consultas += 1
+            self.ms_consultas += (time.perf_counter() - inicio) * 1000
+
+    async def iterar(self, filtros: Dict[str, str], desde: Optional[int] = None,
+                     hasta: Optional[int] = None) -> AsyncIterator[Dict]:
+        """Como consultar() sin límite, pero de a `tamano_lote` logs por vez"""
+        despues_de = None
+        while True:
+            logs, despues_de = await self.consultar(filtros, desde, hasta, self.tamano_lote, despues_de)
+            for log in logs:
+                yield log
+            if despues_de is None:
+                return
+
+    def _consultar(self, filtros, desde, hasta, limite, despues_de):
+        desde = _MIN if desde is None else desde
+        hasta = _MAX if hasta is None else hasta
+        condiciones = [f"{campo} = ?" for campo in filtros]
+        valores = list(filtros.values())
+
+        logs: List[Dict] = []
+        ultima: Optional[Clave] = None
+        falta = None if limite is None else limite + 1
+        for particion in self._particiones:
+            if _particion_fuera(particion, desde, hasta, despues_de):
+                continue
+            conexion = self._conexion(particion)
+            if conexion is None:
+                continue
+            sql = condiciones + ["fecha >= ?", "fecha <= ?"]
+            args = valores + [desde, hasta]
+            if despues_de is not None:
+                sql.append("(fecha > ? OR (fecha = ? AND huella > ?))")
+                args += [despues_de[0], despues_de[0], despues_de[1]]
+            consulta = f"SELECT fecha, huella, registro FROM logs WHERE {' AND '.join(sql)} ORDER BY fecha, huella"
+            if falta is not None:
+                consulta += f" LIMIT {falta - len(logs)}"
+            for fecha, huella, registro in conexion.execute(consulta, args):
+                if limite is not None and len(logs) == limite:
+                    return logs, ultima
+                logs.append(json.loads(registro))
+                ultima = (fecha, huella)
+            if falta is not None and len(logs) >= falta:
+                break
+        return logs, None
+
+    async def estadisticas(
+        self,
+        granularidad: str,
+        filtros: Dict[str, str],
+        desde: Optional[int] = None,
+        hasta: Optional[int] = None,
+    ) -> Dict[tuple, list]:
+        """
+        Resumen por (bucket, tipo_operacion, usuario_email) de los buckets
+        de `granularidad` que se solapan con [desde, hasta], leído de las
+        estadísticas ya calculadas (sin recorrer los logs)
+        """
+        inicio = time.perf_counter()
+        try:
+            return await self._en_hilo(self._estadisticas, granularidad, filtros, desde, hasta)
+        finally:
+            self.consultas += 1
+            self.ms_consultas += (time.perf_counter() - inicio) * 1000
+
+    def _estadisticas(self, granularidad, filtros, desde, hasta):
+        desde = _MIN if desde is None else bucket_de(desde, granularidad)
+        hasta = _MAX if hasta is None else hasta
+        sql = ["granularidad = ?", "bucket >= ?", "bucket <= ?"] + [f"{campo} = ?" for campo in filtros]
+        args = [granularidad, desde, hasta] + list(filtros.values())
+        consulta = (
+            "SELECT bucket, tipo_operacion, usuario_email, cantidad, latencia_n, latencia_suma, "
+            f"latencia_min, latencia_max FROM resumen WHERE {' AND '.join(sql)}"
+        )
+
+        resumen: Dict[tuple, list] = {}
+        fin = hasta if hasta == _MAX else hasta + GRANULARIDADES[granularidad]
+        for particion in self._particiones:
+            # Un bucket puede quedar repartido entre dos meses: se suman
+            if _particion_fuera(particion, desde, fin, None):
+                continue
+            conexion = self._conexion(particion)
+            if conexion is None:
+                continue
+            for bucket, tipo, usuario, *valores in conexion.execute(consulta, args):
+                clave = (granularidad, bucket, tipo, usuario)
+                if clave in resumen:
+                    _combinar(resumen[clave], valores)
+                else:
+                    resumen[clave] = valores
+        return resumen
+
+    def stats(self) -> Dict:
+        return {
+            "listo": self.listo,
+            "cargando": self.cargando,
+            "particiones": len(self._particiones),
+            "insertados": self.insertados,
+            "duplicados": self.duplicados,
+            "consultas": self.consultas,
+            "ms_promedio": round(self.ms_consultas / self.consultas, 2) if self.consultas else 0.0,
+        }
+
+
+def _guardar_resumen(conexion: sqlite3.Connection, resumen: Dict[tuple, list]):
+    conexion.executemany(
+        "INSERT INTO resumen VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (granularidad, bucket, tipo_operacion, usuario_email) DO UPDATE SET "
+        "cantidad = cantidad + excluded.cantidad, "
+        "latencia_n = latencia_n + excluded.latencia_n, "
+        "latencia_suma = latencia_suma + excluded.latencia_suma, "
+        "latencia_min = min(coalesce(latencia_min, excluded.latencia_min), coalesce(excluded.latencia_min, latencia_min)), "
+        "latencia_max = max(coalesce(latencia_max, excluded.latencia_max), coalesce(excluded.latencia_max, latencia_max))",
+        [clave + tuple(valores) for clave, valores in resumen.items()],
+    )
+
+
+def _reconstruir_resumen(conexion: sqlite3.Connection):
+    """Estadísticas de una partición a partir de sus logs (migración)"""
+    resumen: Dict[tuple, list] = {}
+    for fecha, tipo, usuario, registro in conexion.execute(
+        "SELECT fecha, tipo_operacion, usuario_email, registro FROM logs"
+    ):
+        acumular(resumen, fecha, tipo, usuario, duracion_de(json.loads(registro)))
+    with conexion:
+        conexion.execute("DELETE FROM resumen")
+        _guardar_resumen(conexion, resumen)
+        conexion.execute(f"PRAGMA user_version = {_VERSION}")
+
+
+def _particion(fecha_us: int) -> str:
+    fecha = datetime.fromtimestamp(fecha_us / 1_000_000, tz=timezone.utc)
+    return f"{fecha.year:04d}-{fecha.month:02d}"
+
+
+def _particion_fuera(particion: str, desde: int, hasta: int, despues_de: Optional[Clave]) -> bool:
+    """True si ningún log del mes `particion` puede entrar en la consulta"""
+    anio, mes = int(particion[:4]), int(particion[5:])
+    inicio = microsegundos(datetime(anio, mes, 1, tzinfo=timezone.utc))
+    siguiente = datetime(anio + mes // 12, mes % 12 + 1, 1, tzinfo=timezone.utc)
+    fin = microsegundos(siguiente) - 1
+    if despues_de is not None:
+        desde = max(desde, despues_de[0])
+    return fin < desde or inicio > hasta
@@ -12,13 +12,63 @@ class Config(BaseSettings):
     def ROBLE_DATABASE_URL(self) -> str:
         return f"{self.ROBLE_API_URL}/database/{self.ROBLE_DB_NAME}"
 
+    @property
+    def ROBLE_AUTH_LOGIN(self) -> str:
+        return f"{self.ROBLE_API_URL}/auth/{self.ROBLE_DB_NAME}/login"
+
+    # ========== CUENTA DE SERVICIO ==========
+    # Cuenta de ROBLE con la que el log-service inserta lo del spool (no el
+    # token de quien registró el evento, que puede haber vencido)
+    ROBLE_SERVICIO_EMAIL: Optional[str] = None
+    ROBLE_SERVICIO_PASSWORD: Optional[str] = None
+    # Se vuelve a hacer login este tiempo antes de que venza el token
+    ROBLE_SERVICIO_MARGEN_SEGUNDOS: float = Field(default=60.0)
+
     # ========== TIMEOUTS ==========
     ROBLE_TIMEOUT: Optional[int] = None
 
+    # ========== POOL ROBLE ==========
+    ROBLE_POOL_MAX_CONNECTIONS: int = Field(default=50)
+    ROBLE_POOL_MAX_KEEPALIVE: int = Field(default=20)
+    # Reintentos de lecturas ante errores de red o 502/503/504
+    ROBLE_REINTENTOS: int = Field(default=2)
+
     # ========== TABLAS ROBLE ==========
     TABLA_LOGS: Optional[str] = None
     LOG_ID_COLUMN:Optional[str] = None
 
+    # ========== REGISTRO POR LOTES ==========
+    # Registros por llamada a /insert en /registrar-lote
+    LOGS_LOTE_INSERT: int = Field(default=500)
+    # Eventos máximos por petición a /registrar-lote
+    LOGS_LOTE_MAX_EVENTOS: int = Field(default=10000)
+
+    # ========== SPOOL ==========
+    # Cada evento aceptado se escribe primero en el spool local (segmentos
+    # append-only) y se responde de inmediato; un despachador lo envía a
+    # ROBLE en lotes de LOGS_LOTE_INSERT. Debe sobrevivir reinicios.
+    SPOOL_DIR: str = Field(default="spool")
+    # siempre: fsync antes de responder; intervalo: cada SPOOL_FSYNC_SEGUNDOS;
+    # nunca: lo decide el sistema operativo
+    SPOOL_FSYNC: str = Field(default="siempre")
+    SPOOL_FSYNC_SEGUNDOS: float = Field(default=1.0)
+    SPOOL_BYTES_SEGMENTO: int = Field(default=8 * 1024 * 1024)
+    SPOOL_SEGUNDOS_SEGMENTO: float = Field(default=300.0)
+    # Tope de bytes pendientes de envío (0 = sin tope); lleno responde 503
+    SPOOL_MAX_BYTES: int = Field(default=0)
+    # Espera entre reintentos cuando ROBLE falla (se duplica hasta el máximo)
+    SPOOL_BACKOFF_MIN: float = Field(default=0.5)
+    SPOOL_BACKOFF_MAX: float = Field(default=30.0)
+
+    # ========== ALMACÉN LOCAL ==========
+    # Copia indexada de los logs (SQLite, una base por mes) para consultar
+    # por rango de fechas y paginar sin leer toda la tabla de ROBLE
+    ALMACEN_DIR: str = Field(default="almacen")
+    # Máximo de logs por página en /consultar y /consultar-por-usuario
+    LOGS_PAGINA_MAX: int = Field(default=500)
+    # Máximo de filas (bucket × tipo × usuario) por respuesta de /estadisticas
+    ESTADISTICAS_MAX_FILAS: int = Field(default=50000)
+
     # ========== LOGGING ==========
     DEBUG: bool = Field(default=False)
     LOG_LEVEL: str = Field(default="INFO")
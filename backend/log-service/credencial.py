@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+import jwt
+
+from compartido.roble_http import RobleAuthError, RobleClient
+
+logger = logging.getLogger(__name__)
+
+
+class CredencialServicio:
+    """
+    Token de la cuenta de servicio del log-service en ROBLE. Con él se
+    insertan los logs del spool y se lee la tabla para el almacén local,
+    sin depender del token de quien hizo la petición: lo pendiente se envía
+    aunque no lleguen peticiones (por ejemplo tras un reinicio) y la
+    visibilidad de cada usuario la decide el servicio por usuario_email.
+
+    El token se obtiene con login y se renueva `margen` segundos antes de
+    su vencimiento (claim exp) o cuando ROBLE lo rechaza (invalidar).
+    Los logins concurrentes se colapsan en uno.
+    """
+
+    def __init__(self, http: RobleClient, url_login: str, email: Optional[str],
+                 password: Optional[str], margen: float = 60.0):
+        self.http = http
+        self.url_login = url_login
+        self.email = email
+        self.password = password
+        self.margen = margen
+        self._token: Optional[str] = None
+        self._vence: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.logins = 0
+
+    @property
+    def configurada(self) -> bool:
+        return bool(self.email and self.password)
+
+    async def token(self) -> str:
+        """Token vigente de la cuenta de servicio. RobleAuthError si no hay credenciales o ROBLE las rechaza"""
+        if self._vigente():
+            return self._token
+        async with self._lock:
+            if not self._vigente():
+                await self._login()
+            return self._token
+
+    def invalidar(self, token: str):
+        """ROBLE rechazó `token`: el próximo token() hace login de nuevo"""
+        if token == self._token:
+            self._token = None
+            self._vence = None
+
+    def _vigente(self) -> bool:
+        if self._token is None:
+            return False
+        return self._vence is None or time.time() < self._vence - self.margen
+
+    async def _login(self):
+        if not self.configurada:
+            raise RobleAuthError(401, "Cuenta de servicio no configurada (ROBLE_SERVICIO_EMAIL y ROBLE_SERVICIO_PASSWORD)")
+
+        respuesta = await self.http.json(
+            "POST", self.url_login, json={"email": self.email, "password": self.password}
+        )
+        token = respuesta.get("accessToken") if isinstance(respuesta, dict) else None
+        if not token:
+            raise RobleAuthError(401, "ROBLE no retornó token para la cuenta de servicio")
+
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.PyJWTError:
+            exp = None
+        self._token = token
+        self._vence = float(exp) if isinstance(exp, (int, float)) else None
+        self.logins += 1
+        logger.info(f"Cuenta de servicio autenticada en ROBLE: {self.email}")
+
+    def stats(self) -> Dict:
+        return {
+            "configurada": self.configurada,
+            "logins": self.logins,
+            "vence_en_segundos": round(self._vence - time.time()) if self._token and self._vence else None,
+        }
@@ -1,8 +1,10 @@
 import json
-import httpx
 import logging
 from datetime import datetime
 from config import config
+from compartido.singleflight import SingleFlight
+from compartido.json_stream import iterar_array_json
+from compartido.roble_http import RobleAuthError, RobleClient, RobleHTTPError, RobleNoEncontrado
 
 logger = logging.getLogger(__name__)
 
@@ -12,48 +14,79 @@ class LogManager:
     
     def __init__(self):
         self.base_url = config.ROBLE_DATABASE_URL
-        self.timeout = config.ROBLE_TIMEOUT
+        # Pool compartido por todas las llamadas del proceso
+        self.http = RobleClient(
+            base_url=self.base_url,
+            timeout=config.ROBLE_TIMEOUT,
+            max_conexiones=config.ROBLE_POOL_MAX_CONNECTIONS,
+            max_keepalive=config.ROBLE_POOL_MAX_KEEPALIVE,
+            reintentos=config.ROBLE_REINTENTOS,
+        )
+        # Consultas idénticas concurrentes (mismo token) comparten la llamada
+        self.singleflight = SingleFlight()
         logger.info(f"LogManager inicializado con URL: {self.base_url}")
     
-    async def registrar_log(self, log_data, token):
+    async def registrar_logs(self, logs, token, tamano_lote=None):
+        """
+        Inserta varios logs en lotes de `tamano_lote` registros por llamada.
+
+        Si ROBLE rechaza un lote (4xx), se parte en mitades y se reintenta
+        hasta aislar los registros que fallan, así el resto del lote sí se
+        inserta. Retorna {posición en `logs`: motivo} de los que no se
+        insertaron. Los errores de conexión, de token, 429 y 5xx no son de
+        los registros: se propagan para reintentar el lote completo.
+        """
+        tamano_lote = tamano_lote or config.LOGS_LOTE_INSERT
+        for log_data in logs:
+            self._normalizar(log_data)
 
+        errores = {}
+        for inicio in range(0, len(logs), tamano_lote):
+            posiciones = list(range(inicio, min(inicio + tamano_lote, len(logs))))
+            await self._insertar_lote(logs, posiciones, token, errores)
+
+        logger.info(f"Logs registrados: {len(logs) - len(errores)} de {len(logs)}")
+        return errores
+
+    async def _insertar_lote(self, logs, posiciones, token, errores):
         try:
-            logger.debug(f"Registrando log: {log_data.get('tipo_operacion')}")
-
-            for field in ["datos_nuevos", "datos_anteriores"]:
-                if field in log_data and log_data[field] is not None:
-                    try:
-     
-                        if isinstance(log_data[field], list):
-                            log_data[field] = log_data[field][0]
-         
-                        if not isinstance(log_data[field], dict):
-                            log_data[field] = json.loads(json.dumps(log_data[field]))
-                    except Exception as e:
-                        logger.warning(f"⚠️ No se pudo normalizar {field}: {e}")
-                        log_data[field] = None
-                        
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/insert",
-                    json={
-                        "tableName": config.TABLA_LOGS,
-                        "records": [log_data]
-                    },
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-
-                if response.status_code not in [200, 201]:
-                    raise Exception(f"Error en ROBLE: {response.text}")
-                
-                logger.info(f"Log registrado: {log_data.get('tipo_operacion')}")
-                logger.info(log_data)
-                return response.json()
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error de conexión registrando log: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
-    
+            resultado = await self.http.json(
+                "POST", "/insert", token,
+                json={
+                    "tableName": config.TABLA_LOGS,
+                    "records": [logs[i] for i in posiciones]
+                }
+            )
+        except RobleHTTPError as e:
+            if isinstance(e, RobleAuthError) or e.status_code >= 500 or e.status_code == 429:
+                raise
+            if len(posiciones) == 1:
+                errores[posiciones[0]] = str(e)
+                return
+            mitad = len(posiciones) // 2
+            await self._insertar_lote(logs, posiciones[:mitad], token, errores)
+            await self._insertar_lote(logs, posiciones[mitad:], token, errores)
+            return
+
+        # ROBLE puede omitir registros puntuales del lote (skipped: índice y motivo)
+        omitidos = resultado.get("skipped") if isinstance(resultado, dict) else None
+        for omitido in omitidos or []:
+            if isinstance(omitido, dict) and isinstance(omitido.get("index"), int) and omitido["index"] < len(posiciones):
+                errores[posiciones[omitido["index"]]] = str(omitido.get("reason") or "Registro omitido por ROBLE")
+
+    def _normalizar(self, log_data):
+        for field in ["datos_nuevos", "datos_anteriores"]:
+            if field in log_data and log_data[field] is not None:
+                try:
+                    if isinstance(log_data[field], list):
+                        log_data[field] = log_data[field][0]
+
+                    if not isinstance(log_data[field], dict):
+                        log_data[field] = json.loads(json.dumps(log_data[field]))
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo normalizar {field}: {e}")
+                    log_data[field] = None
+
     async def obtener_logs(self, filtros, token):
         """
         Obtiene logs con filtros opcionales
@@ -68,39 +101,54 @@ class LogManager:
         Raises:
             Exception si falla la consulta
         """
+        clave = (tuple(sorted(filtros.items())), token)
+        return await self.singleflight.do(clave, lambda: self._obtener_logs(filtros, token))
+
+    async def _obtener_logs(self, filtros, token):
+        logger.debug(f"Obteniendo logs con filtros: {filtros}")
+
+        # Construir parámetros de query
+        params = {"tableName": config.TABLA_LOGS}
+        params.update(filtros)
+
+        try:
+            data = await self.http.json("GET", "/read", token, params=params)
+        except RobleNoEncontrado:
+            # 404 es que no hay logs; un token rechazado o ROBLE caído se
+            # propagan para no responder como si no hubiera resultados
+            logger.warning(f"No se encontraron logs con los filtros: {filtros}")
+            return []
+
+        logger.debug(f"Se encontraron {len(data) if isinstance(data, list) else 1} logs")
+
+        if isinstance(data, list):
+            return data
+        else:
+            return [data] if data else []
+
+    async def iterar_logs(self, filtros, token, estricto=False):
+        """
+        Itera los logs a medida que se decodifican de la respuesta de ROBLE,
+        sin cargar todos los registros en memoria. Un 404 de ROBLE termina
+        sin resultados (con `estricto` también se propaga); los demás
+        errores siempre se propagan.
+        """
+        params = {"tableName": config.TABLA_LOGS}
+        params.update(filtros)
+
         try:
-            logger.debug(f"Obteniendo logs con filtros: {filtros}")
-            
-            # Construir parámetros de query
-            params = {"tableName": config.TABLA_LOGS}
-            params.update(filtros)
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    f"{self.base_url}/read",
-                    params=params,
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code not in [200, 201]:
-                    logger.warning(f"No se encontraron logs con los filtros: {filtros}")
-                    return []
-                
-                data = response.json()
-                logger.debug(f"Se encontraron {len(data) if isinstance(data, list) else 1} logs")
-                
-                if isinstance(data, list):
-                    return data
-                else:
-                    return [data] if data else []
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error de conexión obteniendo logs: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
-        
+            async with self.http.stream("GET", "/read", token, params=params) as response:
+                async for log in iterar_array_json(response.aiter_bytes()):
+                    yield log
+        except RobleNoEncontrado:
+            if estricto:
+                raise
+            logger.warning(f"No se encontraron logs con los filtros: {filtros}")
+
     def preparar_log(self, tipo_operacion, usuario_email, documento,
                     descripcion=None, datos_nuevos=None, datos_anteriores=None,
-                    pregunta_rag=None, respuesta_rag=None, fecha_transaccion=None):
+                    pregunta_rag=None, respuesta_rag=None, fecha_transaccion=None,
+                    duracion_ms=None):
 
         log_entry = {
             "tipo_operacion": tipo_operacion,
@@ -112,6 +160,9 @@ class LogManager:
             "respuesta_rag": respuesta_rag,
             "fecha_transaccion": (fecha_transaccion or datetime.utcnow()).isoformat()
         }
+        # Solo si se midió: la tabla de ROBLE necesita la columna duracion_ms
+        if duracion_ms is not None:
+            log_entry["duracion_ms"] = duracion_ms
 
         logger.debug(f"Log preparado: {log_entry}")
         return log_entry
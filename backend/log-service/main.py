@@ -1,19 +1,81 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import Optional, Any
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 from datetime import datetime
+import json
 import jwt
+from config import config
 from log_manager import LogManager
+from spool import Despachador, Spool, SpoolLleno
+from credencial import CredencialServicio
+from almacen import (
+    GRANULARIDADES, AlmacenLogs, clave_de, codificar_cursor, decodificar_cursor,
+    estadisticas_en_memoria, pagina_en_memoria, parsear_fecha,
+)
+from compartido.json_stream import NDJSON, acepta_ndjson, respuesta_ndjson
+from compartido.identidad import email_usuario
+from compartido.roble_http import RobleAuthError
 import pytz
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Servicio de Logs")
-security = HTTPBearer()
 log_manager = LogManager()
+spool = Spool(
+    config.SPOOL_DIR,
+    config.SPOOL_FSYNC,
+    config.SPOOL_FSYNC_SEGUNDOS,
+    config.SPOOL_BYTES_SEGMENTO,
+    config.SPOOL_SEGUNDOS_SEGMENTO,
+    config.SPOOL_MAX_BYTES,
+)
+almacen = AlmacenLogs(config.ALMACEN_DIR)
+credencial = CredencialServicio(
+    log_manager.http, config.ROBLE_AUTH_LOGIN,
+    config.ROBLE_SERVICIO_EMAIL, config.ROBLE_SERVICIO_PASSWORD,
+    config.ROBLE_SERVICIO_MARGEN_SEGUNDOS,
+)
+# Tarea de la carga inicial del almacén desde ROBLE (una a la vez)
+_carga_inicial: Optional[asyncio.Task] = None
+
+
+async def _enviar_a_roble(logs, token):
+    """Inserta en ROBLE y agrega al almacén local los que ROBLE aceptó"""
+    errores = await log_manager.registrar_logs(logs, token)
+    await almacen.agregar([log for i, log in enumerate(logs) if i not in errores])
+    return errores
+
+
+despachador = Despachador(
+    spool, _enviar_a_roble, credencial, config.LOGS_LOTE_INSERT,
+    config.SPOOL_BACKOFF_MIN, config.SPOOL_BACKOFF_MAX,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await log_manager.http.iniciar()
+    spool.iniciar()
+    almacen.iniciar()
+    if not credencial.configurada:
+        logger.error("Sin ROBLE_SERVICIO_EMAIL y ROBLE_SERVICIO_PASSWORD los logs quedan en el spool sin enviarse")
+    await despachador.iniciar()
+    if not almacen.listo:
+        _iniciar_carga()
+    yield
+    await despachador.cerrar()
+    if _carga_inicial is not None:
+        _carga_inicial.cancel()
+        await asyncio.gather(_carga_inicial, return_exceptions=True)
+    await almacen.cerrar()
+    await spool.cerrar()
+    await log_manager.http.cerrar()
+
+app = FastAPI(title="Servicio de Logs", lifespan=lifespan)
+security = HTTPBearer()
 
 
 # ========== MODELOS ==========
@@ -28,6 +90,7 @@ class RegistrarLogRequest(BaseModel):
     pregunta_rag: Optional[str] = None
     respuesta_rag: Optional[str] = None
     fecha_transaccion: Optional[datetime] = None
+    duracion_ms: Optional[float] = None      # Latencia de la operación, si se midió
 
 
 class ConsultarLogsRequest(BaseModel):
@@ -43,102 +106,391 @@ class ConsultarLogsRequest(BaseModel):
 @app.post("/registrar")
 async def registrar_log(
     request: RegistrarLogRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
 ):
     """
-    Registra una operación en el sistema de logs
+    Registra una operación del usuario verificado en el sistema de logs.
+    Se responde apenas queda en el spool local; el envío a ROBLE es en
+    segundo plano (con la cuenta de servicio).
     """
+    if request.usuario_email != email:
+        raise HTTPException(status_code=403, detail="usuario_email no coincide con el usuario autenticado")
     try:
         logger.info(f"Registrando log: {request.tipo_operacion} para documento {request.documento_afectado}")
 
-        # Si no envían fecha, se usa la actual
-        fecha = datetime.now(pytz.timezone("America/Bogota"))
-
         # Preparar log completo
-        log_data = log_manager.preparar_log(
-            tipo_operacion=request.tipo_operacion,
-            usuario_email=request.usuario_email,
-            documento=request.documento_afectado,
-            datos_nuevos=request.datos_nuevos,
-            datos_anteriores=request.datos_anteriores,
-            pregunta_rag=request.pregunta_rag,
-            respuesta_rag=request.respuesta_rag,
-            fecha_transaccion=fecha
-        )
+        log_data = _preparar_log(request)
 
-        # Insertar en ROBLE
-        resultado = await log_manager.registrar_log(log_data, credentials.credentials)
+        await spool.agregar([log_data])
 
         logger.info(f"✅ Log registrado exitosamente: {request.tipo_operacion}")
         return {
             "status": "success",
             "message": "Log registrado",
-            "data": resultado
+            "data": log_data
         }
 
+    except SpoolLleno as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error registrando log: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+@app.post("/registrar-lote")
+async def registrar_logs_lote(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
+):
+    """
+    Registra varias operaciones de una vez: un array JSON de eventos o
+    NDJSON (Content-Type: application/x-ndjson), con los mismos campos de
+    /registrar. Los válidos quedan en el spool (y llegan a ROBLE en lotes
+    de LOGS_LOTE_INSERT); se responde el resultado de cada evento, en el
+    orden en que llegaron. Un evento de otro usuario_email que el
+    verificado se rechaza como inválido.
+    """
+    try:
+        eventos = await _leer_eventos(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(eventos) > config.LOGS_LOTE_MAX_EVENTOS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {config.LOGS_LOTE_MAX_EVENTOS} eventos por petición"
+        )
+
+    resultados = [None] * len(eventos)
+    logs, posiciones = [], []
+    for i, evento in enumerate(eventos):
+        try:
+            log = RegistrarLogRequest.model_validate(evento)
+            if log.usuario_email != email:
+                resultados[i] = {"indice": i, "status": "invalido", "motivo": "usuario_email no coincide con el usuario autenticado"}
+                continue
+            logs.append(_preparar_log(log))
+            posiciones.append(i)
+        except ValidationError as e:
+            motivos = [f"{'.'.join(str(c) for c in err['loc']) or 'evento'}: {err['msg']}" for err in e.errors()]
+            resultados[i] = {"indice": i, "status": "invalido", "motivo": "; ".join(motivos)}
+
+    try:
+        if logs:
+            await spool.agregar(logs)
+    except SpoolLleno as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error registrando lote de logs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+    for i in posiciones:
+        resultados[i] = {"indice": i, "status": "registrado"}
+
+    registrados = len(logs)
+    logger.info(f"✅ Lote de logs: {registrados} de {len(eventos)} registrados")
+    return {
+        "status": "success" if registrados == len(eventos) else "partial",
+        "total": len(eventos),
+        "registrados": registrados,
+        "rechazados": len(eventos) - registrados,
+        "resultados": resultados
+    }
+
+
 @app.get("/consultar")
 async def consultar_logs(
     tipo_operacion: Optional[str] = None,
     documento: Optional[str] = None,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=config.LOGS_PAGINA_MAX),
+    cursor: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
 ):
-    """Consulta logs con filtros opcionales"""
-    try:
-        logger.info(f"Consultando logs con filtros: tipo={tipo_operacion}, doc={documento}")
+    """
+    Consulta los logs del usuario con filtros opcionales y rango de fechas
+    (ISO; sin zona horaria es hora de Bogotá, una fecha_hasta sin hora
+    incluye todo el día). Con `limit` pagina en orden de fecha:
+    `siguiente_cursor` trae la página siguiente. NDJSON en streaming con
+    Accept: application/x-ndjson.
+    """
+    logger.info(f"Consultando logs con filtros: tipo={tipo_operacion}, doc={documento}, desde={fecha_desde}, hasta={fecha_hasta}")
 
-        filtros = {}
-        if tipo_operacion:
-            filtros["tipo_operacion"] = tipo_operacion
-        if documento:
-            filtros["documento_afectado"] = documento
+    filtros = {"usuario_email": email}
+    if tipo_operacion:
+        filtros["tipo_operacion"] = tipo_operacion
+    if documento:
+        filtros["documento_afectado"] = documento
 
-        resultado = await log_manager.obtener_logs(filtros, credentials.credentials)
-        logger.info(f"estoy aqui cabron --------------------------------------------x2")
-        if not resultado:
-            return {"status": "success", "message": "Sin resultados", "data": []}
-
-        return {
-            "status": "success",
-            "message": f"Se encontraron {len(resultado)} registros",
-            "data": resultado
-        }
-
-    except Exception as e:
-        logger.error(f"Error consultando logs: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await _consultar(filtros, fecha_desde, fecha_hasta, limit, cursor, accept, "Sin resultados")
 
 
 @app.get("/consultar-por-usuario")
 async def consultar_logs_por_usuario(
     usuario_email: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=config.LOGS_PAGINA_MAX),
+    cursor: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
+):
+    """
+    Consulta logs por email del usuario, con el mismo rango de fechas y
+    paginación de /consultar. Cada usuario solo ve sus propios logs.
+    """
+    logger.info(f"Consultando logs del usuario: {usuario_email}")
+    if usuario_email != email:
+        raise HTTPException(status_code=403, detail="Solo puede consultar sus propios logs")
+    return await _consultar(
+        {"usuario_email": usuario_email}, fecha_desde, fecha_hasta, limit, cursor, accept,
+        f"Sin registros para {usuario_email}"
+    )
+
+
+@app.get("/estadisticas")
+async def estadisticas_logs(
+    granularidad: str = "hora",
+    tipo_operacion: Optional[str] = None,
+    usuario_email: Optional[str] = None,
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    detalle: bool = True,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
 ):
-    """Consulta logs por email del usuario"""
+    """
+    Cantidad de operaciones del usuario por tipo_operacion y bucket
+    (minuto, hora o dia de Bogotá) en el rango de fechas, con la latencia
+    (duracion_ms) cuando los logs la traen. Se responde de las
+    estadísticas que el almacén calcula al recibir cada log. Con
+    detalle=false solo los totales por tipo_operacion. Como en /consultar,
+    cada usuario solo ve sus propias operaciones.
+    """
+    if granularidad not in GRANULARIDADES:
+        raise HTTPException(status_code=400, detail=f"granularidad debe ser una de: {', '.join(GRANULARIDADES)}")
     try:
-        logger.info(f"Consultando logs del usuario: {usuario_email}")
-        filtros = {"usuario_email": usuario_email}
+        desde = parsear_fecha(fecha_desde)
+        hasta = parsear_fecha(fecha_hasta, fin_del_dia=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if usuario_email and usuario_email != email:
+        raise HTTPException(status_code=403, detail="Solo puede consultar sus propias estadísticas")
 
-        resultado = await log_manager.obtener_logs(filtros, credentials.credentials)
+    filtros = {"usuario_email": email}
+    if tipo_operacion:
+        filtros["tipo_operacion"] = tipo_operacion
 
-        if not resultado:
-            return {"status": "success", "message": f"Sin registros para {usuario_email}", "data": []}
+    token = None
+    try:
+        if almacen.listo:
+            resumen = await almacen.estadisticas(granularidad, filtros, desde, hasta)
+        else:
+            _iniciar_carga()
+            token = await credencial.token()
+            logs = await log_manager.obtener_logs(filtros, token)
+            resumen = estadisticas_en_memoria(logs, granularidad, filtros, desde, hasta)
+    except RobleAuthError as e:
+        if token is not None:
+            credencial.invalidar(token)
+        logger.error(f"ROBLE rechazó la cuenta de servicio calculando estadísticas: {str(e)}")
+        raise HTTPException(status_code=503, detail="Logs no disponibles: ROBLE rechazó la cuenta de servicio")
+    except Exception as e:
+        logger.error(f"Error calculando estadísticas de logs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-        return {
+    if detalle and len(resumen) > config.ESTADISTICAS_MAX_FILAS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Más de {config.ESTADISTICAS_MAX_FILAS} filas: reduzca el rango o use una granularidad mayor"
+        )
+
+    zona = pytz.timezone("America/Bogota")
+    data, totales, fechas = [], {}, {}
+    for (_, bucket, tipo, usuario), (cantidad, n, suma, minimo, maximo) in sorted(resumen.items()):
+        totales[tipo] = totales.get(tipo, 0) + cantidad
+        if not detalle:
+            continue
+        if bucket not in fechas:
+            fechas[bucket] = datetime.fromtimestamp(bucket / 1_000_000, tz=pytz.utc).astimezone(zona).isoformat()
+        fila = {
+            "bucket": fechas[bucket],
+            "tipo_operacion": tipo,
+            "usuario_email": usuario,
+            "cantidad": cantidad,
+        }
+        if n:
+            fila["latencia_ms"] = {"n": n, "promedio": round(suma / n, 2), "min": minimo, "max": maximo}
+        data.append(fila)
+
+    return {
+        "status": "success",
+        "granularidad": granularidad,
+        "total": sum(totales.values()),
+        "totales": totales,
+        "data": data
+    }
+
+
+# ========== FUNCIONES AUXILIARES ==========
+
+async def _consultar(filtros, fecha_desde, fecha_hasta, limit, cursor, accept, sin_resultados):
+    """
+    Responde desde el almacén local; mientras no tiene la carga inicial,
+    desde ROBLE con la cuenta de servicio (filtrando fechas y paginando en
+    memoria) y la inicia. `filtros` siempre trae el usuario_email de quien
+    consulta: la cuenta de servicio ve los logs de todos.
+    """
+    try:
+        desde = parsear_fecha(fecha_desde)
+        hasta = parsear_fecha(fecha_hasta, fin_del_dia=True)
+        despues_de = decodificar_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    token = None
+    try:
+        if not almacen.listo:
+            _iniciar_carga()
+            token = await credencial.token()
+
+        if acepta_ndjson(accept):
+            if almacen.listo:
+                return await respuesta_ndjson(almacen.iterar(filtros, desde, hasta))
+            return await respuesta_ndjson(_en_rango(log_manager.iterar_logs(filtros, token), desde, hasta))
+
+        siguiente = None
+        if almacen.listo:
+            resultado, siguiente = await almacen.consultar(filtros, desde, hasta, limit, despues_de)
+        else:
+            resultado = await log_manager.obtener_logs(filtros, token)
+            if desde is not None or hasta is not None or limit is not None or despues_de is not None:
+                resultado, siguiente = pagina_en_memoria(resultado, desde, hasta, limit, despues_de)
+
+        respuesta = {
             "status": "success",
-            "message": f"Se encontraron {len(resultado)} registros",
+            "message": f"Se encontraron {len(resultado)} registros" if resultado else sin_resultados,
             "data": resultado
         }
+        if limit is not None:
+            respuesta["siguiente_cursor"] = codificar_cursor(siguiente) if siguiente is not None else None
+        return respuesta
 
+    except RobleAuthError as e:
+        if token is not None:
+            credencial.invalidar(token)
+        logger.error(f"ROBLE rechazó la cuenta de servicio consultando logs: {str(e)}")
+        raise HTTPException(status_code=503, detail="Logs no disponibles: ROBLE rechazó la cuenta de servicio")
     except Exception as e:
-        logger.error(f"Error consultando logs por usuario: {str(e)}")
+        logger.error(f"Error consultando logs: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+async def _en_rango(logs, desde, hasta):
+    async for log in logs:
+        fecha = clave_de(log)[0]
+        if (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta):
+            yield log
+
+
+def _iniciar_carga():
+    """
+    Carga en el almacén todo lo que ya hay en ROBLE, en segundo plano, con
+    la cuenta de servicio (nunca con el token de quien consulta: el almacén
+    sirve a todos los usuarios)
+    """
+    global _carga_inicial
+    if _carga_inicial is not None and not _carga_inicial.done():
+        return
+
+    async def cargar():
+        token = None
+        try:
+            token = await credencial.token()
+            await almacen.cargar(log_manager.iterar_logs({}, token, estricto=True))
+        except asyncio.CancelledError:
+            raise
+        except RobleAuthError as e:
+            if token is not None:
+                credencial.invalidar(token)
+            logger.error(f"Carga inicial del almacén de logs: ROBLE rechazó la cuenta de servicio: {str(e)}")
+        except Exception as e:
+            # Se reintenta con la próxima consulta
+            logger.error(f"Error en la carga inicial del almacén de logs: {str(e)}")
+
+    _carga_inicial = asyncio.create_task(cargar())
+
+
+def _preparar_log(request: RegistrarLogRequest):
+    # Si no envían fecha, se usa la actual. Los servicios la envían al
+    # emitir el evento, que puede llegar aquí un rato después
+    zona = pytz.timezone("America/Bogota")
+    fecha = datetime.now(zona)
+    if request.fecha_transaccion is not None:
+        fecha = request.fecha_transaccion
+        fecha = zona.localize(fecha) if fecha.tzinfo is None else fecha.astimezone(zona)
+
+    return log_manager.preparar_log(
+        tipo_operacion=request.tipo_operacion,
+        usuario_email=request.usuario_email,
+        documento=request.documento_afectado,
+        datos_nuevos=request.datos_nuevos,
+        datos_anteriores=request.datos_anteriores,
+        pregunta_rag=request.pregunta_rag,
+        respuesta_rag=request.respuesta_rag,
+        fecha_transaccion=fecha,
+        duracion_ms=request.duracion_ms
+    )
+
+
+async def _leer_eventos(request: Request):
+    """Eventos del cuerpo de /registrar-lote (array JSON o NDJSON)"""
+    if NDJSON in (request.headers.get("content-type") or ""):
+        eventos = []
+        pendiente = b""
+        async for chunk in request.stream():
+            lineas = (pendiente + chunk).split(b"\n")
+            pendiente = lineas.pop()
+            eventos.extend(_linea_ndjson(linea, len(eventos) + 1) for linea in lineas if linea.strip())
+            if len(eventos) > config.LOGS_LOTE_MAX_EVENTOS:
+                # Se corta sin leer el resto del cuerpo
+                return eventos
+        if pendiente.strip():
+            eventos.append(_linea_ndjson(pendiente, len(eventos) + 1))
+        return eventos
+
+    try:
+        eventos = json.loads(await request.body())
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON inválido: {e.msg}")
+    if not isinstance(eventos, list):
+        raise ValueError("Se esperaba un array JSON de eventos")
+    return eventos
+
+
+def _linea_ndjson(linea: bytes, n: int):
+    try:
+        return json.loads(linea)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Evento {n}: JSON inválido ({e.msg})")
+
+
+@app.get("/metricas")
+async def metricas():
+    """Consultas a ROBLE realizadas y colapsadas, tiempos por operación, spool y almacén local"""
+    return {
+        "roble_singleflight": log_manager.singleflight.stats(),
+        "roble_http": log_manager.http.stats(),
+        "spool": despachador.stats(),
+        "almacen": almacen.stats(),
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Health check para Docker"""
@@ -0,0 +1,462 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from compartido.roble_http import RobleAuthError, RobleError
+from credencial import CredencialServicio
+
+logger = logging.getLogger(__name__)
+
+# ========== POLÍTICAS DE FSYNC ==========
+FSYNC_SIEMPRE = "siempre"       # fsync antes de responder (cada grupo de escrituras)
+FSYNC_INTERVALO = "intervalo"   # a lo sumo cada `segundos_fsync`
+FSYNC_NUNCA = "nunca"           # lo decide el sistema operativo
+
+_SEGMENTO = re.compile(r"segmento-(\d{10})\.log")
+_CURSOR = "cursor.json"
+_RECHAZADOS = "rechazados.log"
+
+
+class SpoolLleno(Exception):
+    pass
+
+
+class Spool:
+    """
+    Write-ahead log de los eventos de auditoría aceptados y aún no enviados
+    a ROBLE. Son segmentos append-only <directorio>/segmento-<n>.log con un
+    evento por línea ({"t": recibido, "log": registro}) y cursor.json con
+    hasta dónde ya se confirmó el envío (segmento y offset).
+
+    Las escrituras concurrentes se agrupan: un solo write (y un solo fsync,
+    según la política) por grupo. Un segmento se cierra al pasar de
+    `bytes_segmento` o de `segundos_segmento` de antigüedad, y se borra
+    cuando todo su contenido está confirmado. Al reiniciar se retoma desde
+    el cursor; una línea a medias al final de un segmento (caída durante
+    una escritura, nunca confirmada) se ignora.
+
+    Lo leído y no confirmado se vuelve a leer: la entrega es al menos una vez.
+    """
+
+    def __init__(
+        self,
+        directorio: str,
+        fsync: str = FSYNC_SIEMPRE,
+        segundos_fsync: float = 1.0,
+        bytes_segmento: int = 8 * 1024 * 1024,
+        segundos_segmento: float = 300.0,
+        max_bytes: int = 0,
+    ):
+        if fsync not in (FSYNC_SIEMPRE, FSYNC_INTERVALO, FSYNC_NUNCA):
+            raise ValueError(f"Política de fsync inválida: {fsync}")
+        self.directorio = directorio
+        self.fsync = fsync
+        self.segundos_fsync = segundos_fsync
+        self.bytes_segmento = bytes_segmento
+        self.segundos_segmento = segundos_segmento
+        self.max_bytes = max_bytes
+
+        self._tamanos: Dict[int, int] = {}     # segmento -> bytes escritos
+        self._activo = 0
+        self._archivo = None
+        self._abierto_en = 0.0
+        self._ultimo_fsync = 0.0
+        self._sin_fsync = False
+        self._cursor: Tuple[int, int] = (0, 0)
+        self._lock = asyncio.Lock()
+        self._en_espera: List[Tuple[bytes, int, asyncio.Future]] = []
+        self._escritor: Optional[asyncio.Task] = None
+        self._hay_datos = asyncio.Event()
+        # Recepción del evento más antiguo sin confirmar (para el lag)
+        self._t_pendiente: Optional[float] = None
+
+        self.eventos_pendientes = 0
+        self.recibidos = 0
+        self.confirmados = 0
+        self.rechazados = 0
+        self.corruptos = 0
+        self.grupos = 0
+
+    def ruta(self, segmento: int) -> str:
+        return os.path.join(self.directorio, f"segmento-{segmento:010d}.log")
+
+    # ========== RECUPERACIÓN ==========
+
+    def iniciar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        segmentos = sorted(
+            int(m[1]) for m in (_SEGMENTO.fullmatch(n) for n in os.listdir(self.directorio)) if m
+        )
+        cursor = self._leer_cursor()
+        if cursor is None or cursor[0] not in segmentos:
+            cursor = (segmentos[0], 0) if segmentos else (1, 0)
+
+        for segmento in segmentos:
+            if segmento < cursor[0]:
+                # Ya confirmado: quedó de una caída entre el cursor y el borrado
+                os.unlink(self.ruta(segmento))
+                continue
+            self._tamanos[segmento] = os.path.getsize(self.ruta(segmento))
+            with open(self.ruta(segmento), "rb") as f:
+                if segmento == cursor[0]:
+                    f.seek(cursor[1])
+                self.eventos_pendientes += sum(bloque.count(b"\n") for bloque in iter(lambda: f.read(1 << 20), b""))
+
+        # Siempre se escribe en un segmento nuevo: el último pudo quedar con
+        # una línea a medias
+        self._cursor = cursor
+        self._abrir(max(self._tamanos, default=cursor[0] - 1) + 1)
+        if cursor[0] not in self._tamanos:
+            self._cursor = (self._activo, 0)
+        self._guardar_cursor()
+        if self.eventos_pendientes:
+            self._t_pendiente = time.time()
+            self._hay_datos.set()
+        logger.info(
+            f"Spool: {self.eventos_pendientes} eventos pendientes en {len(self._tamanos) - 1} segmentos"
+        )
+
+    async def cerrar(self):
+        if self._escritor is not None:
+            await asyncio.gather(self._escritor, return_exceptions=True)
+        async with self._lock:
+            if self._archivo is not None:
+                if self.fsync != FSYNC_NUNCA:
+                    os.fsync(self._archivo.fileno())
+                self._archivo.close()
+                self._archivo = None
+
+    # ========== ESCRITURA ==========
+
+    async def agregar(self, registros: List[Dict]):
+        """
+        Escribe los registros en el spool y retorna cuando quedaron escritos
+        (y sincronizados con FSYNC_SIEMPRE). SpoolLleno si pasa de max_bytes.
+        """
+        ahora = time.time()
+        datos = b"".join(
+            json.dumps({"t": ahora, "log": r}, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+            for r in registros
+        )
+        if self.max_bytes and self.bytes_pendientes() + len(datos) > self.max_bytes:
+            raise SpoolLleno("El spool de logs está lleno")
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_espera.append((datos, len(registros), futuro))
+        if self._escritor is None or self._escritor.done():
+            self._escritor = asyncio.create_task(self._escribir_en_espera())
+        # Si quien espera se cancela, la escritura sigue igual
+        await asyncio.shield(futuro)
+
+    async def _escribir_en_espera(self):
+        # Lo que llega mientras se escribe un grupo forma el siguiente
+        while self._en_espera:
+            grupo, self._en_espera = self._en_espera, []
+            datos = b"".join(datos for datos, _, _ in grupo)
+            try:
+                async with self._lock:
+                    await asyncio.to_thread(self._escribir, datos)
+            except Exception as e:
+                logger.error(f"Spool: no se pudo escribir: {str(e)}")
+                # Lo que alcanzó a quedar en el archivo se enviará igual
+                # (quien llamó recibe el error: al menos una vez)
+                try:
+                    self._tamanos[self._activo] = os.path.getsize(self.ruta(self._activo))
+                except OSError:
+                    pass
+                for _, _, futuro in grupo:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            # El despachador solo lee hasta el tamaño ya contado como pendiente
+            self._tamanos[self._activo] += len(datos)
+            eventos = sum(n for _, n, _ in grupo)
+            if not self.eventos_pendientes:
+                self._t_pendiente = time.time()
+            self.eventos_pendientes += eventos
+            self.recibidos += eventos
+            self.grupos += 1
+            self._hay_datos.set()
+            for _, _, futuro in grupo:
+                if not futuro.done():
+                    futuro.set_result(None)
+
+    def _escribir(self, datos: bytes):
+        ahora = time.monotonic()
+        tamano = self._tamanos[self._activo]
+        if tamano and (tamano >= self.bytes_segmento or ahora - self._abierto_en >= self.segundos_segmento):
+            self._rotar()
+        self._archivo.write(datos)
+        self._archivo.flush()
+        self._sin_fsync = True
+        if self.fsync == FSYNC_SIEMPRE or (
+            self.fsync == FSYNC_INTERVALO and ahora - self._ultimo_fsync >= self.segundos_fsync
+        ):
+            self._sincronizar()
+
+    def _sincronizar(self):
+        if self._archivo is not None and self._sin_fsync:
+            os.fsync(self._archivo.fileno())
+            self._ultimo_fsync = time.monotonic()
+            self._sin_fsync = False
+
+    async def sincronizar(self):
+        """fsync de lo escrito (con FSYNC_INTERVALO, si nadie más escribe)"""
+        if self.fsync == FSYNC_NUNCA or not self._sin_fsync:
+            return
+        async with self._lock:
+            await asyncio.to_thread(self._sincronizar)
+
+    def _rotar(self):
+        if self.fsync != FSYNC_NUNCA:
+            os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        self._sin_fsync = False
+        self._abrir(self._activo + 1)
+
+    def _abrir(self, segmento: int):
+        self._archivo = open(self.ruta(segmento), "ab")
+        self._activo = segmento
+        self._tamanos[segmento] = self._archivo.tell()
+        self._abierto_en = time.monotonic()
+        if self.fsync != FSYNC_NUNCA:
+            # Que el archivo nuevo sobreviva a una caída del sistema
+            fd = os.open(self.directorio, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # ========== LECTURA ==========
+
+    async def leer(self, max_eventos: int) -> Tuple[List[Dict], Tuple[int, int], bool]:
+        """
+        Hasta `max_eventos` eventos desde el cursor. Retorna (eventos,
+        posición tras el último, agotado): agotado si el segmento del cursor
+        ya está cerrado y no le quedan líneas completas.
+        """
+        # Lo que se escriba desde ahora vuelve a despertar a esperar_datos()
+        self._hay_datos.clear()
+        segmento, offset = self._cursor
+        fin = self._tamanos.get(segmento, 0)
+        cerrado = segmento != self._activo
+        eventos, offset, completo = await asyncio.to_thread(self._leer, segmento, offset, fin, max_eventos)
+        if eventos:
+            self._t_pendiente = eventos[0].get("t") or self._t_pendiente
+        return eventos, (segmento, offset), cerrado and completo
+
+    def _leer(self, segmento: int, offset: int, fin: int, max_eventos: int):
+        eventos = []
+        with open(self.ruta(segmento), "rb") as f:
+            f.seek(offset)
+            while len(eventos) < max_eventos and offset < fin:
+                linea = f.readline()
+                if not linea.endswith(b"\n"):
+                    # Línea a medias al final: nunca se confirmó su escritura
+                    return eventos, offset, True
+                offset += len(linea)
+                try:
+                    eventos.append(json.loads(linea))
+                except ValueError:
+                    self.corruptos += 1
+                    logger.warning(f"Spool: línea corrupta en el segmento {segmento}")
+        return eventos, offset, offset >= fin
+
+    async def esperar_datos(self, segundos: float):
+        """Espera a que se escriba algo después del último leer()"""
+        try:
+            await asyncio.wait_for(self._hay_datos.wait(), segundos)
+        except asyncio.TimeoutError:
+            pass
+
+    @property
+    def cursor(self) -> Tuple[int, int]:
+        return self._cursor
+
+    # ========== CONFIRMACIÓN ==========
+
+    async def confirmar(self, posicion: Tuple[int, int], eventos: int):
+        """Los eventos hasta `posicion` ya están en ROBLE (o descartados)"""
+        self._cursor = posicion
+        self.eventos_pendientes = max(0, self.eventos_pendientes - eventos)
+        self.confirmados += eventos
+        if not self.eventos_pendientes:
+            self._t_pendiente = None
+        await asyncio.to_thread(self._guardar_cursor)
+
+    async def avanzar(self):
+        """El segmento del cursor (cerrado) ya se envió entero: se borra"""
+        segmento = self._cursor[0]
+        if segmento == self._activo:
+            return
+        self._cursor = (min(s for s in self._tamanos if s > segmento), 0)
+        await asyncio.to_thread(self._guardar_cursor)
+        del self._tamanos[segmento]
+        await asyncio.to_thread(os.unlink, self.ruta(segmento))
+
+    async def rechazar(self, eventos: List[Dict], motivos: List[str]):
+        """Eventos que ROBLE no acepta: quedan en rechazados.log para revisión"""
+        datos = b"".join(
+            json.dumps({**e, "motivo": m}, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+            for e, m in zip(eventos, motivos)
+        )
+        await asyncio.to_thread(_agregar_archivo, os.path.join(self.directorio, _RECHAZADOS), datos)
+        self.rechazados += len(eventos)
+
+    def _leer_cursor(self) -> Optional[Tuple[int, int]]:
+        try:
+            with open(os.path.join(self.directorio, _CURSOR)) as f:
+                datos = json.load(f)
+            return int(datos["segmento"]), int(datos["offset"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Spool: cursor ilegible, se reenvía desde el primer segmento: {str(e)}")
+            return None
+
+    def _guardar_cursor(self):
+        # Temporal + rename: el cursor nunca queda a medias
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, prefix=".cursor-")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"segmento": self._cursor[0], "offset": self._cursor[1]}, f)
+        os.replace(tmp, os.path.join(self.directorio, _CURSOR))
+
+    def bytes_pendientes(self) -> int:
+        segmento, offset = self._cursor
+        return sum(t for s, t in self._tamanos.items() if s >= segmento) - offset
+
+    def stats(self) -> Dict:
+        return {
+            "eventos_pendientes": self.eventos_pendientes,
+            "bytes_pendientes": self.bytes_pendientes(),
+            "segmentos": len(self._tamanos),
+            "lag_segundos": round(time.time() - self._t_pendiente, 1) if self._t_pendiente else 0.0,
+            "recibidos": self.recibidos,
+            "confirmados": self.confirmados,
+            "rechazados": self.rechazados,
+            "corruptos": self.corruptos,
+            "grupos_escritos": self.grupos,
+            "fsync": self.fsync,
+        }
+
+
+def _agregar_archivo(ruta: str, datos: bytes):
+    with open(ruta, "ab") as f:
+        f.write(datos)
+
+
+class Despachador:
+    """
+    Envía a ROBLE lo que hay en el spool, por lotes de `lote` eventos y en
+    orden, y confirma cada lote al terminar. Ante errores de conexión, 5xx
+    o 429 reintenta el mismo lote con backoff exponencial; los registros
+    que ROBLE rechaza de forma puntual van a rechazados.log.
+
+    Se inserta con el token de la cuenta de servicio (`credencial`), no con
+    el de quien registró el evento: el spool no guarda tokens y lo pendiente
+    sale apenas arranca el servicio. Si ROBLE rechaza el token se invalida
+    y el reintento hace login de nuevo.
+    """
+
+    def __init__(
+        self,
+        spool: Spool,
+        enviar: Callable[[List[Dict], str], Awaitable[Dict[int, str]]],
+        credencial: CredencialServicio,
+        lote: int = 500,
+        backoff_min: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.spool = spool
+        self.enviar = enviar
+        self.credencial = credencial
+        self.lote = max(1, lote)
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self._tarea: Optional[asyncio.Task] = None
+        self.lotes = 0
+        self.reintentos = 0
+        self.ultimo_envio: Optional[float] = None
+        self.ultimo_error: Optional[str] = None
+
+    async def iniciar(self):
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._trabajar())
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    async def _trabajar(self):
+        espera = self.backoff_min
+        while True:
+            token = None
+            try:
+                eventos, posicion, agotado = await self.spool.leer(self.lote)
+                if not eventos:
+                    if posicion != self.spool.cursor:
+                        # Solo había líneas corruptas
+                        await self.spool.confirmar(posicion, 0)
+                    elif agotado:
+                        await self.spool.avanzar()
+                    else:
+                        await self.spool.esperar_datos(self.spool.segundos_fsync)
+                        await self.spool.sincronizar()
+                    continue
+
+                token = await self.credencial.token()
+                registros = [e.get("log") for e in eventos]
+                errores = await self.enviar(registros, token)
+            except asyncio.CancelledError:
+                raise
+            except RobleAuthError as e:
+                # Token vencido o revocado (o credenciales rechazadas): el
+                # reintento hace login otra vez
+                if token is not None:
+                    self.credencial.invalidar(token)
+                self.reintentos += 1
+                self.ultimo_error = str(e)
+                logger.warning(f"Spool: ROBLE rechazó la cuenta de servicio, reintento en {espera:.1f}s: {str(e)}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.backoff_max)
+                continue
+            except (RobleError, OSError) as e:
+                self.reintentos += 1
+                self.ultimo_error = str(e)
+                logger.warning(f"Spool: envío fallido, reintento en {espera:.1f}s: {str(e)}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.backoff_max)
+                continue
+            except Exception as e:
+                self.reintentos += 1
+                self.ultimo_error = str(e)
+                logger.error(f"Spool: error inesperado enviando a ROBLE: {str(e)}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.backoff_max)
+                continue
+
+            espera = self.backoff_min
+            if errores:
+                posiciones = sorted(errores)
+                await self.spool.rechazar([eventos[i] for i in posiciones], [errores[i] for i in posiciones])
+            await self.spool.confirmar(posicion, len(eventos))
+            self.lotes += 1
+            self.ultimo_envio = time.time()
+
+    def stats(self) -> Dict:
+        return {
+            **self.spool.stats(),
+            "lotes_enviados": self.lotes,
+            "reintentos": self.reintentos,
+            "ultimo_envio": self.ultimo_envio,
+            "ultimo_error": self.ultimo_error,
+            "credencial": self.credencial.stats(),
+        }
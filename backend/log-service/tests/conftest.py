@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del servicio se importan como en el contenedor (desde su carpeta)
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from compartido.roble_http import RobleAuthError, RobleHTTPError, RobleNoEncontrado
+from log_manager import LogManager
+
+
+class RobleFalso:
+    def __init__(self, error):
+        self.error = error
+
+    async def json(self, method, url, token=None, **kwargs):
+        raise self.error
+
+
+def _obtener(error):
+    manager = LogManager()
+    manager.http = RobleFalso(error)
+    return asyncio.run(manager.obtener_logs({"usuario_email": "a@x"}, "tok"))
+
+
+def test_sin_logs_es_lista_vacia():
+    assert _obtener(RobleNoEncontrado(404, "sin datos")) == []
+
+
+@pytest.mark.parametrize("error", [RobleAuthError(401, "token vencido"), RobleHTTPError(503, "caído")])
+def test_token_rechazado_o_roble_caido_se_propagan(error):
+    with pytest.raises(type(error)):
+        _obtener(error)
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from compartido import identidad
+from compartido.roble_http import RobleAuthError
+from compartido.identidad import cabeceras_identidad
+import main
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(identidad.config, "GATEWAY_SHARED_SECRET", "secreto")
+    en_spool = []
+
+    async def agregar(registros):
+        en_spool.extend(registros)
+
+    monkeypatch.setattr(main.spool, "agregar", agregar)
+    return TestClient(main.app), en_spool
+
+
+def _evento(email, doc="1"):
+    return {"tipo_operacion": "CREAR", "usuario_email": email, "documento_afectado": doc}
+
+
+def test_registrar_exige_identidad_verificada(cliente):
+    client, en_spool = cliente
+
+    sin_firma = client.post("/registrar", json=_evento("a@x"), headers={"Authorization": "Bearer tok"})
+    otro_usuario = client.post("/registrar", json=_evento("b@x"), headers=cabeceras_identidad("tok", "a@x"))
+    propio = client.post("/registrar", json=_evento("a@x"), headers=cabeceras_identidad("tok", "a@x"))
+
+    assert sin_firma.status_code == 401
+    assert otro_usuario.status_code == 403
+    assert propio.status_code == 200
+    assert [log["usuario_email"] for log in en_spool] == ["a@x"]
+
+
+def test_registrar_lote_rechaza_eventos_de_otro_usuario(cliente):
+    client, en_spool = cliente
+
+    respuesta = client.post(
+        "/registrar-lote", json=[_evento("a@x", "1"), _evento("b@x", "2"), _evento("a@x", "3")],
+        headers=cabeceras_identidad("tok", "a@x"),
+    ).json()
+
+    assert respuesta["registrados"] == 2
+    assert [r["status"] for r in respuesta["resultados"]] == ["registrado", "invalido", "registrado"]
+    assert [log["documento_afectado"] for log in en_spool] == ["1", "3"]
+
+
+def test_consultar_con_cuenta_de_servicio_rechazada_responde_503(cliente, monkeypatch):
+    client, _ = cliente
+
+    async def token():
+        return "svc"
+
+    class RobleRechaza:
+        async def json(self, method, url, token=None, **kwargs):
+            raise RobleAuthError(401, "token vencido")
+
+    monkeypatch.setattr(main.almacen, "listo", False)
+    monkeypatch.setattr(main, "_iniciar_carga", lambda: None)
+    monkeypatch.setattr(main.credencial, "token", token)
+    monkeypatch.setattr(main.log_manager, "http", RobleRechaza())
+
+    assert client.get("/consultar", headers=cabeceras_identidad("tok", "a@x")).status_code == 503
+    assert client.get("/estadisticas", headers=cabeceras_identidad("tok", "a@x")).status_code == 503
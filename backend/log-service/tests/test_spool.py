@@ -0,0 +1,79 @@
+import asyncio
+
+from compartido.roble_http import RobleAuthError
+from credencial import CredencialServicio
+from spool import FSYNC_NUNCA, Despachador, Spool
+
+
+class RobleFalso:
+    """Login de ROBLE: cada login entrega un token nuevo (t1, t2...)"""
+
+    def __init__(self):
+        self.logins = 0
+
+    async def json(self, method, url, token=None, **kwargs):
+        assert kwargs["json"] == {"email": "logs@servicio", "password": "clave"}
+        self.logins += 1
+        return {"accessToken": f"t{self.logins}"}
+
+
+def _spool(directorio):
+    spool = Spool(str(directorio), FSYNC_NUNCA, segundos_fsync=0.01)
+    spool.iniciar()
+    return spool
+
+
+async def _despachar(spool, enviar, esperados):
+    roble = RobleFalso()
+    credencial = CredencialServicio(roble, "/auth/db/login", "logs@servicio", "clave")
+    despachador = Despachador(spool, enviar, credencial, lote=2, backoff_min=0.01, backoff_max=0.01)
+    await despachador.iniciar()
+    try:
+        for _ in range(500):
+            if spool.confirmados >= esperados:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await despachador.cerrar()
+        await spool.cerrar()
+    return roble
+
+
+def test_tras_reinicio_envia_sin_esperar_peticiones(tmp_path):
+    async def escribir():
+        spool = _spool(tmp_path)
+        await spool.agregar([{"n": i} for i in range(5)])
+        await spool.cerrar()
+
+    enviados = []
+
+    async def enviar(registros, token):
+        enviados.extend((r["n"], token) for r in registros)
+        return {}
+
+    asyncio.run(escribir())
+    # Reinicio: nadie vuelve a llamar al servicio, lo pendiente sale igual
+    roble = asyncio.run(_despachar(_spool(tmp_path), enviar, 5))
+
+    assert enviados == [(i, "t1") for i in range(5)]
+    assert roble.logins == 1
+
+
+def test_token_rechazado_hace_login_de_nuevo(tmp_path):
+    enviados = []
+
+    async def enviar(registros, token):
+        if token == "t1":
+            raise RobleAuthError(401, "token vencido")
+        enviados.extend((r["n"], token) for r in registros)
+        return {}
+
+    async def escribir_y_despachar():
+        spool = _spool(tmp_path)
+        await spool.agregar([{"n": i} for i in range(3)])
+        return await _despachar(spool, enviar, 3)
+
+    roble = asyncio.run(escribir_y_despachar())
+
+    assert enviados == [(0, "t2"), (1, "t2"), (2, "t2")]
+    assert roble.logins == 2
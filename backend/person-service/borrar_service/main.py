@@ -1,48 +1,55 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import httpx, logging, jwt
+import logging
+from contextlib import asynccontextmanager
 from comun.roble_db import RobleDB
 from comun.config import config
+from compartido.identidad import email_usuario
+from compartido.auditoria import EmisorAuditoria
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-app = FastAPI(title="Servicio Eliminar Persona")
-security = HTTPBearer()
 roble = RobleDB()
+auditoria = EmisorAuditoria(
+    config.LOGS_URL, config.SERVICE_TIMEOUT, config.AUDITORIA_CAPACIDAD_COLA, config.AUDITORIA_LOTE,
+    config.AUDITORIA_SEGUNDOS_LOTE, config.AUDITORIA_CONCURRENCIA, config.AUDITORIA_SEGUNDOS_DRENAJE,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await roble.http.iniciar()
+    await auditoria.iniciar()
+    yield
+    await auditoria.cerrar()
+    await roble.http.cerrar()
+
+app = FastAPI(title="Servicio Eliminar Persona", lifespan=lifespan)
+security = HTTPBearer()
 
 @app.delete("/eliminar/{nro_doc}")
-async def eliminar_persona(nro_doc: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def eliminar_persona(nro_doc: str, credentials: HTTPAuthorizationCredentials = Depends(security),
+                            email: str = Depends(email_usuario)):
     try:
         existente = await roble.obtener_persona(nro_doc, credentials.credentials)
         if not existente:
             raise HTTPException(status_code=404, detail="Persona no encontrada")
 
         resultado = await roble.eliminar_persona(nro_doc, credentials.credentials)
-        await _registrar_log("ELIMINAR", _extraer_email(credentials.credentials), nro_doc, "Persona eliminada", credentials.credentials)
+        _registrar_log("ELIMINAR", email, nro_doc, "Persona eliminada", credentials.credentials)
         return {"status": "success", "message": "Persona eliminada", "data": resultado}
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def _registrar_log(tipo, email, doc, desc, token):
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        async with httpx.AsyncClient(timeout=config.SERVICE_TIMEOUT) as client:
-            await client.post(
-                f"{config.LOGS_URL}/registrar",
-                json={
-                    "tipo_operacion": tipo,
-                    "usuario_email": email,
-                    "documento_afectado": doc,
-                },
-                headers=headers
-            )
-    except Exception as e:
-        logger.warning(f"No se registró log: {str(e)}")
-def _extraer_email(token):
-    try: return jwt.decode(token, options={"verify_signature": False}).get("email", "desconocido")
-    except: return "desconocido"
+def _registrar_log(tipo, email, doc, desc, token):
+    # Se encola y se envía en segundo plano: no retrasa la respuesta
+    auditoria.emitir(token, tipo_operacion=tipo, usuario_email=email, documento_afectado=doc)
+
+@app.get("/metricas")
+async def metricas():
+    """Tiempos de ROBLE y contadores de la cola de auditoría"""
+    return {"roble_http": roble.http.stats(), "auditoria": auditoria.stats()}
 
 @app.get("/health")
 async def health(): return {"status": "healthy", "service": "eliminar_persona"}
\ No newline at end of file
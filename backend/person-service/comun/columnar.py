@@ -0,0 +1,89 @@
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+
+class LoteColumnas:
+    """Filas consecutivas de un archivo columnar: campo -> lista de valores"""
+
+    __slots__ = ("columnas", "total")
+
+    def __init__(self, columnas: Dict[str, List[Optional[str]]], total: int):
+        self.columnas = columnas
+        self.total = total
+
+    def filas(self) -> Iterator["FilaColumnar"]:
+        for pos in range(self.total):
+            yield FilaColumnar(self, pos)
+
+
+class FilaColumnar(Mapping):
+    """
+    Vista de solo lectura de una fila dentro de un LoteColumnas. Se usa como
+    el dict de una fila de CSV, pero no copia los valores: el validador toma
+    las columnas del lote directamente y el dict solo se arma para las filas
+    que llegan a ROBLE o al reporte de errores.
+    """
+
+    __slots__ = ("lote", "pos")
+
+    def __init__(self, lote: LoteColumnas, pos: int):
+        self.lote = lote
+        self.pos = pos
+
+    def __getitem__(self, campo):
+        return self.lote.columnas[campo][self.pos]
+
+    def __iter__(self):
+        return iter(self.lote.columnas)
+
+    def __len__(self):
+        return len(self.lote.columnas)
+
+
+def columnas_de(filas, campos) -> Dict[str, List[Optional[str]]]:
+    """
+    Columnas `campos` de una secuencia de filas. Los tramos consecutivos de
+    un mismo LoteColumnas se copian como slices de sus listas; las filas
+    dict (CSV, NDJSON) se recorren una a una.
+    """
+    if not filas or not isinstance(filas[0], FilaColumnar):
+        return {campo: [fila.get(campo) for fila in filas] for campo in campos}
+
+    columnas = {campo: [] for campo in campos}
+    i, total = 0, len(filas)
+    while i < total:
+        lote, inicio = filas[i].lote, filas[i].pos
+        j = i + 1
+        while j < total and filas[j].lote is lote and filas[j].pos == inicio + j - i:
+            j += 1
+        fin = inicio + j - i
+        for campo in campos:
+            valores = lote.columnas.get(campo)
+            columnas[campo].extend(valores[inicio:fin] if valores is not None else [None] * (fin - inicio))
+        i = j
+    return columnas
+
+
+def dicts_de(filas) -> List[Dict]:
+    """
+    Las filas como dicts. Los tramos de un mismo LoteColumnas se arman
+    juntos, recorriendo sus columnas con zip en vez de campo por campo.
+    """
+    dicts = []
+    i, total = 0, len(filas)
+    while i < total:
+        fila = filas[i]
+        if not isinstance(fila, FilaColumnar):
+            dicts.append(fila)
+            i += 1
+            continue
+        lote, inicio = fila.lote, fila.pos
+        j = i + 1
+        while j < total and isinstance(filas[j], FilaColumnar) and filas[j].lote is lote and filas[j].pos == inicio + j - i:
+            j += 1
+        fin = inicio + j - i
+        nombres = list(lote.columnas)
+        tramos = [valores[inicio:fin] for valores in lote.columnas.values()]
+        dicts.extend(dict(zip(nombres, valores)) for valores in zip(*tramos))
+        i = j
+    return dicts
@@ -1,12 +1,15 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import Dict, List, Optional
 class Config(BaseSettings):
     """Configuración centralizada del servicio de personas"""
 
     # ========== ROBLE API ==========
     ROBLE_API_URL: Optional[str] = None
     ROBLE_DB_NAME: Optional[str] = None
+    # Parámetro de /read para pedir solo ciertas columnas, si ROBLE lo
+    # soporta; sin él la proyección se aplica al decodificar la respuesta
+    ROBLE_CAMPOS_PARAM: Optional[str] = None
 
     @property
     def ROBLE_DATABASE_URL(self) -> str:
@@ -15,14 +18,76 @@ class Config(BaseSettings):
     # ========== SERVICIOS EXTERNOS ==========
     LOGS_URL: Optional[str] = None
 
+    # ========== AUDITORÍA ==========
+    # Los eventos se encolan y se envían al servicio de logs en segundo
+    # plano, por lotes de AUDITORIA_LOTE o cada AUDITORIA_SEGUNDOS_LOTE. Con
+    # la cola llena se descartan (y se cuentan en /metricas)
+    AUDITORIA_CAPACIDAD_COLA: int = Field(default=10000)
+    AUDITORIA_LOTE: int = Field(default=500)
+    AUDITORIA_SEGUNDOS_LOTE: float = Field(default=0.5)
+    AUDITORIA_CONCURRENCIA: int = Field(default=8)
+    # Espera máxima al apagar para enviar lo que quede en la cola
+    AUDITORIA_SEGUNDOS_DRENAJE: float = Field(default=5.0)
+
     # ========== TIMEOUTS ==========
     ROBLE_TIMEOUT: Optional[int] = None
     SERVICE_TIMEOUT: Optional[int] = None
 
+    # ========== POOL ROBLE ==========
+    ROBLE_POOL_MAX_CONNECTIONS: int = Field(default=50)
+    ROBLE_POOL_MAX_KEEPALIVE: int = Field(default=20)
+    # Reintentos de lecturas ante errores de red o 502/503/504
+    ROBLE_REINTENTOS: int = Field(default=2)
+    # Registros por llamada a /insert en las cargas masivas
+    ROBLE_LOTE_INSERT: int = Field(default=500)
+    # Desde cuántos documentos se verifica la existencia con un escaneo de
+    # claves en vez de consultas puntuales
+    DUPLICADOS_UMBRAL_ESCANEO: int = Field(default=20)
+
     # ========== TABLAS ROBLE ==========
     TABLA_PERSONAS: Optional[str] = None
     PERSONA_ID_COLUMN: Optional[str] = None
 
+    # ========== CARGA MASIVA ==========
+    # Workers por etapa del pipeline de carga. validar y deduplicar siempre
+    # usan 1 para respetar el orden de las filas; no se configuran aquí
+    CARGA_CONCURRENCIA: Dict[str, int] = Field(default={
+        "insertar": 4,
+        "auditar": 8,
+    })
+    # Elementos que caben en la cola entre dos etapas
+    CARGA_CAPACIDAD_COLA: int = Field(default=1000)
+    # Filas que se validan juntas (columna por columna). Los lotes de al
+    # menos VALIDACION_UMBRAL_PROCESO filas se validan en un pool de
+    # VALIDACION_PROCESOS procesos (0 = siempre en el event loop)
+    VALIDACION_LOTE: int = Field(default=1000)
+    VALIDACION_PROCESOS: int = Field(default=1)
+    VALIDACION_UMBRAL_PROCESO: int = Field(default=1000)
+
+    # ========== IMPORTACIONES ==========
+    # Directorio con el archivo, checkpoint y errores de cada importación
+    # (debe sobrevivir reinicios para poder reanudarlas)
+    IMPORTACIONES_DIR: str = Field(default="importaciones")
+    IMPORTACIONES_MAX_ACTIVAS: int = Field(default=2)
+    IMPORTACIONES_CHECKPOINT_SEGUNDOS: float = Field(default=1.0)
+    IMPORTACIONES_EVENTOS_SEGUNDOS: float = Field(default=1.0)
+    IMPORTACIONES_KEEPALIVE_SEGUNDOS: float = Field(default=15.0)
+
+    # ========== FOTOS ==========
+    # Almacén direccionado por contenido compartido por crear y consultar
+    FOTOS_DIR: str = Field(default="fotos")
+    # Tope de bytes del almacén (0 = sin tope)
+    FOTOS_MAX_BYTES_TOTAL: int = Field(default=0)
+    # URL (vía gateway) con que consultar expone cada foto
+    FOTOS_URL: str = Field(default="/personas/fotos")
+    # Anchos de miniatura permitidos (?ancho=); otros se rechazan
+    FOTOS_ANCHOS_MINIATURA: List[int] = Field(default=[64, 128, 256, 512])
+    # El contenido de una URL de foto nunca cambia: se cachea un año
+    FOTOS_CACHE_SEGUNDOS: int = Field(default=365 * 24 * 3600)
+
+    # ========== PAGINACIÓN ==========
+    PAGINA_MAX: int = Field(default=500)
+
     # ========== LOGGING ==========
     DEBUG: bool = Field(default=False)
     LOG_LEVEL: str = Field(default="INFO")
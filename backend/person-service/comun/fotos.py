@@ -0,0 +1,231 @@
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from comun.validacion import DATA_URL, FOTO_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Lo que queda en la columna foto: el hash del contenido (":" no es base64,
+# así que una referencia no se confunde con una foto en línea)
+PREFIJO = "sha256:"
+_REFERENCIA = re.compile(r"sha256:([0-9a-f]{64})")
+HASH = re.compile(r"[0-9a-f]{64}")
+
+# Firmas de los formatos que se sirven con su tipo; el resto como binario
+_FIRMAS = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+_MINIATURAS = "miniaturas"
+
+
+def hash_de(valor) -> Optional[str]:
+    """Hash de una referencia "sha256:<hash>", o None si `valor` no lo es"""
+    if not isinstance(valor, str):
+        return None
+    m = _REFERENCIA.fullmatch(valor)
+    return m[1] if m else None
+
+
+def exponer_foto(persona, url_base: str):
+    """
+    Reemplaza la referencia de la foto por la URL que la sirve. Las fotos
+    que siguen en línea (registros anteriores al almacén) quedan igual.
+    """
+    if isinstance(persona, list):
+        return [exponer_foto(p, url_base) for p in persona]
+    if not isinstance(persona, dict):
+        return persona
+    hash_foto = hash_de(persona.get("foto"))
+    if hash_foto is None:
+        return persona
+    return {**persona, "foto": f"{url_base}/{hash_foto}"}
+
+
+class AlmacenLleno(Exception):
+    pass
+
+
+class AlmacenFotos:
+    """
+    Fotos direccionadas por contenido: cada imagen se guarda una sola vez en
+    <directorio>/<2 primeros del hash>/<hash> sin importar cuántas personas
+    la usen, y la fila de ROBLE guarda solo "sha256:<hash>". Las miniaturas
+    se generan al pedirlas y quedan en <directorio>/miniaturas/<ancho>/.
+
+    Los métodos hacen I/O de disco: desde el event loop se llaman con
+    asyncio.to_thread.
+    """
+
+    def __init__(self, directorio: str, max_bytes_total: int = 0):
+        self.directorio = directorio
+        self.max_bytes_total = max_bytes_total
+        self.bytes_total = 0
+        self.guardadas = 0
+        self.deduplicadas = 0
+        self._lock = threading.Lock()
+        # hash -> Event de las fotos que se están escribiendo
+        self._en_curso: Dict[str, threading.Event] = {}
+
+    def iniciar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        if not self.max_bytes_total:
+            return
+        # Solo los originales cuentan para el tope (las miniaturas se pueden borrar)
+        total = 0
+        for carpeta in os.scandir(self.directorio):
+            if carpeta.is_dir() and carpeta.name != _MINIATURAS:
+                total += sum(f.stat().st_size for f in os.scandir(carpeta.path) if f.is_file())
+        self.bytes_total = total
+        logger.info(f"Almacén de fotos: {total} bytes de {self.max_bytes_total}")
+
+    def ruta(self, hash_foto: str) -> str:
+        return os.path.join(self.directorio, hash_foto[:2], hash_foto)
+
+    # ========== ESCRITURA ==========
+
+    def guardar(self, datos: bytes) -> str:
+        """Guarda la imagen (si no estaba ya) y retorna su referencia"""
+        if len(datos) > FOTO_MAX_BYTES:
+            raise ValueError("foto supera los 2MB")
+        hash_foto = hashlib.sha256(datos).hexdigest()
+        ruta = self.ruta(hash_foto)
+
+        # La comprobación y la reserva van juntas bajo el lock: dos escrituras
+        # simultáneas del mismo hash solo cuentan una vez en bytes_total
+        with self._lock:
+            en_curso = self._en_curso.get(hash_foto)
+            if en_curso is None:
+                if os.path.exists(ruta):
+                    self.deduplicadas += 1
+                    return PREFIJO + hash_foto
+                if self.max_bytes_total and self.bytes_total + len(datos) > self.max_bytes_total:
+                    raise AlmacenLleno("El almacén de fotos está lleno")
+                self.bytes_total += len(datos)
+                self._en_curso[hash_foto] = threading.Event()
+
+        if en_curso is not None:
+            # Otro hilo la está escribiendo: se espera y se vuelve a mirar
+            # (si esa escritura falló, esta la intenta de nuevo)
+            en_curso.wait()
+            return self.guardar(datos)
+
+        try:
+            _escribir(ruta, datos)
+        except BaseException:
+            with self._lock:
+                self.bytes_total -= len(datos)
+            raise
+        else:
+            with self._lock:
+                self.guardadas += 1
+        finally:
+            with self._lock:
+                self._en_curso.pop(hash_foto).set()
+        return PREFIJO + hash_foto
+
+    def guardar_base64(self, valor: str) -> str:
+        prefijo = DATA_URL.match(valor)
+        if prefijo:
+            valor = valor[prefijo.end():]
+        return self.guardar(base64.b64decode(valor))
+
+    def guardar_filas(self, filas: List[Dict]) -> Tuple[List[Dict], Dict[int, str]]:
+        """
+        Guarda las fotos de `filas` (ya validadas) y retorna copias de las
+        filas con la referencia en vez de la foto, más {posición: motivo} de
+        las que no se pudieron guardar. Las filas originales no se modifican:
+        el reporte de errores las necesita como llegaron.
+        """
+        registros = []
+        errores = {}
+        for pos, fila in enumerate(filas):
+            foto = fila.get("foto")
+            if not foto:
+                registros.append(fila)
+                continue
+            try:
+                registros.append({**fila, "foto": self.guardar_base64(foto)})
+            except Exception as e:
+                errores[pos] = f"No se pudo guardar la foto: {str(e)}"
+                registros.append(fila)
+        return registros, errores
+
+    # ========== LECTURA ==========
+
+    def tipo(self, ruta: str) -> str:
+        with open(ruta, "rb") as f:
+            cabecera = f.read(12)
+        for firma, tipo in _FIRMAS:
+            if cabecera.startswith(firma):
+                return tipo
+        if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+            return "image/webp"
+        return "application/octet-stream"
+
+    def miniatura(self, hash_foto: str, ancho: int) -> str:
+        """
+        Ruta de la miniatura JPEG de `ancho` px de lado mayor, generándola si
+        no existe. ValueError si el original no es una imagen soportada.
+        """
+        ruta = os.path.join(self.directorio, _MINIATURAS, str(ancho), hash_foto[:2], hash_foto)
+        if os.path.exists(ruta):
+            return ruta
+
+        try:
+            with Image.open(self.ruta(hash_foto)) as original:
+                # En JPEG decodifica directamente a una escala menor
+                original.draft("RGB", (ancho, ancho))
+                imagen = ImageOps.exif_transpose(original)
+                imagen.thumbnail((ancho, ancho))
+                if imagen.mode in ("RGBA", "LA", "P"):
+                    imagen = imagen.convert("RGBA")
+                    fondo = Image.new("RGB", imagen.size, "white")
+                    fondo.paste(imagen, mask=imagen.getchannel("A"))
+                    imagen = fondo
+                elif imagen.mode != "RGB":
+                    imagen = imagen.convert("RGB")
+        except (OSError, Image.DecompressionBombError) as e:
+            raise ValueError(f"La foto no es una imagen soportada: {str(e)}")
+
+        buffer = io.BytesIO()
+        imagen.save(buffer, "JPEG", quality=85, optimize=True)
+        _escribir(ruta, buffer.getvalue())
+        return ruta
+
+    def stats(self) -> Dict:
+        return {
+            "bytes_total": self.bytes_total,
+            "guardadas": self.guardadas,
+            "deduplicadas": self.deduplicadas,
+        }
+
+
+def _escribir(ruta: str, datos: bytes):
+    # Archivo temporal + rename: nunca queda a la vista una foto a medias, y
+    # dos escrituras simultáneas del mismo hash dejan el mismo contenido
+    carpeta = os.path.dirname(ruta)
+    os.makedirs(carpeta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.replace(tmp, ruta)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,18 @@
+import base64
+import json
+
+
+def codificar_cursor(nro_doc: str) -> str:
+    """Cursor opaco a partir de la última clave de la página"""
+    crudo = json.dumps({"d": nro_doc}).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> str:
+    """nro_doc a partir del cursor; ValueError si el cursor no es válido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return str(datos["d"])
+    except Exception:
+        raise ValueError("cursor inválido")
@@ -0,0 +1,204 @@
+import asyncio
+import time
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de datos que recorre las colas
+_FIN = object()
+
+
+class LimiteAdaptativo:
+    """
+    Límite de concurrencia AIMD: cada vez que el destino da señales de
+    saturación se reduce a la mitad, y con cada llamada limpia sube de a uno
+    hasta el máximo configurado.
+    """
+
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self.limite = maximo
+        self.en_uso = 0
+        self.reducciones = 0
+        self._cond = asyncio.Condition()
+
+    async def adquirir(self) -> int:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.en_uso < self.limite)
+            self.en_uso += 1
+            return self.reducciones
+
+    async def liberar(self, reducciones_al_entrar: int):
+        async with self._cond:
+            self.en_uso -= 1
+            if self.reducciones == reducciones_al_entrar and self.limite < self.maximo:
+                self.limite += 1
+            self._cond.notify_all()
+
+    def reducir(self):
+        if self.limite > 1:
+            self.limite //= 2
+        self.reducciones += 1
+        logger.warning(f"Destino saturado: concurrencia reducida a {self.limite}")
+
+
+class Etapa:
+    """
+    Una etapa del pipeline: `concurrencia` workers aplican `funcion`.
+
+    Sin `lote`, la función recibe un elemento y retorna el elemento para la
+    siguiente etapa o None para descartarlo. Con `lote`, recibe una lista de
+    hasta `lote` elementos y retorna la lista que continúa.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        funcion: Callable[[Any], Awaitable[Union[Any, List[Any], None]]],
+        concurrencia: int = 1,
+        lote: Optional[int] = None,
+        adaptativa: bool = False,
+    ):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.concurrencia = max(1, concurrencia)
+        self.lote = lote
+        self.limite = LimiteAdaptativo(self.concurrencia) if adaptativa else None
+        self.entradas = 0
+        self.salidas = 0
+        self.segundos_ocupada = 0.0
+
+    async def _aplicar(self, entrada) -> Iterable:
+        reducciones = await self.limite.adquirir() if self.limite else None
+        inicio = time.perf_counter()
+        try:
+            salida = await self.funcion(entrada)
+        finally:
+            self.segundos_ocupada += time.perf_counter() - inicio
+            if self.limite:
+                await self.limite.liberar(reducciones)
+
+        if self.lote:
+            return salida or []
+        return [] if salida is None else [salida]
+
+    def stats(self, duracion: float) -> Dict:
+        datos = {
+            "concurrencia": self.concurrencia,
+            "procesados": self.entradas,
+            "emitidos": self.salidas,
+            "por_segundo": round(self.entradas / duracion, 1) if duracion else 0.0,
+            "segundos_ocupada": round(self.segundos_ocupada, 2),
+        }
+        if self.limite:
+            datos["concurrencia_final"] = self.limite.limite
+            datos["reducciones"] = self.limite.reducciones
+        return datos
+
+
+class Pipeline:
+    """
+    Etapas unidas por colas acotadas: si una etapa se atrasa, las anteriores
+    se bloquean al llenar su cola (backpressure) en vez de acumular en memoria.
+    """
+
+    def __init__(self, etapas: List[Etapa], capacidad: int = 1000, nombre_fuente: str = "parse"):
+        self.etapas = etapas
+        self.capacidad = capacidad
+        self.nombre_fuente = nombre_fuente
+        self.leidos = 0
+        self.segundos_fuente = 0.0
+        self.duracion = 0.0
+
+    async def ejecutar(self, fuente: Union[Iterable, AsyncIterator]):
+        colas = [asyncio.Queue(maxsize=self.capacidad) for _ in self.etapas]
+        inicio = time.perf_counter()
+
+        async def alimentar():
+            cola = colas[0]
+            if hasattr(fuente, "__aiter__"):
+                iterador = fuente.__aiter__()
+                siguiente = iterador.__anext__
+            else:
+                iterador = iter(fuente)
+
+                async def siguiente():
+                    try:
+                        return next(iterador)
+                    except StopIteration:
+                        raise StopAsyncIteration
+
+            while True:
+                t = time.perf_counter()
+                try:
+                    elemento = await siguiente()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    self.segundos_fuente += time.perf_counter() - t
+                self.leidos += 1
+                await cola.put(elemento)
+            for _ in range(self.etapas[0].concurrencia):
+                await cola.put(_FIN)
+
+        async def worker(i: int):
+            etapa = self.etapas[i]
+            entrada = colas[i]
+            salida = colas[i + 1] if i + 1 < len(colas) else None
+            terminado = False
+
+            while not terminado:
+                elemento = await entrada.get()
+                if elemento is _FIN:
+                    break
+                if etapa.lote:
+                    grupo = [elemento]
+                    while len(grupo) < etapa.lote:
+                        elemento = await entrada.get()
+                        if elemento is _FIN:
+                            terminado = True
+                            break
+                        grupo.append(elemento)
+                    elemento = grupo
+                    etapa.entradas += len(grupo)
+                else:
+                    etapa.entradas += 1
+
+                for resultado in await etapa._aplicar(elemento):
+                    etapa.salidas += 1
+                    if salida is not None:
+                        await salida.put(resultado)
+
+        async def etapa_completa(i: int):
+            await asyncio.gather(*(worker(i) for _ in range(self.etapas[i].concurrencia)))
+            if i + 1 < len(colas):
+                for _ in range(self.etapas[i + 1].concurrencia):
+                    await colas[i + 1].put(_FIN)
+
+        tareas = [asyncio.create_task(alimentar())]
+        tareas += [asyncio.create_task(etapa_completa(i)) for i in range(len(self.etapas))]
+        try:
+            await asyncio.gather(*tareas)
+        except BaseException:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            raise
+        finally:
+            self.duracion = time.perf_counter() - inicio
+
+    def stats(self) -> Dict:
+        fuente = {
+            "procesados": self.leidos,
+            "emitidos": self.leidos,
+            "por_segundo": round(self.leidos / self.duracion, 1) if self.duracion else 0.0,
+            "segundos_ocupada": round(self.segundos_fuente, 2),
+        }
+        return {
+            "duracion_segundos": round(self.duracion, 2),
+            "etapas": {
+                self.nombre_fuente: fuente,
+                **{etapa.nombre: etapa.stats(self.duracion) for etapa in self.etapas},
+            },
+        }
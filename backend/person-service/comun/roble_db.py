@@ -1,148 +1,293 @@
-import httpx
+import asyncio
 import logging
+import bisect
 from comun.config import config
+from compartido.singleflight import SingleFlight
+from compartido.json_stream import iterar_array_json
+from compartido.proyeccion import proyectar, params_lectura
+from compartido.roble_http import RobleClient, RobleHTTPError, RobleConexionError, RobleNoEncontrado
 
 logger = logging.getLogger(__name__)
 
+
+def clave_orden(nro_doc):
+    """
+    Orden de los nro_doc en la paginación: los numéricos por valor ("9"
+    antes que "10") y después los alfanuméricos como texto
+    """
+    nro_doc = str(nro_doc)
+    if nro_doc.isascii() and nro_doc.isdigit():
+        return (0, int(nro_doc), nro_doc)
+    return (1, 0, nro_doc)
+
+
 class RobleDB:
     """Cliente para comunicarse con ROBLE API"""
     
     def __init__(self):
         self.base_url = config.ROBLE_DATABASE_URL
-        self.timeout = config.ROBLE_TIMEOUT
+        # Pool compartido por todas las llamadas del proceso
+        self.http = RobleClient(
+            base_url=self.base_url,
+            timeout=config.ROBLE_TIMEOUT,
+            max_conexiones=config.ROBLE_POOL_MAX_CONNECTIONS,
+            max_keepalive=config.ROBLE_POOL_MAX_KEEPALIVE,
+            reintentos=config.ROBLE_REINTENTOS,
+        )
+        # Lecturas idénticas concurrentes (mismo token) comparten la llamada
+        self.singleflight = SingleFlight()
         logger.info(f"RobleDB inicializado con URL: {self.base_url}")
     
     async def insertar_persona(self, persona_data, token):
         """Inserta una nueva persona"""
+        logger.debug(f"Insertando persona con documento: {persona_data.get('nro_doc')}")
+
+        resultado = await self.http.json(
+            "POST", "/insert", token,
+            json={
+                "tableName": config.TABLA_PERSONAS,
+                "records": [persona_data]
+            }
+        )
+
+        logger.info(f"Persona insertada: {persona_data.get('nro_doc')}")
+        return resultado
+
+    async def insertar_personas(self, personas, token, tamano_lote=None, al_saturar=None):
+        """
+        Inserta varias personas en lotes de `tamano_lote` registros por llamada.
+
+        Si ROBLE rechaza un lote, se parte en mitades y se reintenta hasta
+        aislar las filas que fallan, así el resto del lote sí se inserta.
+        `al_saturar` se invoca cuando ROBLE no responde o responde 5xx/429.
+        Retorna {posición en `personas`: motivo} de las que no se insertaron.
+        """
+        tamano_lote = tamano_lote or config.ROBLE_LOTE_INSERT
+        errores = {}
+        for inicio in range(0, len(personas), tamano_lote):
+            posiciones = list(range(inicio, min(inicio + tamano_lote, len(personas))))
+            await self._insertar_lote(personas, posiciones, token, errores, al_saturar)
+
+        logger.info(f"Personas insertadas: {len(personas) - len(errores)} de {len(personas)}")
+        return errores
+
+    async def _insertar_lote(self, personas, posiciones, token, errores, al_saturar=None):
         try:
-            logger.debug(f"Insertando persona con documento: {persona_data.get('nro_doc')}")
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/insert",
-                    json={
-                        "tableName": config.TABLA_PERSONAS,
-                        "records": [persona_data]
-                    },
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code not in [200, 201]:
-                    raise Exception(f"Error en ROBLE: {response.text}")
-                
-                logger.info(f"Persona insertada: {persona_data.get('nro_doc')}")
-                return response.json()
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error de conexión insertando persona: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
+            resultado = await self.http.json(
+                "POST", "/insert", token,
+                json={
+                    "tableName": config.TABLA_PERSONAS,
+                    "records": [personas[i] for i in posiciones]
+                }
+            )
+        except RobleConexionError as e:
+            # Sin respuesta no se sabe qué quedó insertado: no se reenvía
+            if al_saturar:
+                al_saturar()
+            for i in posiciones:
+                errores[i] = str(e)
+            return
+        except RobleHTTPError as e:
+            if al_saturar and (e.status_code >= 500 or e.status_code == 429):
+                al_saturar()
+            if len(posiciones) == 1:
+                errores[posiciones[0]] = str(e)
+                return
+            mitad = len(posiciones) // 2
+            await self._insertar_lote(personas, posiciones[:mitad], token, errores, al_saturar)
+            await self._insertar_lote(personas, posiciones[mitad:], token, errores, al_saturar)
+            return
+
+        # ROBLE puede omitir registros puntuales del lote (skipped: índice y motivo)
+        omitidos = resultado.get("skipped") if isinstance(resultado, dict) else None
+        for omitido in omitidos or []:
+            if isinstance(omitido, dict) and isinstance(omitido.get("index"), int) and omitido["index"] < len(posiciones):
+                errores[posiciones[omitido["index"]]] = str(omitido.get("reason") or "Registro omitido por ROBLE")
    
-    async def obtener_persona(self, nro_doc, token):
-        """Obtiene una persona por número de documento"""
+    async def obtener_persona(self, nro_doc, token, campos=None):
+        """Obtiene una persona por número de documento (opcionalmente solo `campos`)"""
+        return await self.singleflight.do(
+            ("persona", nro_doc, token, tuple(campos or ())),
+            lambda: self._obtener_persona(nro_doc, token, campos)
+        )
+
+    async def _obtener_persona(self, nro_doc, token, campos=None):
+        logger.debug(f"Obteniendo persona: {nro_doc}")
+
         try:
-            logger.debug(f"Obteniendo persona: {nro_doc}")
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    f"{self.base_url}/read",
-                    params={
-                        "tableName": config.TABLA_PERSONAS,
-                        "nro_doc": nro_doc
-                    },
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code not in [200, 201]:
-                    return None
-                
-                data = response.json()
-                
-                if isinstance(data, list):
-                    return data if len(data) > 0 else None
-                
-                return data
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error de conexión obteniendo persona: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
+            data = await self.http.json(
+                "GET", "/read", token,
+                params=params_lectura({
+                    "tableName": config.TABLA_PERSONAS,
+                    "nro_doc": nro_doc
+                }, campos, config.ROBLE_CAMPOS_PARAM)
+            )
+        except RobleHTTPError:
+            return None
+
+        if isinstance(data, list):
+            return [proyectar(p, campos) for p in data] if len(data) > 0 else None
+
+        return proyectar(data, campos)
         
-    async def obtener_todas_persona(self, token):
+    async def obtener_todas_persona(self, token, campos=None):
         
-        """Obtiene todas las personas"""
+        """Obtiene todas las personas (opcionalmente solo `campos`)"""
+        return await self.singleflight.do(
+            ("todas", token, tuple(campos or ())),
+            lambda: self._obtener_todas_persona(token, campos)
+        )
+
+    async def _obtener_todas_persona(self, token, campos=None):
+        if campos is not None:
+            # Se proyecta registro a registro mientras se decodifica, así las
+            # columnas pesadas (foto) nunca se acumulan en memoria
+            personas = [p async for p in self.iterar_personas(token, campos=campos)]
+            return personas or None
+
+        try:
+            data = await self.http.json("GET", "/read", token, params={"tableName": config.TABLA_PERSONAS})
+        except RobleHTTPError:
+            return None
+
+        if isinstance(data, list):
+            return data if len(data) > 0 else None
+
+        return data
+
+    async def iterar_personas(self, token, filtros=None, campos=None):
+        """
+        Itera las personas a medida que se decodifican de la respuesta de
+        ROBLE, sin materializar la tabla completa en memoria.
+
+        Un 404 de ROBLE es que no hay registros; cualquier otro error se
+        propaga (una caída no puede leerse como una tabla vacía).
+        """
+        params = {"tableName": config.TABLA_PERSONAS}
+        params.update(filtros or {})
+        params_lectura(params, campos, config.ROBLE_CAMPOS_PARAM)
+
         try:
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    f"{self.base_url}/read",
-                    params={
-                        "tableName": config.TABLA_PERSONAS,
-                    },
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code not in [200, 201]:
-                    return None
-                
-                data = response.json()
-                
-                if isinstance(data, list):
-                    return data if len(data) > 0 else None
-                
-                return data
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error de conexión obteniendo persona: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
+            async with self.http.stream("GET", "/read", token, params=params) as response:
+                async for persona in iterar_array_json(response.aiter_bytes()):
+                    yield proyectar(persona, campos)
+        except RobleNoEncontrado:
+            return
+
+    async def documentos_existentes(self, nro_docs, token):
+        """
+        Retorna cuáles de `nro_docs` ya están registrados.
+
+        Pocos documentos se consultan puntualmente y en paralelo; desde
+        DUPLICADOS_UMBRAL_ESCANEO se recorre la tabla una sola vez pidiendo
+        solo nro_doc (una llamada en vez de N). ROBLE /read solo filtra por
+        igualdad, así que no hay consultas tipo IN por bloques.
+        """
+        nro_docs = {str(d) for d in nro_docs}
+        if not nro_docs:
+            return set()
+
+        if len(nro_docs) < config.DUPLICADOS_UMBRAL_ESCANEO:
+            docs = list(nro_docs)
+            encontrados = await asyncio.gather(*(self.existe_persona(d, token) for d in docs))
+            return {d for d, encontrado in zip(docs, encontrados) if encontrado}
+
+        existentes = await self.claves_personas(token)
+        return nro_docs & existentes
+
+    async def existe_persona(self, nro_doc, token):
+        """
+        True si `nro_doc` ya está registrado. Solo un 404 o una respuesta
+        vacía es "no existe": un token rechazado o ROBLE caído se propagan
+        (como en claves_personas), si no la fila se insertaría duplicada.
+        """
+        return await self.singleflight.do(
+            ("existe", nro_doc, token), lambda: self._existe_persona(nro_doc, token)
+        )
+
+    async def _existe_persona(self, nro_doc, token):
+        params = params_lectura(
+            {"tableName": config.TABLA_PERSONAS, "nro_doc": nro_doc}, ["nro_doc"], config.ROBLE_CAMPOS_PARAM
+        )
+        try:
+            data = await self.http.json("GET", "/read", token, params=params)
+        except RobleNoEncontrado:
+            return False
+        return bool(data)
+
+    async def claves_personas(self, token):
+        """Conjunto de todos los nro_doc registrados (escaneo pidiendo solo esa columna)"""
+        # A diferencia de iterar_personas, un error aquí no puede leerse como
+        # "no existe ninguno": se propaga
+        params = params_lectura({"tableName": config.TABLA_PERSONAS}, ["nro_doc"], config.ROBLE_CAMPOS_PARAM)
+        claves = set()
+        async with self.http.stream("GET", "/read", token, params=params) as response:
+            async for persona in iterar_array_json(response.aiter_bytes()):
+                claves.add(str(persona.get("nro_doc", "")))
+        return claves
+
+    async def obtener_pagina_personas(self, token, limit, despues_de=None, campos=None):
+        """
+        Obtiene una página de personas ordenada por nro_doc (ver clave_orden).
+
+        ROBLE /read solo filtra por igualdad: no admite rangos, orden ni
+        límite, así que el cursor no se puede delegar y cada página recorre
+        la tabla en streaming, conservando solo las `limit` menores
+        posteriores a `despues_de` (memoria O(limit)). Retorna (personas,
+        siguiente), donde siguiente es el nro_doc del último de la página
+        si hay más, o None.
+        """
+        # nro_doc es la clave del cursor: se pide aunque no esté en `campos`
+        leer = None if campos is None else list(dict.fromkeys(["nro_doc", *campos]))
+        desde = clave_orden(despues_de) if despues_de is not None else None
+
+        pagina = []
+        idx = 0
+        async for persona in self.iterar_personas(token, campos=leer):
+            clave = clave_orden(persona.get("nro_doc", ""))
+            if desde is not None and clave <= desde:
+                continue
+            if len(pagina) > limit and clave >= pagina[-1][0]:
+                continue
+
+            # idx desempata para no comparar dicts
+            bisect.insort(pagina, (clave, idx, persona))
+            idx += 1
+            if len(pagina) > limit + 1:
+                pagina.pop()
+
+        siguiente = str(pagina[limit - 1][2].get("nro_doc", "")) if len(pagina) > limit else None
+        return [proyectar(persona, campos) for _, _, persona in pagina[:limit]], siguiente
+
     async def actualizar_persona(self, nro_doc, updates, token):
         """Actualiza una persona existente"""
-        try:
-            logger.debug(f"Actualizando persona {nro_doc} con campos: {list(updates.keys())}")
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.put(
-                    f"{self.base_url}/update",
-                    json={
-                        "tableName": config.TABLA_PERSONAS,
-                        "idColumn": config.PERSONA_ID_COLUMN,
-                        "idValue": nro_doc,
-                        "updates": updates
-                    },
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code not in [200, 201]:
-                    raise Exception(f"Error en ROBLE: {response.text}")
-                
-                logger.info(f"Persona actualizada: {nro_doc}")
-                return response.json()
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error de conexión actualizando persona: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
+        logger.debug(f"Actualizando persona {nro_doc} con campos: {list(updates.keys())}")
+
+        resultado = await self.http.json(
+            "PUT", "/update", token,
+            json={
+                "tableName": config.TABLA_PERSONAS,
+                "idColumn": config.PERSONA_ID_COLUMN,
+                "idValue": nro_doc,
+                "updates": updates
+            }
+        )
+
+        logger.info(f"Persona actualizada: {nro_doc}")
+        return resultado
     
     async def eliminar_persona(self, nro_doc, token):
         """Elimina una persona"""
-        try:
-            logger.debug(f"Eliminando persona: {nro_doc}")
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.request(
-                    "DELETE",
-                    f"{self.base_url}/delete",
-                    json={
-                        "tableName": config.TABLA_PERSONAS,
-                        "idColumn": config.PERSONA_ID_COLUMN,
-                        "idValue": nro_doc
-                    },
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code not in [200, 201]:
-                    raise Exception(f"Error en ROBLE: {response.text}")
-                
-                logger.info(f"Persona eliminada: {nro_doc}")
-                return response.json()
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error de conexión eliminando persona: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
+        logger.debug(f"Eliminando persona: {nro_doc}")
+
+        resultado = await self.http.json(
+            "DELETE", "/delete", token,
+            json={
+                "tableName": config.TABLA_PERSONAS,
+                "idColumn": config.PERSONA_ID_COLUMN,
+                "idValue": nro_doc
+            }
+        )
+
+        logger.info(f"Persona eliminada: {nro_doc}")
+        return resultado
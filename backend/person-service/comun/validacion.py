@@ -0,0 +1,217 @@
+import asyncio
+import functools
+import multiprocessing
+import re
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+from comun.columnar import columnas_de
+
+logger = logging.getLogger(__name__)
+
+# ========== REGLAS ==========
+# Compartidas por la carga de archivos (por lotes) y CrearPersonaRequest
+
+OBLIGATORIOS = (
+    "primer_nombre", "apellidos", "fecha_nacimiento", "genero",
+    "correo", "celular", "nro_doc", "tipo_doc",
+)
+# Textos que no admiten números: (campo, largo máximo)
+TEXTOS = (("primer_nombre", 30), ("segundo_nombre", 30), ("apellidos", 60))
+GENEROS = ("Masculino", "Femenino", "No binario", "Prefiero no reportar")
+TIPOS_DOC = ("Tarjeta de identidad", "Cédula")
+FOTO_MAX_BYTES = 2 * 1024 * 1024
+
+# Columnas que se validan fuera del proceso (la foto se valida siempre aquí:
+# enviarla a otro proceso costaría más que validarla)
+CAMPOS = OBLIGATORIOS + ("segundo_nombre",)
+
+_GENEROS = frozenset(GENEROS)
+_TIPOS_DOC = frozenset(TIPOS_DOC)
+_ERROR_GENERO = f"género inválido. Debe ser uno de: {', '.join(GENEROS)}"
+_ERROR_TIPO_DOC = f"tipo_doc inválido. Valores permitidos: {', '.join(TIPOS_DOC)}"
+
+_CORREO = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
+_CELULAR = re.compile(r"^\d{10}$")
+_NRO_DOC = re.compile(r"^\d{1,10}$")
+# Lo mismo que acepta datetime.strptime(valor, "%Y-%m-%d"), sin construir
+# el datetime: mes y día pueden venir sin cero (y el día con espacio)
+_FECHA = re.compile(r"(\d{4})-(1[0-2]|0[1-9]|[1-9])-(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])")
+
+# Prefijo que agrega FileReader.readAsDataURL en el frontend
+DATA_URL = re.compile(r"data:[^,]*;base64,")
+_ALFABETO_BASE64 = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+_ESPACIOS = b" \t\n\r\v\f"
+
+
+@functools.lru_cache(maxsize=8192)
+def _fecha_valida(valor: str) -> bool:
+    # En un archivo las fechas se repiten mucho: se valida cada una una vez
+    m = _FECHA.fullmatch(valor)
+    if m is None:
+        return False
+    try:
+        date(int(m[1]), int(m[2]), int(m[3]))
+    except ValueError:
+        return False
+    return True
+
+
+def tamano_base64(valor: str) -> Optional[int]:
+    """
+    Bytes que ocupa `valor` una vez decodificado, o None si no es base64
+    válido. Se calcula del largo del texto (cada 4 caracteres son 3 bytes,
+    menos el relleno) sin decodificarlo: la validez se comprueba con una
+    pasada de bytes.translate, que no reserva el tamaño de la imagen.
+    """
+    prefijo = DATA_URL.match(valor)
+    if prefijo:
+        valor = valor[prefijo.end():]
+    if not valor.isascii():
+        return None
+
+    datos = valor.encode("ascii")
+    cuerpo = datos.rstrip(b"=")
+    if cuerpo.translate(None, _ALFABETO_BASE64):
+        # Como b64decode, se toleran saltos de línea y espacios intercalados
+        datos = datos.translate(None, _ESPACIOS)
+        cuerpo = datos.rstrip(b"=")
+        if cuerpo.translate(None, _ALFABETO_BASE64):
+            return None
+
+    relleno = len(datos) - len(cuerpo)
+    if not datos or relleno > 2 or len(datos) % 4:
+        return None
+    return len(datos) // 4 * 3 - relleno
+
+
+# ========== VALIDACIÓN POR COLUMNAS ==========
+
+def validar_columnas(columnas: Dict[str, Sequence[Optional[str]]], total: int) -> List[List[str]]:
+    """
+    Valida `total` filas dadas por columnas (campo -> valores) y retorna la
+    lista de errores de cada fila. Cada regla recorre su columna completa con
+    el patrón ya compilado; el orden de los errores de una fila es el mismo
+    de siempre (obligatorios, nombres, fecha, género, correo, celular,
+    documento, tipo de documento).
+    """
+    errores: List[List[str]] = [[] for _ in range(total)]
+
+    # ------------------------- CAMPOS OBLIGATORIOS -------------------------
+    for campo in OBLIGATORIOS:
+        mensaje = f"{campo} es obligatorio"
+        for i, valor in enumerate(columnas[campo]):
+            if not valor:
+                errores[i].append(mensaje)
+
+    # ------------------------- NOMBRES Y APELLIDOS -------------------------
+    for campo, max_len in TEXTOS:
+        con_numeros = f"{campo} no puede contener números"
+        muy_largo = f"{campo} no puede superar {max_len} caracteres"
+        for i, valor in enumerate(columnas[campo]):
+            if not valor:
+                continue
+            if any(map(str.isdigit, valor)):
+                errores[i].append(con_numeros)
+            if len(valor) > max_len:
+                errores[i].append(muy_largo)
+
+    # ------------------------- FECHA NACIMIENTO -------------------------
+    for i, valor in enumerate(columnas["fecha_nacimiento"]):
+        if valor and not _fecha_valida(valor):
+            errores[i].append("fecha_nacimiento inválida (YYYY-MM-DD)")
+
+    # ------------------------- GÉNERO -------------------------
+    for i, valor in enumerate(columnas["genero"]):
+        if valor and valor not in _GENEROS:
+            errores[i].append(_ERROR_GENERO)
+
+    # ------------------------- EMAIL, CELULAR, DOCUMENTO -------------------------
+    for campo, patron, mensaje in (
+        ("correo", _CORREO, "correo inválido"),
+        ("celular", _CELULAR, "celular inválido (debe tener 10 dígitos numéricos)"),
+        ("nro_doc", _NRO_DOC, "nro_doc debe ser numérico y máximo 10 dígitos"),
+    ):
+        coincide = patron.match
+        for i, valor in enumerate(columnas[campo]):
+            if valor and not coincide(valor):
+                errores[i].append(mensaje)
+
+    # ------------------------- TIPO DOCUMENTO -------------------------
+    for i, valor in enumerate(columnas["tipo_doc"]):
+        if valor and valor not in _TIPOS_DOC:
+            errores[i].append(_ERROR_TIPO_DOC)
+
+    return errores
+
+
+def _validar_fotos(fotos: Sequence[Optional[str]], errores: List[List[str]]):
+    # ------------------------- FOTO BASE64 (≤ 2MB) -------------------------
+    for i, foto in enumerate(fotos):
+        if not foto:
+            continue
+        tamano = tamano_base64(foto)
+        if tamano is None:
+            errores[i].append("foto no es base64 válido")
+        elif tamano > FOTO_MAX_BYTES:
+            errores[i].append("foto supera los 2MB")
+
+
+def _columnas(filas: Sequence[Dict]):
+    # Las filas de archivos columnares llegan como vistas de su lote: sus
+    # columnas se toman por slices, sin pasar por un dict por fila
+    columnas = columnas_de(filas, CAMPOS + ("foto",))
+    return columnas, columnas.pop("foto")
+
+
+def validar_lote(filas: Sequence[Dict]) -> List[List[str]]:
+    """Errores de cada fila de un lote (lista vacía = fila válida)"""
+    columnas, fotos = _columnas(filas)
+    errores = validar_columnas(columnas, len(filas))
+    _validar_fotos(fotos, errores)
+    return errores
+
+
+def validar_persona(fila: Dict) -> List[str]:
+    return validar_lote([fila])[0]
+
+
+# ========== VALIDADOR DE LA CARGA ==========
+
+class ValidadorPersonas:
+    """
+    Valida lotes de filas. Los lotes de al menos `umbral` filas se validan
+    en un pool de `procesos` procesos para no ocupar el event loop (que
+    mientras tanto sigue parseando e insertando); los chicos, o con
+    procesos=0, en línea. A los procesos solo viajan las columnas a validar.
+    """
+
+    def __init__(self, procesos: int = 0, umbral: int = 1000):
+        self.procesos = procesos
+        self.umbral = umbral
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def validar(self, filas: Sequence[Dict]) -> List[List[str]]:
+        if not self.procesos or len(filas) < self.umbral:
+            return validar_lote(filas)
+
+        if self._pool is None:
+            # forkserver: los procesos no heredan los hilos ni sockets del servicio
+            self._pool = ProcessPoolExecutor(
+                self.procesos, mp_context=multiprocessing.get_context("forkserver")
+            )
+            logger.info(f"Pool de validación iniciado con {self.procesos} procesos")
+
+        columnas, fotos = _columnas(filas)
+        errores = await asyncio.get_running_loop().run_in_executor(
+            self._pool, validar_columnas, columnas, len(filas)
+        )
+        _validar_fotos(fotos, errores)
+        return errores
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -1,59 +1,190 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import httpx, logging, jwt
+from fastapi.responses import FileResponse, Response
+from typing import Optional
+import logging, asyncio, os
+from contextlib import asynccontextmanager
 from comun.roble_db import RobleDB
 from comun.config import config
+from compartido.identidad import email_usuario
+from comun.paginacion import codificar_cursor, decodificar_cursor
+from compartido.json_stream import acepta_ndjson, respuesta_ndjson
+from compartido.proyeccion import parsear_campos
+from comun.fotos import AlmacenFotos, HASH, exponer_foto
+from compartido.singleflight import SingleFlight
+from compartido.auditoria import EmisorAuditoria
+from starlette.background import BackgroundTask
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-app = FastAPI(title="Servicio Consultar Persona")
-security = HTTPBearer()
 roble = RobleDB()
+fotos = AlmacenFotos(config.FOTOS_DIR, config.FOTOS_MAX_BYTES_TOTAL)
+# Pedidos simultáneos de la misma miniatura la generan una sola vez
+miniaturas = SingleFlight()
+auditoria = EmisorAuditoria(
+    config.LOGS_URL, config.SERVICE_TIMEOUT, config.AUDITORIA_CAPACIDAD_COLA, config.AUDITORIA_LOTE,
+    config.AUDITORIA_SEGUNDOS_LOTE, config.AUDITORIA_CONCURRENCIA, config.AUDITORIA_SEGUNDOS_DRENAJE,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await roble.http.iniciar()
+    await auditoria.iniciar()
+    fotos.iniciar()
+    yield
+    await auditoria.cerrar()
+    await roble.http.cerrar()
+
+app = FastAPI(title="Servicio Consultar Persona", lifespan=lifespan)
+security = HTTPBearer()
+
+def _campos(fields: Optional[str]):
+    """Proyección pedida con ?fields=nro_doc,primer_nombre,...; 400 si no es válida"""
+    try:
+        return parsear_campos(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _exponer(personas):
+    """Las fotos del almacén salen como la URL que las sirve"""
+    return exponer_foto(personas, config.FOTOS_URL)
+
+async def _exponer_todas(personas):
+    async for persona in personas:
+        yield _exponer(persona)
 
 @app.get("/consultar/{nro_doc}")
-async def consultar_persona(nro_doc: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def consultar_persona(nro_doc: str, credentials: HTTPAuthorizationCredentials = Depends(security),
+                            email: str = Depends(email_usuario),
+                            fields: Optional[str] = None):
+    campos = _campos(fields)
     try:
-        resultado = await roble.obtener_persona(nro_doc, credentials.credentials)
+        resultado = await roble.obtener_persona(nro_doc, credentials.credentials, campos)
         if not resultado:
             raise HTTPException(status_code=404, detail="Persona no encontrada")
 
-        await _registrar_log("CONSULTAR", _extraer_email(credentials.credentials), nro_doc, "Consulta de persona",credentials.credentials)
-        return {"status": "success", "data": resultado}
+        _registrar_log("CONSULTAR", email, nro_doc, "Consulta de persona",credentials.credentials)
+        return {"status": "success", "data": _exponer(resultado)}
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.get("/consultar_todas")
-async def consultar_persona2( credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def consultar_persona2( credentials: HTTPAuthorizationCredentials = Depends(security),
+                            email: str = Depends(email_usuario),
+                            limit: Optional[int] = Query(None, ge=1, le=config.PAGINA_MAX),
+                            cursor: Optional[str] = None,
+                            fields: Optional[str] = None,
+                            accept: Optional[str] = Header(None)):
+    campos = _campos(fields)
+    if acepta_ndjson(accept):
+        return await _consultar_ndjson(credentials.credentials, email, campos)
+    if limit is not None:
+        return await _consultar_pagina(limit, cursor, credentials.credentials, email, campos)
     try:
-        resultado = await roble.obtener_todas_persona(credentials.credentials)
+        resultado = await roble.obtener_todas_persona(credentials.credentials, campos)
         if not resultado:
             raise HTTPException(status_code=404, detail="Persona no encontrada")
-        await _registrar_log("CONSULTAR", _extraer_email(credentials.credentials), "TODOS", "Consulta de persona",credentials.credentials)
-        return {"status": "success", "data": resultado}
+        _registrar_log("CONSULTAR", email, "TODOS", "Consulta de persona",credentials.credentials)
+        return {"status": "success", "data": _exponer(resultado)}
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def _registrar_log(tipo, email, doc, desc, token):
+async def _consultar_pagina(limit, cursor, token, email, campos=None):
+    """Página ordenada por nro_doc con cursor opaco hacia la siguiente"""
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        async with httpx.AsyncClient(timeout=config.SERVICE_TIMEOUT) as client:
-            await client.post(
-                f"{config.LOGS_URL}/registrar",
-                json={
-                    "tipo_operacion": tipo,
-                    "usuario_email": email,
-                    "documento_afectado": doc,
-                },
-                headers=headers
-            )
+        despues_de = decodificar_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        personas, siguiente = await roble.obtener_pagina_personas(token, limit, despues_de, campos)
+        _registrar_log("CONSULTAR", email, "TODOS", "Consulta de persona", token)
+        return {
+            "status": "success",
+            "data": _exponer(personas),
+            "siguiente_cursor": codificar_cursor(siguiente) if siguiente is not None else None
+        }
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _consultar_ndjson(token, email, campos=None):
+    """Tabla completa como NDJSON, en streaming desde ROBLE"""
+    try:
+        return await respuesta_ndjson(
+            _exponer_todas(roble.iterar_personas(token, campos=campos)),
+            # Se audita al terminar de enviar la respuesta
+            background=BackgroundTask(_registrar_log, "CONSULTAR", email, "TODOS", "Consulta de persona", token)
+        )
     except Exception as e:
-        logger.warning(f"No se registró log: {str(e)}")
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _registrar_log(tipo, email, doc, desc, token):
+    # Se encola y se envía en segundo plano: no retrasa la respuesta
+    auditoria.emitir(token, tipo_operacion=tipo, usuario_email=email, documento_afectado=doc)
+
+# ========== FOTOS ==========
+
+def _coincide_etag(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in etiquetas
+
+@app.get("/fotos/{hash_foto}")
+async def foto_persona(hash_foto: str, ancho: Optional[int] = None,
+                       if_none_match: Optional[str] = Header(None),
+                       credentials: HTTPAuthorizationCredentials = Depends(security),
+                       email: str = Depends(email_usuario)):
+    """
+    Imagen de una foto del almacén, o su miniatura con ?ancho=. Pide la
+    identidad verificada como las demás consultas. Lo que hay tras un hash
+    no cambia, así que el ETag es el hash y la caché es larga (privada);
+    FileResponse atiende Range e If-Range.
+    """
+    if not HASH.fullmatch(hash_foto):
+        raise HTTPException(status_code=404, detail="Foto no encontrada")
+    if ancho is not None and ancho not in config.FOTOS_ANCHOS_MINIATURA:
+        permitidos = ", ".join(str(a) for a in config.FOTOS_ANCHOS_MINIATURA)
+        raise HTTPException(status_code=400, detail=f"ancho inválido. Valores permitidos: {permitidos}")
+
+    ruta = fotos.ruta(hash_foto)
+    if not os.path.isfile(ruta):
+        raise HTTPException(status_code=404, detail="Foto no encontrada")
+
+    etag = f'"{hash_foto}"' if ancho is None else f'"{hash_foto}-{ancho}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={config.FOTOS_CACHE_SEGUNDOS}, immutable",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if _coincide_etag(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        if ancho is None:
+            media_type = await asyncio.to_thread(fotos.tipo, ruta)
+        else:
+            ruta = await miniaturas.do(
+                (hash_foto, ancho), lambda: asyncio.to_thread(fotos.miniatura, hash_foto, ancho)
+            )
+            media_type = "image/jpeg"
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    return FileResponse(ruta, media_type=media_type, headers=headers)
 
-def _extraer_email(token):
-    try: return jwt.decode(token, options={"verify_signature": False}).get("email", "desconocido")
-    except: return "desconocido"
+@app.get("/metricas")
+async def metricas():
+    """Lecturas a ROBLE realizadas y colapsadas, tiempos por operación y cola de auditoría"""
+    return {
+        "roble_singleflight": roble.singleflight.stats(),
+        "roble_http": roble.http.stats(),
+        "auditoria": auditoria.stats(),
+    }
 
 @app.get("/health")
 async def health(): return {"status": "healthy", "service": "consultar_persona"}
\ No newline at end of file
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from comun.columnar import dicts_de
+from comun.config import config
+from comun.fotos import AlmacenFotos
+from comun.pipeline import Pipeline, Etapa
+from comun.roble_db import RobleDB
+
+logger = logging.getLogger(__name__)
+
+# Se llama una vez por fila leída cuando su resultado es definitivo:
+# motivos=None si se insertó, o la lista de motivos si se rechazó
+AlFinalizar = Callable[[int, Dict, Optional[List[str]]], None]
+
+
+async def cargar_personas(
+    filas: Iterable[Tuple[int, Dict]],
+    roble: RobleDB,
+    token: str,
+    validar: Callable[[List[Dict]], Awaitable[List[List[str]]]],
+    auditar: Callable[[Dict], Awaitable[None]],
+    al_finalizar: AlFinalizar,
+    al_enviar: Optional[Callable[[List[Tuple[int, Dict]]], None]] = None,
+    enviadas_previas: Optional[Dict[str, int]] = None,
+    fotos: Optional[AlmacenFotos] = None,
+) -> Pipeline:
+    """
+    Carga filas (nro de fila, dict) con el pipeline validar → deduplicar →
+    insertar → auditar y retorna el pipeline ya ejecutado (para sus stats).
+
+    `al_enviar` se llama con cada lote justo antes de mandarlo a ROBLE.
+    `enviadas_previas` (nro_doc -> fila) son los lotes que una ejecución
+    anterior de la misma carga alcanzó a enviar: si al releer la fila su
+    documento ya existe en ROBLE, lo insertó esa ejecución y se cuenta como
+    insertada (sin volver a insertarla ni auditarla), no como "ya existe".
+    Con `fotos`, cada foto se guarda en el almacén antes de insertar y a
+    ROBLE solo llega su referencia.
+    """
+    enviadas_previas = enviadas_previas or {}
+
+    # ---------- validar ----------
+    async def validar_filas(lote):
+        validas = []
+        for (idx, fila), errores in zip(lote, await validar([fila for _, fila in lote])):
+            if errores:
+                al_finalizar(idx, fila, errores)
+                continue
+            validas.append((idx, fila))
+        return validas
+
+    # ---------- deduplicar ----------
+    primera_fila = {}   # nro_doc -> primera fila del archivo que lo trae
+    claves_roble = None  # nro_doc existentes, si se optó por escanear la tabla
+
+    async def deduplicar(lote):
+        nonlocal claves_roble
+        nuevas = []
+        for idx, fila in lote:
+            primera = primera_fila.get(fila["nro_doc"], enviadas_previas.get(fila["nro_doc"]))
+            if primera is not None and primera < idx:
+                al_finalizar(idx, fila, [f"Documento duplicado en el archivo (fila {primera})"])
+                continue
+            primera_fila[fila["nro_doc"]] = idx
+            nuevas.append((idx, fila))
+
+        # Documentos que ya existen en ROBLE, en lote y no fila por fila;
+        # en archivos grandes las claves se escanean una sola vez
+        docs = {fila["nro_doc"] for _, fila in nuevas}
+        if claves_roble is None and len(docs) >= config.DUPLICADOS_UMBRAL_ESCANEO:
+            claves_roble = await roble.claves_personas(token)
+        if claves_roble is not None:
+            existentes = docs & claves_roble
+        else:
+            existentes = await roble.documentos_existentes(docs, token)
+
+        pendientes = []
+        for idx, fila in nuevas:
+            if fila["nro_doc"] in existentes:
+                if enviadas_previas.get(fila["nro_doc"]) == idx:
+                    al_finalizar(idx, fila, None)
+                else:
+                    al_finalizar(idx, fila, ["Documento ya existe"])
+                continue
+            pendientes.append((idx, fila))
+        return pendientes
+
+    # ---------- insertar ----------
+    async def insertar(lote):
+        if al_enviar:
+            al_enviar(lote)
+        # Las filas de archivos columnares son vistas: a ROBLE van como dict
+        registros = dicts_de([fila for _, fila in lote])
+        errores = {}
+        if fotos is not None:
+            registros, errores = await asyncio.to_thread(fotos.guardar_filas, registros)
+
+        pendientes = [pos for pos in range(len(lote)) if pos not in errores]
+        if pendientes:
+            errores_roble = await roble.insertar_personas(
+                [registros[pos] for pos in pendientes], token, tamano_lote=len(pendientes),
+                al_saturar=etapa_insertar.limite.reducir
+            )
+            errores.update({pendientes[i]: motivo for i, motivo in errores_roble.items()})
+        insertadas = []
+        for pos, (idx, fila) in enumerate(lote):
+            if pos in errores:
+                al_finalizar(idx, fila, [errores[pos]])
+                continue
+            al_finalizar(idx, fila, None)
+            insertadas.append((idx, fila))
+        return insertadas
+
+    # ---------- auditar ----------
+    async def auditar_fila(item):
+        _, fila = item
+        await auditar(fila)
+
+    concurrencia = config.CARGA_CONCURRENCIA
+    etapa_insertar = Etapa(
+        "insertar", insertar, concurrencia.get("insertar", 1),
+        lote=config.ROBLE_LOTE_INSERT, adaptativa=True
+    )
+    pipeline = Pipeline([
+        # validar y deduplicar con un worker: la deduplicación necesita las
+        # filas en el orden del archivo (gana la primera aparición). El
+        # paralelismo de la validación está dentro de cada lote (procesos)
+        Etapa("validar", validar_filas, 1, lote=config.VALIDACION_LOTE),
+        Etapa("deduplicar", deduplicar, 1, lote=config.ROBLE_LOTE_INSERT),
+        etapa_insertar,
+        Etapa("auditar", auditar_fila, concurrencia.get("auditar", 1)),
+    ], capacidad=config.CARGA_CAPACIDAD_COLA)
+
+    await pipeline.ejecutar(filas)
+    return pipeline
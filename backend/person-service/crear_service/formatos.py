@@ -0,0 +1,199 @@
+import base64
+import csv
+import gzip
+import io
+import json
+import logging
+from typing import BinaryIO, Iterator, List, Mapping, Optional
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from comun.columnar import LoteColumnas
+
+logger = logging.getLogger(__name__)
+
+# ========== FORMATOS ==========
+# Se detectan por el contenido, no por la extensión ni el Content-Type
+CSV = "csv"
+NDJSON = "ndjson"
+PARQUET = "parquet"
+ARROW = "arrow"                 # Arrow IPC en formato archivo (Feather v2)
+ARROW_STREAM = "arrow_stream"   # Arrow IPC en formato stream
+
+_GZIP = b"\x1f\x8b"
+_PARQUET = b"PAR1"
+_ARROW = b"ARROW1"
+_ARROW_STREAM = b"\xff\xff\xff\xff"
+_BOM = b"\xef\xbb\xbf"
+_CABECERA = 64
+
+
+class LectorArchivo:
+    """
+    Lee un archivo de carga masiva en cualquiera de los formatos aceptados
+    (CSV o NDJSON, con o sin gzip; Parquet; Arrow IPC) como filas.
+
+    CSV y NDJSON se leen línea a línea y cada fila es un dict. Parquet y
+    Arrow se leen por record batches de `tamano_lote` filas: cada columna
+    se convierte de una vez a lista de textos y las filas son vistas del
+    lote (FilaColumnar), sin construir un dict por fila.
+
+    `columnas` son las del archivo (para el reporte de errores). `soltar()`
+    libera los envoltorios sin cerrar `archivo`, que sigue siendo de quien
+    lo abrió.
+    """
+
+    def __init__(self, archivo: BinaryIO, delimitador: str, tamano_lote: int):
+        self.tamano_lote = tamano_lote
+        self.comprimido = False
+        self.columnas: List[str] = []
+        self.total_filas: Optional[int] = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        self._texto: Optional[io.TextIOWrapper] = None
+
+        cabecera = _asomar(archivo)
+        if cabecera.startswith(_GZIP):
+            self._gzip = gzip.GzipFile(fileobj=archivo, mode="rb")
+            self.comprimido = True
+            archivo = self._gzip
+            cabecera = self._gzip.peek(_CABECERA)[:_CABECERA]
+
+        if cabecera.startswith(_PARQUET):
+            self._abrir_parquet(archivo)
+        elif cabecera.startswith(_ARROW):
+            self._abrir_arrow(archivo)
+        elif cabecera.startswith(_ARROW_STREAM):
+            self.formato = ARROW_STREAM
+            self._lector_ipc = ipc.open_stream(archivo)
+            self.columnas = self._lector_ipc.schema.names
+            self._filas = self._filas_columnares(iter(self._lector_ipc))
+        elif cabecera.removeprefix(_BOM).lstrip().startswith(b"{"):
+            self._abrir_ndjson(archivo)
+        else:
+            self._abrir_csv(archivo, delimitador)
+
+        logger.info(f"Archivo de carga: {self.formato}{' (gzip)' if self.comprimido else ''}")
+
+    def filas(self) -> Iterator[Mapping]:
+        return self._filas
+
+    def soltar(self):
+        if self._texto is not None:
+            self._texto.detach()
+            self._texto = None
+        if self._gzip is not None:
+            # Cerrar el GzipFile no cierra el archivo que envuelve
+            self._gzip.close()
+            self._gzip = None
+
+    # ========== TEXTO ==========
+
+    def _abrir_csv(self, archivo, delimitador):
+        self.formato = CSV
+        # utf-8-sig descarta el BOM que agregan Excel y otros editores
+        self._texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(self._texto, delimiter=delimitador)
+        self.columnas = list(reader.fieldnames or [])
+        self._filas = iter(reader)
+
+    def _abrir_ndjson(self, archivo):
+        self.formato = NDJSON
+        self._texto = io.TextIOWrapper(archivo, encoding="utf-8-sig")
+        objetos = self._objetos_ndjson()
+        # Las columnas del reporte de errores son las del primer objeto
+        primero = next(objetos, None)
+        if primero is None:
+            self._filas = iter(())
+            return
+        self.columnas = list(primero)
+        self._filas = _encadenar(primero, objetos)
+
+    def _objetos_ndjson(self):
+        for n, linea in enumerate(self._texto, start=1):
+            if not linea.strip():
+                continue
+            try:
+                objeto = json.loads(linea)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Línea {n}: JSON inválido ({e.msg})")
+            if not isinstance(objeto, dict):
+                raise ValueError(f"Línea {n}: se esperaba un objeto JSON")
+            # Mismos valores que daría el CSV: todo como texto
+            yield {
+                campo: valor if valor is None or isinstance(valor, str) else json.dumps(valor, ensure_ascii=False)
+                for campo, valor in objeto.items()
+            }
+
+    # ========== COLUMNARES ==========
+
+    def _abrir_parquet(self, archivo):
+        if self.comprimido:
+            raise ValueError("Parquet no se acepta comprimido con gzip (ya viene comprimido)")
+        self.formato = PARQUET
+        parquet = pq.ParquetFile(archivo)
+        self.columnas = parquet.schema_arrow.names
+        self.total_filas = parquet.metadata.num_rows
+        self._filas = self._filas_columnares(parquet.iter_batches(batch_size=self.tamano_lote))
+
+    def _abrir_arrow(self, archivo):
+        if self.comprimido:
+            raise ValueError("Arrow en formato archivo no se acepta comprimido con gzip; use el formato stream")
+        self.formato = ARROW
+        lector = ipc.open_file(archivo)
+        self.columnas = lector.schema.names
+        self._filas = self._filas_columnares(
+            lector.get_batch(i) for i in range(lector.num_record_batches)
+        )
+
+    def _filas_columnares(self, batches) -> Iterator[Mapping]:
+        for batch in batches:
+            # Un record batch de Arrow puede traer la tabla entera
+            for inicio in range(0, batch.num_rows, self.tamano_lote):
+                parte = batch.slice(inicio, self.tamano_lote)
+                columnas = {
+                    nombre: _textos(nombre, columna)
+                    for nombre, columna in zip(parte.schema.names, parte.columns)
+                }
+                yield from LoteColumnas(columnas, parte.num_rows).filas()
+
+
+def _textos(nombre: str, columna: pa.Array) -> List[Optional[str]]:
+    """Columna Arrow como lista de textos (lo que traería el CSV)"""
+    tipo = columna.type
+    if pa.types.is_dictionary(tipo):
+        return _textos(nombre, columna.dictionary_decode())
+    if pa.types.is_binary(tipo) or pa.types.is_large_binary(tipo):
+        # Fotos guardadas como bytes: el resto de la carga espera base64
+        return [None if v is None else base64.b64encode(v).decode("ascii") for v in columna.to_pylist()]
+    if not (pa.types.is_string(tipo) or pa.types.is_large_string(tipo)):
+        try:
+            columna = columna.cast(pa.string())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            raise ValueError(f"Columna {nombre}: tipo {tipo} no soportado")
+    return _lista_textos(columna)
+
+
+def _lista_textos(columna) -> List[Optional[str]]:
+    """
+    Valores de la columna como lista, chunk por chunk: cada chunk ya viene
+    acotado al lote, así que nunca se arma un texto con la columna entera.
+    """
+    chunks = columna.chunks if isinstance(columna, pa.ChunkedArray) else [columna]
+    valores: List[Optional[str]] = []
+    for chunk in chunks:
+        valores.extend(chunk.to_pylist())
+    return valores
+
+
+def _asomar(archivo: BinaryIO) -> bytes:
+    pos = archivo.tell()
+    cabecera = archivo.read(_CABECERA)
+    archivo.seek(pos)
+    return cabecera
+
+
+def _encadenar(primero, resto):
+    yield primero
+    yield from resto
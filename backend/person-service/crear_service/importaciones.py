@@ -0,0 +1,397 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO, Callable, Dict, List, Optional
+from pydantic import BaseModel
+
+from formatos import LectorArchivo
+
+logger = logging.getLogger(__name__)
+
+# ========== ESTADOS ==========
+PENDIENTE = "pendiente"          # esperando cupo (IMPORTACIONES_MAX_ACTIVAS)
+EN_CURSO = "en_curso"
+COMPLETADA = "completada"
+CANCELADA = "cancelada"          # la canceló el usuario
+INTERRUMPIDA = "interrumpida"    # el servicio se detuvo a mitad de la carga
+FALLIDA = "fallida"
+
+ACTIVOS = {PENDIENTE, EN_CURSO}
+REANUDABLES = {CANCELADA, INTERRUMPIDA, FALLIDA}
+
+# Archivos de cada importación dentro de su directorio
+ARCHIVO_CSV = "archivo.csv"
+ARCHIVO_ESTADO = "estado.json"
+ARCHIVO_ERRORES = "errores.csv"
+# nro de fila y documento de cada fila, escrito antes de enviar su lote a
+# ROBLE: al reanudar tras un corte a mitad de un insert permite distinguir
+# lo que esta misma carga alcanzó a insertar de documentos que ya existían
+ARCHIVO_ENVIADAS = "enviadas.log"
+
+
+def _ahora() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class EstadoImportacion(BaseModel):
+    """
+    Lo que se persiste de una importación (estado.json).
+
+    Los contadores y errores.csv corresponden exactamente a las filas hasta
+    `fila_confirmada` (el checkpoint): al reanudar se continúa desde la
+    siguiente y errores.csv se recorta a `bytes_errores`.
+    """
+    id: str
+    usuario: str
+    nombre_archivo: Optional[str] = None
+    delimitador: str = ","
+    estado: str = PENDIENTE
+    creada: str
+    actualizada: str
+    fila_confirmada: int = 0
+    insertadas: int = 0
+    rechazadas: int = 0
+    bytes_errores: int = 0
+    bytes_archivo: int = 0
+    formato: Optional[str] = None
+    # Filas del archivo, si el formato las declara (Parquet)
+    total_filas: Optional[int] = None
+    reanudaciones: int = 0
+    mensaje: Optional[str] = None
+    rendimiento: Optional[Dict] = None
+
+
+class Avance:
+    """
+    Checkpoint de una carga: las filas terminan fuera de orden (etapas y
+    lotes en paralelo), así que la fila confirmada es la mayor tal que todas
+    las anteriores ya tienen resultado. Los resultados posteriores esperan
+    aquí hasta que el hueco se cierra; el pipeline acota cuántos son.
+    """
+
+    def __init__(self, fila_confirmada: int):
+        self.confirmada = fila_confirmada
+        self.pendientes: Dict[int, tuple] = {}
+
+    def finalizar(self, idx: int, fila: Dict, motivos: Optional[List[str]]) -> List[tuple]:
+        """Registra el resultado de una fila y retorna los que quedan confirmados, en orden"""
+        self.pendientes[idx] = (fila if motivos else None, motivos)
+        confirmados = []
+        while self.confirmada + 1 in self.pendientes:
+            self.confirmada += 1
+            confirmados.append((self.confirmada, *self.pendientes.pop(self.confirmada)))
+        return confirmados
+
+
+class Importacion:
+    """Una importación: su estado persistido más lo que solo vive en memoria"""
+
+    def __init__(self, estado: EstadoImportacion, directorio: str):
+        self.estado = estado
+        self.directorio = directorio
+        self.tarea: Optional[asyncio.Task] = None
+        self.cancelar_pedido = False
+        self.filas_leidas = 0
+        self._archivo: Optional[BinaryIO] = None
+
+    def ruta(self, nombre: str) -> str:
+        return os.path.join(self.directorio, nombre)
+
+    def persistir(self):
+        """Escritura atómica de estado.json (temporal + rename)"""
+        self.estado.actualizada = _ahora()
+        temporal = self.ruta(ARCHIVO_ESTADO + ".tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(self.estado.model_dump_json())
+        os.replace(temporal, self.ruta(ARCHIVO_ESTADO))
+
+    def progreso(self) -> Dict:
+        datos = self.estado.model_dump(exclude={"usuario", "bytes_errores"})
+        datos["filas_leidas"] = max(self.filas_leidas, self.estado.fila_confirmada)
+        # Aproximado: posición del lector en el archivo (incluye su read-ahead);
+        # Parquet se lee saltando por el archivo, pero declara sus filas
+        if self.estado.estado == COMPLETADA:
+            datos["porcentaje"] = 100.0
+        elif self.estado.total_filas:
+            datos["porcentaje"] = round(min(99.9, 100 * datos["filas_leidas"] / self.estado.total_filas), 1)
+        elif self._archivo is not None and not self._archivo.closed and self.estado.bytes_archivo:
+            datos["porcentaje"] = round(min(99.9, 100 * self._archivo.tell() / self.estado.bytes_archivo), 1)
+        else:
+            datos["porcentaje"] = None
+        datos["errores_disponibles"] = self.estado.rechazadas > 0
+        return datos
+
+
+class GestorImportaciones:
+    """
+    Importaciones masivas en segundo plano.
+
+    Cada una tiene un directorio con el archivo subido, su estado.json (checkpoint
+    + contadores), errores.csv con las filas rechazadas (fila, motivo y las
+    columnas originales, listo para corregir y volver a subir) y
+    enviadas.log. El token del usuario solo se guarda en memoria: tras un
+    reinicio las cargas quedan "interrumpida" y se reanudan con el token de
+    quien llama a reanudar.
+    """
+
+    def __init__(self, directorio: str, max_activas: int, cargar: Callable,
+                 segundos_checkpoint: float = 1.0, tamano_lote: int = 1000):
+        # cargar(filas, token, email, al_finalizar, al_enviar, enviadas_previas) -> Pipeline
+        self.directorio = directorio
+        self.cargar = cargar
+        self.segundos_checkpoint = segundos_checkpoint
+        # Filas por record batch al leer archivos Parquet/Arrow
+        self.tamano_lote = tamano_lote
+        self.cupos = asyncio.Semaphore(max(1, max_activas))
+        self.importaciones: Dict[str, Importacion] = {}
+
+    # ---------- ciclo de vida ----------
+
+    def iniciar(self):
+        """Carga las importaciones del disco; las que estaban activas quedan interrumpidas"""
+        os.makedirs(self.directorio, exist_ok=True)
+        for nombre in os.listdir(self.directorio):
+            directorio = os.path.join(self.directorio, nombre)
+            try:
+                with open(os.path.join(directorio, ARCHIVO_ESTADO), encoding="utf-8") as f:
+                    estado = EstadoImportacion.model_validate_json(f.read())
+            except Exception as e:
+                logger.warning(f"Importación {nombre} ignorada: {str(e)}")
+                continue
+            importacion = Importacion(estado, directorio)
+            if estado.estado in ACTIVOS:
+                estado.estado = INTERRUMPIDA
+                estado.mensaje = "El servicio se reinició durante la carga"
+                importacion.persistir()
+            self.importaciones[estado.id] = importacion
+        logger.info(f"{len(self.importaciones)} importaciones cargadas de {self.directorio}")
+
+    async def cerrar(self):
+        """Detiene las cargas en curso dejando su checkpoint (quedan interrumpidas)"""
+        tareas = [i.tarea for i in self.importaciones.values() if i.tarea and not i.tarea.done()]
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    # ---------- operaciones ----------
+
+    async def crear(self, origen: BinaryIO, nombre_archivo: Optional[str], delimitador: str,
+                    email: str, token: str) -> Importacion:
+        id_importacion = uuid.uuid4().hex
+        directorio = os.path.join(self.directorio, id_importacion)
+        os.makedirs(directorio)
+
+        ruta_csv = os.path.join(directorio, ARCHIVO_CSV)
+
+        def copiar():
+            with open(ruta_csv, "wb") as destino:
+                shutil.copyfileobj(origen, destino, 1024 * 1024)
+            return os.path.getsize(ruta_csv)
+
+        # La copia del spool al directorio de la carga no bloquea el event loop
+        bytes_archivo = await asyncio.to_thread(copiar)
+
+        ahora = _ahora()
+        importacion = Importacion(EstadoImportacion(
+            id=id_importacion,
+            usuario=email,
+            nombre_archivo=nombre_archivo,
+            delimitador=delimitador,
+            creada=ahora,
+            actualizada=ahora,
+            bytes_archivo=bytes_archivo,
+        ), directorio)
+        importacion.persistir()
+        self.importaciones[id_importacion] = importacion
+        self._lanzar(importacion, token, email)
+        return importacion
+
+    def obtener(self, id_importacion: str, email: str) -> Importacion:
+        """KeyError si no existe o es de otro usuario"""
+        importacion = self.importaciones.get(id_importacion)
+        if importacion is None or importacion.estado.usuario != email:
+            raise KeyError(id_importacion)
+        return importacion
+
+    def listar(self, email: str) -> List[Importacion]:
+        propias = [i for i in self.importaciones.values() if i.estado.usuario == email]
+        return sorted(propias, key=lambda i: i.estado.creada, reverse=True)
+
+    async def cancelar(self, id_importacion: str, email: str) -> Importacion:
+        """ValueError si la importación no está activa"""
+        importacion = self.obtener(id_importacion, email)
+        if importacion.estado.estado not in ACTIVOS or importacion.tarea is None:
+            raise ValueError(f"La importación está {importacion.estado.estado}")
+        importacion.cancelar_pedido = True
+        importacion.tarea.cancel()
+        await asyncio.gather(importacion.tarea, return_exceptions=True)
+        return importacion
+
+    def reanudar(self, id_importacion: str, email: str, token: str) -> Importacion:
+        """ValueError si la importación no se puede reanudar"""
+        importacion = self.obtener(id_importacion, email)
+        if importacion.estado.estado not in REANUDABLES:
+            raise ValueError(f"La importación está {importacion.estado.estado}")
+        if not os.path.exists(importacion.ruta(ARCHIVO_CSV)):
+            raise ValueError("El archivo de la importación ya no está disponible")
+        importacion.estado.reanudaciones += 1
+        importacion.estado.estado = PENDIENTE
+        importacion.estado.mensaje = None
+        importacion.persistir()
+        self._lanzar(importacion, token, email)
+        return importacion
+
+    def ruta_errores(self, id_importacion: str, email: str) -> str:
+        """FileNotFoundError si la importación no tiene filas rechazadas"""
+        importacion = self.obtener(id_importacion, email)
+        ruta = importacion.ruta(ARCHIVO_ERRORES)
+        if importacion.estado.rechazadas == 0 or not os.path.exists(ruta):
+            raise FileNotFoundError(ruta)
+        return ruta
+
+    async def eventos(self, importacion: Importacion, intervalo: float, keepalive: float) -> AsyncIterator[str]:
+        """
+        Progreso como Server-Sent Events: un evento "progreso" cada vez que
+        cambia y un comentario de keepalive para que proxies y clientes no
+        corten la conexión; termina con un evento "fin" al quedar inactiva.
+        """
+        anterior = None
+        ultimo_envio = time.monotonic()
+        while True:
+            datos = importacion.progreso()
+            activa = datos["estado"] in ACTIVOS
+            if datos != anterior:
+                yield f"event: {'progreso' if activa else 'fin'}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+                anterior = datos
+                ultimo_envio = time.monotonic()
+            elif time.monotonic() - ultimo_envio >= keepalive:
+                yield ": keepalive\n\n"
+                ultimo_envio = time.monotonic()
+            if not activa:
+                return
+            await asyncio.sleep(intervalo)
+
+    # ---------- ejecución ----------
+
+    def _lanzar(self, importacion: Importacion, token: str, email: str):
+        importacion.cancelar_pedido = False
+        importacion.tarea = asyncio.create_task(self._ejecutar(importacion, token, email))
+
+    async def _ejecutar(self, importacion: Importacion, token: str, email: str):
+        estado = importacion.estado
+        try:
+            async with self.cupos:
+                estado.estado = EN_CURSO
+                importacion.persistir()
+                await self._procesar(importacion, token, email)
+            estado.estado = COMPLETADA
+            # Una carga completa ya no se reanuda: solo se conservan estado y errores
+            for nombre in (ARCHIVO_CSV, ARCHIVO_ENVIADAS):
+                try:
+                    os.remove(importacion.ruta(nombre))
+                except FileNotFoundError:
+                    pass
+            logger.info(f"Importación {estado.id} completada: {estado.insertadas} insertadas, {estado.rechazadas} rechazadas")
+        except asyncio.CancelledError:
+            estado.estado = CANCELADA if importacion.cancelar_pedido else INTERRUMPIDA
+            logger.info(f"Importación {estado.id} {estado.estado} en la fila {estado.fila_confirmada}")
+        except Exception as e:
+            estado.estado = FALLIDA
+            estado.mensaje = str(e)
+            logger.error(f"Importación {estado.id} fallida en la fila {estado.fila_confirmada}: {str(e)}")
+        finally:
+            importacion.persistir()
+
+    async def _procesar(self, importacion: Importacion, token: str, email: str):
+        estado = importacion.estado
+        avance = Avance(estado.fila_confirmada)
+        enviadas_previas = self._leer_enviadas(importacion)
+
+        # errores.csv se recorta al tamaño del último checkpoint: lo escrito
+        # después corresponde a filas que se van a volver a procesar
+        ruta_errores = importacion.ruta(ARCHIVO_ERRORES)
+        with open(ruta_errores, "ab") as f:
+            f.truncate(estado.bytes_errores)
+
+        archivo = open(importacion.ruta(ARCHIVO_CSV), "rb")
+        errores = open(ruta_errores, "ab")
+        enviadas = open(importacion.ruta(ARCHIVO_ENVIADAS), "ab")
+        lector = None
+        importacion._archivo = archivo
+        importacion.filas_leidas = estado.fila_confirmada
+        ultimo_checkpoint = time.monotonic()
+
+        try:
+            # El progreso en bytes sigue la posición en el archivo subido
+            # (comprimido, si vino con gzip)
+            lector = LectorArchivo(archivo, estado.delimitador, self.tamano_lote)
+            estado.formato = lector.formato
+            estado.total_filas = lector.total_filas
+            columnas = ["fila", "motivo"] + [c for c in lector.columnas if c not in ("fila", "motivo")]
+            linea = io.StringIO()
+            escritor = csv.DictWriter(linea, fieldnames=columnas, delimiter=estado.delimitador, extrasaction="ignore")
+            if estado.bytes_errores == 0:
+                escritor.writeheader()
+
+            def checkpoint():
+                errores.write(linea.getvalue().encode("utf-8"))
+                linea.seek(0)
+                linea.truncate()
+                errores.flush()
+                estado.bytes_errores = errores.tell()
+                importacion.persistir()
+
+            def al_finalizar(idx, fila, motivos):
+                nonlocal ultimo_checkpoint
+                for fila_n, original, motivos_n in avance.finalizar(idx, fila, motivos):
+                    if motivos_n is None:
+                        estado.insertadas += 1
+                    else:
+                        estado.rechazadas += 1
+                        escritor.writerow({**original, "fila": fila_n, "motivo": "; ".join(motivos_n)})
+                    estado.fila_confirmada = fila_n
+                if time.monotonic() - ultimo_checkpoint >= self.segundos_checkpoint:
+                    checkpoint()
+                    ultimo_checkpoint = time.monotonic()
+
+            def al_enviar(lote):
+                enviadas.write("".join(f"{idx}\t{fila['nro_doc']}\n" for idx, fila in lote).encode("utf-8"))
+                enviadas.flush()
+
+            def filas():
+                for idx, fila in enumerate(lector.filas(), start=1):
+                    if idx > estado.fila_confirmada:
+                        importacion.filas_leidas = idx
+                        yield idx, fila
+
+            try:
+                pipeline = await self.cargar(filas(), token, email, al_finalizar, al_enviar, enviadas_previas)
+                estado.rendimiento = pipeline.stats()
+            finally:
+                checkpoint()
+        finally:
+            importacion._archivo = None
+            if lector is not None:
+                lector.soltar()
+            archivo.close()
+            errores.close()
+            enviadas.close()
+
+    def _leer_enviadas(self, importacion: Importacion) -> Dict[str, int]:
+        previas = {}
+        try:
+            with open(importacion.ruta(ARCHIVO_ENVIADAS), encoding="utf-8") as f:
+                for linea in f:
+                    idx, _, nro_doc = linea.rstrip("\n").partition("\t")
+                    if nro_doc:
+                        previas[nro_doc] = int(idx)
+        except FileNotFoundError:
+            pass
+        return previas
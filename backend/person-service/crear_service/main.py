@@ -1,21 +1,48 @@
 from fastapi import FastAPI, HTTPException, Depends, Form, File, UploadFile
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, model_validator
 from typing import Optional
-import httpx, logging, jwt
-import io, re, base64, csv, os, sys, asyncio
-from datetime import datetime
+import logging
+import os, sys, asyncio
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+from contextlib import asynccontextmanager
 from comun.roble_db import RobleDB
 from comun.config import config
+from compartido.identidad import email_usuario
+from comun.validacion import ValidadorPersonas, validar_persona
+from comun.fotos import AlmacenFotos, AlmacenLleno
+from compartido.auditoria import EmisorAuditoria
+from carga import cargar_personas
+from formatos import LectorArchivo
+from importaciones import GestorImportaciones
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-app = FastAPI(title="Servicio Crear Persona")
-security = HTTPBearer()
 roble = RobleDB()
+validador = ValidadorPersonas(config.VALIDACION_PROCESOS, config.VALIDACION_UMBRAL_PROCESO)
+fotos = AlmacenFotos(config.FOTOS_DIR, config.FOTOS_MAX_BYTES_TOTAL)
+auditoria = EmisorAuditoria(
+    config.LOGS_URL, config.SERVICE_TIMEOUT, config.AUDITORIA_CAPACIDAD_COLA, config.AUDITORIA_LOTE,
+    config.AUDITORIA_SEGUNDOS_LOTE, config.AUDITORIA_CONCURRENCIA, config.AUDITORIA_SEGUNDOS_DRENAJE,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await roble.http.iniciar()
+    await auditoria.iniciar()
+    fotos.iniciar()
+    importaciones.iniciar()
+    yield
+    await importaciones.cerrar()
+    validador.cerrar()
+    await auditoria.cerrar()
+    await roble.http.cerrar()
+
+app = FastAPI(title="Servicio Crear Persona", lifespan=lifespan)
+security = HTTPBearer()
 
 class CrearPersonaRequest(BaseModel):
     primer_nombre: str
@@ -28,18 +55,28 @@ class CrearPersonaRequest(BaseModel):
     nro_doc: str
     tipo_doc: str
     foto: str
+
+    @model_validator(mode="after")
+    def validar_reglas(self):
+        # Mismas reglas que la carga de archivos
+        errores = validar_persona(self.model_dump())
+        if errores:
+            raise ValueError("; ".join(errores))
+        return self
     
 @app.post("/cargar-archivo")
 async def cargar_archivo(
     delimitador: str = Form(...),
     archivo: UploadFile = File(...),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
 ):
     try:
-        contenido = await archivo.read()
-        texto = contenido.decode("utf-8")
-
-        reader = csv.DictReader(io.StringIO(texto), delimiter=delimitador)
+        # Se lee el archivo (ya en disco o en memoria según su tamaño) fila
+        # por fila o por record batches: nunca se tiene completo en memoria.
+        # El formato (CSV, NDJSON, gzip, Parquet, Arrow) se detecta solo.
+        await archivo.seek(0)
+        lector = LectorArchivo(archivo.file, delimitador, config.VALIDACION_LOTE)
 
         resultados = {
             "total": 0,
@@ -47,46 +84,26 @@ async def cargar_archivo(
             "errores": []  
         }
 
-        filas = list(reader)
-        resultados["total"] = len(filas)
-
-        for idx, fila in enumerate(filas, start=1):
-
-            errores = validar_persona(fila)
-            if errores:
-                resultados["errores"].append({
-                    "fila": idx,
-                    "motivo": errores
-                })
-                continue
-
-            # Verificar si ya existe
-            existente = await roble.obtener_persona(fila["nro_doc"], credentials.credentials)
-            if existente:
-                resultados["errores"].append({
-                    "fila": idx,
-                    "motivo": ["Documento ya existe"]
-                })
-                continue
-
-
-            try:
-                await roble.insertar_persona(fila, credentials.credentials)
+        def al_finalizar(idx, fila, motivos):
+            if motivos is None:
                 resultados["insertadas"] += 1
-                await _registrar_log(
-                    "CREAR",
-                    _extraer_email(credentials.credentials),
-                    fila.get("nro_doc"),
-                    f"Creada persona {fila.get('primer_nombre', '')} {fila.get('apellidos', '')}",
-                    credentials.credentials
-                )
-            except Exception as e:
-                resultados["errores"].append({
-                    "fila": idx,
-                    "motivo": [str(e)]
-                })
-                continue
+                return
+            resultados["errores"].append({
+                "fila": idx,
+                "motivo": motivos
+            })
 
+        try:
+            pipeline = await _cargar(enumerate(lector.filas(), start=1), credentials.credentials, email, al_finalizar)
+        finally:
+            # Se suelta el archivo sin cerrarlo: lo cierra FastAPI al terminar
+            lector.soltar()
+        resultados["total"] = pipeline.leidos
+        resultados["formato"] = lector.formato
+        resultados["rendimiento"] = pipeline.stats()
+
+        # Los errores se detectan por etapas: se deja el reporte en orden de fila
+        resultados["errores"].sort(key=lambda e: e["fila"])
         return resultados
 
     except Exception as e:
@@ -95,121 +112,143 @@ async def cargar_archivo(
             "msg": f"Error procesando archivo: {str(e)}"
         }
 
+async def _cargar(filas, token, email, al_finalizar, al_enviar=None, enviadas_previas=None):
+    """Pipeline de carga compartido por /cargar-archivo y las importaciones"""
+    async def auditar(fila):
+        # En cargas masivas se espera lugar en la cola en vez de descartar
+        await auditoria.encolar(
+            token, tipo_operacion="CREAR", usuario_email=email, documento_afectado=fila.get("nro_doc")
+        )
+
+    return await cargar_personas(
+        filas, roble, token, validador.validar, auditar, al_finalizar, al_enviar, enviadas_previas, fotos
+    )
+
+# ========== IMPORTACIONES EN SEGUNDO PLANO ==========
+# Para archivos grandes: se responde de inmediato con el id de la
+# importación y la carga continúa aunque el cliente se desconecte.
+
+importaciones = GestorImportaciones(
+    config.IMPORTACIONES_DIR,
+    config.IMPORTACIONES_MAX_ACTIVAS,
+    _cargar,
+    config.IMPORTACIONES_CHECKPOINT_SEGUNDOS,
+    config.VALIDACION_LOTE,
+)
+
+def _importacion(id_importacion: str, email: str):
+    try:
+        return importaciones.obtener(id_importacion, email)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+
+@app.post("/importaciones", status_code=202)
+async def crear_importacion(
+    delimitador: str = Form(...),
+    archivo: UploadFile = File(...),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
+):
+    try:
+        await archivo.seek(0)
+        importacion = await importaciones.crear(
+            archivo.file, archivo.filename, delimitador, email, credentials.credentials
+        )
+        return importacion.progreso()
+    except Exception as e:
+        logger.error(f"Error creando importación: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/importaciones")
+async def listar_importaciones(email: str = Depends(email_usuario)):
+    return {"importaciones": [i.progreso() for i in importaciones.listar(email)]}
+
+@app.get("/importaciones/{id_importacion}")
+async def progreso_importacion(id_importacion: str, email: str = Depends(email_usuario)):
+    return _importacion(id_importacion, email).progreso()
+
+@app.get("/importaciones/{id_importacion}/eventos")
+async def eventos_importacion(id_importacion: str, email: str = Depends(email_usuario)):
+    importacion = _importacion(id_importacion, email)
+    return StreamingResponse(
+        importaciones.eventos(
+            importacion,
+            config.IMPORTACIONES_EVENTOS_SEGUNDOS,
+            config.IMPORTACIONES_KEEPALIVE_SEGUNDOS,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/importaciones/{id_importacion}/errores")
+async def errores_importacion(id_importacion: str, email: str = Depends(email_usuario)):
+    try:
+        ruta = importaciones.ruta_errores(id_importacion, email)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="La importación no tiene filas rechazadas")
+    return FileResponse(ruta, media_type="text/csv", filename=f"errores-{id_importacion}.csv")
+
+@app.post("/importaciones/{id_importacion}/cancelar")
+async def cancelar_importacion(id_importacion: str, email: str = Depends(email_usuario)):
+    try:
+        importacion = await importaciones.cancelar(id_importacion, email)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return importacion.progreso()
+
+@app.post("/importaciones/{id_importacion}/reanudar", status_code=202)
+async def reanudar_importacion(
+    id_importacion: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
+):
+    try:
+        importacion = importaciones.reanudar(id_importacion, email, credentials.credentials)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return importacion.progreso()
+
 @app.post("/crear")
-async def crear_persona(request: CrearPersonaRequest, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def crear_persona(request: CrearPersonaRequest, credentials: HTTPAuthorizationCredentials = Depends(security),
+                            email: str = Depends(email_usuario)):
     try:
-        existente = await roble.obtener_persona(request.nro_doc, credentials.credentials)
-        if existente:
+        if await roble.existe_persona(request.nro_doc, credentials.credentials):
             raise HTTPException(status_code=409, detail="Documento ya registrado")
 
         persona_data = request.dict()
+        # A ROBLE solo va la referencia; la imagen queda en el almacén
+        if request.foto:
+            try:
+                persona_data["foto"] = await asyncio.to_thread(fotos.guardar_base64, request.foto)
+            except AlmacenLleno as e:
+                raise HTTPException(status_code=507, detail=str(e))
         resultado = await roble.insertar_persona(persona_data, credentials.credentials)
 
-        await _registrar_log("CREAR", _extraer_email(credentials.credentials), request.nro_doc,
+        _registrar_log("CREAR", email, request.nro_doc,
                              f"Creada persona {request.primer_nombre} {request.apellidos}",
                              credentials.credentials)
         return {"status": "success", "data": resultado}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metricas")
+async def metricas():
+    """Tiempos de ROBLE, almacén de fotos y contadores de la cola de auditoría"""
+    return {"roble_http": roble.http.stats(), "fotos": fotos.stats(), "auditoria": auditoria.stats()}
+
 @app.get("/health")
 async def health(): return {"status": "healthy", "service": "crear_persona"}
 
-async def _registrar_log(tipo, email, doc, desc, token):
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        async with httpx.AsyncClient(timeout=config.SERVICE_TIMEOUT) as client:
-            await client.post(
-                f"{config.LOGS_URL}/registrar",
-                json={
-                    "tipo_operacion": tipo,
-                    "usuario_email": email,
-                    "documento_afectado": doc,
-                },
-                headers=headers
-            )
-    except Exception as e:
-        logger.warning(f"No se registró log: {str(e)}")
-
-def _extraer_email(token):
-    try: return jwt.decode(token, options={"verify_signature": False}).get("email", "desconocido")
-    except: return "desconocido"
-
-
-import re
-import base64
-from datetime import datetime
-
-def validar_persona(fila):
-    errores = []
-
-    # ------------------------- CAMPOS OBLIGATORIOS -------------------------
-    obligatorios = [
-        "primer_nombre", "apellidos", "fecha_nacimiento", "genero",
-        "correo", "celular", "nro_doc", "tipo_doc"
-    ]
-    for campo in obligatorios:
-        if not fila.get(campo):
-            errores.append(f"{campo} es obligatorio")
-
-    # ------------------------- NOMBRES Y APELLIDOS -------------------------
-    def validar_texto(campo, valor, max_len):
-        if any(char.isdigit() for char in valor):
-            errores.append(f"{campo} no puede contener números")
-        if len(valor) > max_len:
-            errores.append(f"{campo} no puede superar {max_len} caracteres")
-
-    if fila.get("primer_nombre"):
-        validar_texto("primer_nombre", fila["primer_nombre"], 30)
-
-    if fila.get("segundo_nombre"):
-        validar_texto("segundo_nombre", fila["segundo_nombre"], 30)
-
-    if fila.get("apellidos"):
-        validar_texto("apellidos", fila["apellidos"], 60)
-
-    # ------------------------- FECHA NACIMIENTO -------------------------
-    # Formato dd-mmm  (01-ene, 12-feb, 03-dic)
-
-    if fila.get("fecha_nacimiento"):
-        try:
-            datetime.strptime(fila["fecha_nacimiento"], "%Y-%m-%d")
-        except ValueError:
-            errores.append("fecha_nacimiento inválida (YYYY-MM-DD)")
-
-    # ------------------------- GÉNERO -------------------------
-    generos_validos = ["Masculino", "Femenino", "No binario", "Prefiero no reportar"]
-
-    if fila.get("genero") and fila["genero"] not in generos_validos:
-        errores.append(f"género inválido. Debe ser uno de: {', '.join(generos_validos)}")
-
-    # ------------------------- EMAIL -------------------------
-    if fila.get("correo") and not re.match(r"^[^@]+@[^@]+\.[^@]+$", fila["correo"]):
-        errores.append("correo inválido")
-
-    # ------------------------- CELULAR -------------------------
-    if fila.get("celular") and not re.match(r"^\d{10}$", fila["celular"]):
-        errores.append("celular inválido (debe tener 10 dígitos numéricos)")
-
-    # ------------------------- DOCUMENTO -------------------------
-    # Debe ser número, máximo 10 dígitos
-    if fila.get("nro_doc") and not re.match(r"^\d{1,10}$", fila["nro_doc"]):
-        errores.append("nro_doc debe ser numérico y máximo 10 dígitos")
-
-    # ------------------------- TIPO DOCUMENTO -------------------------
-    tipos_validos = ["Tarjeta de identidad", "Cédula"]
-
-    if fila.get("tipo_doc") and fila["tipo_doc"] not in tipos_validos:
-        errores.append(f"tipo_doc inválido. Valores permitidos: {', '.join(tipos_validos)}")
-
-    # ------------------------- FOTO BASE64 (≤ 2MB) -------------------------
-    if fila.get("foto"):
-        try:
-            data = base64.b64decode(fila["foto"])
-            if len(data) > 2 * 1024 * 1024:  # 2 MB
-                errores.append("foto supera los 2MB")
-        except Exception:
-            errores.append("foto no es base64 válido")
+def _registrar_log(tipo, email, doc, desc, token):
+    # Se encola y se envía en segundo plano: no retrasa la respuesta
+    auditoria.emitir(token, tipo_operacion=tipo, usuario_email=email, documento_afectado=doc)
 
-    return errores
@@ -2,15 +2,31 @@ from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional
-import httpx, logging, jwt
+import logging
+from contextlib import asynccontextmanager
 from comun.roble_db import RobleDB
 from comun.config import config
+from compartido.identidad import email_usuario
+from compartido.auditoria import EmisorAuditoria
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-app = FastAPI(title="Servicio Modificar Persona")
-security = HTTPBearer()
 roble = RobleDB()
+auditoria = EmisorAuditoria(
+    config.LOGS_URL, config.SERVICE_TIMEOUT, config.AUDITORIA_CAPACIDAD_COLA, config.AUDITORIA_LOTE,
+    config.AUDITORIA_SEGUNDOS_LOTE, config.AUDITORIA_CONCURRENCIA, config.AUDITORIA_SEGUNDOS_DRENAJE,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await roble.http.iniciar()
+    await auditoria.iniciar()
+    yield
+    await auditoria.cerrar()
+    await roble.http.cerrar()
+
+app = FastAPI(title="Servicio Modificar Persona", lifespan=lifespan)
+security = HTTPBearer()
 
 class ModificarPersonaRequest(BaseModel):
     primer_nombre: Optional[str] = None
@@ -25,7 +41,8 @@ class ModificarPersonaRequest(BaseModel):
 async def modificar_persona(
     nro_doc: str,
     request: ModificarPersonaRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    email: str = Depends(email_usuario)
 ):
     try:
         existente = await roble.obtener_persona(nro_doc, credentials.credentials)
@@ -37,9 +54,9 @@ async def modificar_persona(
             raise HTTPException(status_code=400, detail="No hay campos para actualizar")
         resultado = await roble.actualizar_persona(nro_doc, updates, credentials.credentials)
 
-        await _registrar_log(
+        _registrar_log(
             tipo="MODIFICAR",
-            email=_extraer_email(credentials.credentials),
+            email=email,
             doc=nro_doc,
             desc=f"Campos modificados: {', '.join(updates.keys())}",
             token=credentials.credentials,
@@ -55,27 +72,21 @@ async def modificar_persona(
         logger.error(f"Error modificando persona: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def _registrar_log(tipo, email, doc, desc, token, datos_anteriores=None, datos_nuevos=None):
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        payload = {
-            "tipo_operacion": tipo,
-            "usuario_email": email,
-            "documento_afectado": doc,
-            "datos_anteriores": datos_anteriores,
-            "datos_nuevos": datos_nuevos,
-        }
-
-        async with httpx.AsyncClient(timeout=config.SERVICE_TIMEOUT) as client:
-            await client.post(f"{config.LOGS_URL}/registrar", json=payload, headers=headers)
+def _registrar_log(tipo, email, doc, desc, token, datos_anteriores=None, datos_nuevos=None):
+    # Se encola y se envía en segundo plano: no retrasa la respuesta
+    auditoria.emitir(
+        token,
+        tipo_operacion=tipo,
+        usuario_email=email,
+        documento_afectado=doc,
+        datos_anteriores=datos_anteriores,
+        datos_nuevos=datos_nuevos,
+    )
 
-    except Exception as e:
-        logger.warning(f"No se registró log: {str(e)}")
-def _extraer_email(token):
-    try:
-        return jwt.decode(token, options={"verify_signature": False}).get("email", "desconocido")
-    except:
-        return "desconocido"
+@app.get("/metricas")
+async def metricas():
+    """Tiempos de ROBLE y contadores de la cola de auditoría"""
+    return {"roble_http": roble.http.stats(), "auditoria": auditoria.stats()}
 
 @app.get("/health")
 async def health(): return {"status": "healthy", "service": "modificar_persona"}
\ No newline at end of file
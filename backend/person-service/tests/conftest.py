@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Mismo sys.path que arman los servicios: `comun` y los módulos del servicio
+RAIZ = os.path.join(os.path.dirname(__file__), "..")
+sys.path.append(RAIZ)
+sys.path.append(os.path.join(RAIZ, "crear_service"))
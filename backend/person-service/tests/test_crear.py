@@ -0,0 +1,43 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from compartido.identidad import email_usuario
+
+PERSONA = {
+    "primer_nombre": "Ana", "apellidos": "Peña", "fecha_nacimiento": "1990-01-01",
+    "genero": "Femenino", "correo": "ana@correo.com", "celular": "3001234567",
+    "nro_doc": "1234567890", "tipo_doc": "Cédula",
+}
+
+
+@pytest.fixture
+def insertadas(tmp_path, monkeypatch):
+    insertadas = []
+
+    async def existe_persona(nro_doc, token):
+        return False
+
+    async def insertar_persona(persona, token):
+        insertadas.append(persona)
+        return persona
+
+    monkeypatch.setattr(main.roble, "existe_persona", existe_persona)
+    monkeypatch.setattr(main.roble, "insertar_persona", insertar_persona)
+    monkeypatch.setattr(main.fotos, "directorio", str(tmp_path))
+    monkeypatch.setattr(main, "_registrar_log", lambda *args: None)
+    main.app.dependency_overrides[email_usuario] = lambda: "a@x"
+    yield insertadas
+    main.app.dependency_overrides.clear()
+
+
+def test_crear_sin_foto_no_guarda_nada_en_el_almacen(insertadas, tmp_path):
+    respuesta = TestClient(main.app).post(
+        "/crear", json={**PERSONA, "foto": ""}, headers={"Authorization": "Bearer tok"}
+    )
+
+    assert respuesta.status_code == 200
+    assert insertadas[0]["foto"] == ""
+    assert os.listdir(tmp_path) == []
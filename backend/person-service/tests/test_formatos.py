@@ -0,0 +1,98 @@
+import base64
+import io
+import tracemalloc
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from formatos import CSV, PARQUET, LectorArchivo
+
+MB = 1024 * 1024
+
+COLUMNAS = ["tipo_doc", "nro_doc", "primer_nombre", "apellidos", "fecha_nacimiento", "genero", "correo", "celular", "foto"]
+# Fila de ~3 KB, como una persona con foto en base64; los acentos prueban
+# que el decodificador incremental no corta caracteres multibyte entre lecturas
+FOTO = "iVBORw0KGgo" * 270
+
+
+def _escribir_csv(ruta, tamano):
+    """CSV con BOM de al menos `tamano` bytes, escrito por partes; devuelve las filas"""
+    filas = 0
+    escritos = 0
+    with open(ruta, "wb") as f:
+        parte = ["\ufeff" + ",".join(COLUMNAS) + "\r\n"]
+        while escritos < tamano:
+            parte.append(
+                f"Cédula,{1000000 + filas},José Ñandú,Peña Güell,1990-01-01,Masculino,"
+                f"p{filas}@correo.com,3001234567,{FOTO}\r\n"
+            )
+            filas += 1
+            if len(parte) == 1000:
+                datos = "".join(parte).encode("utf-8")
+                f.write(datos)
+                escritos += len(datos)
+                parte = []
+        if parte:
+            f.write("".join(parte).encode("utf-8"))
+    return filas
+
+
+def _medir(ruta):
+    """(columnas, filas leídas, última fila, pico de memoria) de leer el CSV como la carga masiva"""
+    with open(ruta, "rb") as archivo:
+        tracemalloc.start()
+        try:
+            lector = LectorArchivo(archivo, ",", 1000)
+            assert lector.formato == CSV
+            filas = 0
+            ultima = None
+            for ultima in lector.filas():
+                filas += 1
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            lector.soltar()
+    return lector.columnas, filas, ultima, pico
+
+
+def test_csv_memoria_acotada(tmp_path):
+    ruta_pequena = tmp_path / "pequena.csv"
+    ruta_grande = tmp_path / "grande.csv"
+    _escribir_csv(ruta_pequena, 10 * MB)
+    esperadas = _escribir_csv(ruta_grande, 300 * MB)
+
+    _, _, _, pico_pequena = _medir(ruta_pequena)
+    columnas, filas, ultima, pico_grande = _medir(ruta_grande)
+    ruta_grande.unlink()
+
+    # El BOM no queda pegado al nombre de la primera columna
+    assert columnas == COLUMNAS
+    assert filas == esperadas
+    assert ultima["nro_doc"] == str(1000000 + esperadas - 1)
+    assert ultima["primer_nombre"] == "José Ñandú"
+    assert ultima["foto"] == FOTO
+    # 30 veces más datos, el mismo pico: el archivo se lee fila a fila
+    assert pico_grande < pico_pequena + 1 * MB
+    assert pico_grande < 2 * MB
+
+
+def test_parquet_como_textos():
+    n = 2500
+    tabla = pa.table({
+        "nro_doc": pa.array([str(i) if i % 7 else None for i in range(n)]),
+        "nombre": pa.array([f"Ana\x1f{i}" for i in range(n)]).dictionary_encode(),
+        "edad": pa.array(range(n), pa.int32()),
+        "foto": pa.array([bytes([i % 256]) * 3 for i in range(n)], pa.binary()),
+    })
+    buffer = io.BytesIO()
+    pq.write_table(tabla, buffer, row_group_size=1000)
+    buffer.seek(0)
+
+    lector = LectorArchivo(buffer, ",", 300)
+    filas = [dict(fila) for fila in lector.filas()]
+
+    assert lector.formato == PARQUET
+    assert len(filas) == n
+    assert filas[7] == {"nro_doc": None, "nombre": "Ana\x1f7", "edad": "7", "foto": base64.b64encode(b"\x07" * 3).decode()}
+    assert [f["nro_doc"] for f in filas[998:1001]] == ["998", "999", "1000"]
+    assert filas[-1]["edad"] == str(n - 1)
@@ -0,0 +1,30 @@
+import os
+import threading
+import time
+
+from comun import fotos
+from comun.fotos import AlmacenFotos
+
+
+def test_misma_foto_en_paralelo_cuenta_una_vez(tmp_path, monkeypatch):
+    escribir = fotos._escribir
+
+    def lento(ruta, datos):
+        # Todos los hilos llegan mientras la primera escritura sigue en curso
+        time.sleep(0.05)
+        escribir(ruta, datos)
+
+    monkeypatch.setattr(fotos, "_escribir", lento)
+    almacen = AlmacenFotos(str(tmp_path), max_bytes_total=10_000)
+    datos = os.urandom(1000)
+
+    referencias = []
+    hilos = [threading.Thread(target=lambda: referencias.append(almacen.guardar(datos))) for _ in range(16)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(set(referencias)) == 1 and len(referencias) == 16
+    assert almacen.stats() == {"bytes_total": 1000, "guardadas": 1, "deduplicadas": 15}
+    assert os.path.isfile(almacen.ruta(fotos.hash_de(referencias[0])))
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from compartido.roble_http import RobleAuthError, RobleHTTPError, RobleNoEncontrado
+from comun.roble_db import RobleDB
+
+
+class RobleFalso:
+    """ROBLE /read por nro_doc: `existentes` responden con la fila, el resto con `error`"""
+
+    def __init__(self, existentes, error):
+        self.existentes = existentes
+        self.error = error
+
+    async def json(self, method, url, token=None, params=None, **kwargs):
+        if params["nro_doc"] in self.existentes:
+            return [{"nro_doc": params["nro_doc"]}]
+        raise self.error
+
+
+def _existentes(error, docs=("1", "2", "3")):
+    roble = RobleDB()
+    roble.http = RobleFalso({"2"}, error)
+    return asyncio.run(roble.documentos_existentes(docs, "tok"))
+
+
+def test_documentos_existentes_con_404():
+    assert _existentes(RobleNoEncontrado(404, "sin datos")) == {"2"}
+
+
+@pytest.mark.parametrize("error", [RobleAuthError(401, "token vencido"), RobleHTTPError(503, "caído")])
+def test_documentos_existentes_no_lee_un_error_como_nuevo(error):
+    # Leerlo como "no existe" insertaría las filas duplicadas
+    with pytest.raises(type(error)):
+        _existentes(error)
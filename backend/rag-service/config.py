@@ -1,12 +1,14 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import List, Optional
 class Config(BaseSettings):
     """Configuración del servicio RAG con Google Gemini"""
 
     # ========== ROBLE API ==========
     ROBLE_API_URL: str = Field(default="https://roble-api.openlab.uninorte.edu.co")
     ROBLE_DB_NAME: str = Field(default="diseo_de_software_ii_908c0f07a5")
+    # Parámetro de /read para pedir solo ciertas columnas, si ROBLE lo soporta
+    ROBLE_CAMPOS_PARAM: Optional[str] = None
 
     @property
     def ROBLE_DATABASE_URL(self) -> str:
@@ -19,14 +21,38 @@ class Config(BaseSettings):
     # ========== SERVICIOS ==========
     LOGS_URL:  Optional[str] = None
 
+    # ========== AUDITORÍA ==========
+    # Los eventos se encolan y se envían al servicio de logs en segundo
+    # plano, por lotes de AUDITORIA_LOTE o cada AUDITORIA_SEGUNDOS_LOTE. Con
+    # la cola llena se descartan (y se cuentan en /metricas)
+    AUDITORIA_CAPACIDAD_COLA: int = Field(default=10000)
+    AUDITORIA_LOTE: int = Field(default=500)
+    AUDITORIA_SEGUNDOS_LOTE: float = Field(default=0.5)
+    AUDITORIA_CONCURRENCIA: int = Field(default=8)
+    # Espera máxima al apagar para enviar lo que quede en la cola
+    AUDITORIA_SEGUNDOS_DRENAJE: float = Field(default=5.0)
+
     # ========== TIMEOUTS ==========
     ROBLE_TIMEOUT:  Optional[int] = None
     GOOGLE_TIMEOUT:  Optional[int] = None
     SERVICE_TIMEOUT:  Optional[int] = None
 
+    # ========== POOL ROBLE ==========
+    ROBLE_POOL_MAX_CONNECTIONS: int = Field(default=50)
+    ROBLE_POOL_MAX_KEEPALIVE: int = Field(default=20)
+    # Reintentos de lecturas ante errores de red o 502/503/504
+    ROBLE_REINTENTOS: int = Field(default=2)
+
     # ========== TABLAS ROBLE ==========
     TABLA_PERSONAS: Optional[str] = None
 
+    # ========== CONTEXTO RAG ==========
+    # Columnas que usa el contexto del modelo (sin foto)
+    RAG_CAMPOS_CONTEXTO: List[str] = Field(default=[
+        "primer_nombre", "segundo_nombre", "apellidos", "tipo_doc", "nro_doc",
+        "fecha_nacimiento", "genero", "correo", "celular",
+    ])
+
     # ========== LOGGING ==========
     DEBUG: bool = Field(default=False)
 
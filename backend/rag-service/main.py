@@ -1,19 +1,17 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 import logging
-import jwt
-import httpx
 from rag import RAGManager
 from roble_rag import RobleRAGClient
 from config import config
+from compartido.identidad import email_usuario
+from compartido.auditoria import EmisorAuditoria
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Servicio de Consulta RAG - Google Gemini")
-security = HTTPBearer()
-
 # Inicializar con manejo de errores
 try:
     rag_manager = RAGManager()
@@ -24,6 +22,25 @@ except Exception as e:
     rag_manager = None
     roble_client = None
 
+auditoria = EmisorAuditoria(
+    config.LOGS_URL, config.SERVICE_TIMEOUT, config.AUDITORIA_CAPACIDAD_COLA, config.AUDITORIA_LOTE,
+    config.AUDITORIA_SEGUNDOS_LOTE, config.AUDITORIA_CONCURRENCIA, config.AUDITORIA_SEGUNDOS_DRENAJE,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if roble_client is not None:
+        await roble_client.http.iniciar()
+    await auditoria.iniciar()
+    yield
+    await auditoria.cerrar()
+    if roble_client is not None:
+        await roble_client.http.cerrar()
+
+app = FastAPI(title="Servicio de Consulta RAG - Google Gemini", lifespan=lifespan)
+security = HTTPBearer()
+
 
 # ========== MODELOS ==========
 
@@ -36,7 +53,8 @@ class ConsultaRAGRequest(BaseModel):
 
 @app.post("/consultar")
 async def consultar_rag(request: ConsultaRAGRequest,
-                       credentials: HTTPAuthorizationCredentials = Depends(security)):
+                       credentials: HTTPAuthorizationCredentials = Depends(security),
+                       email: str = Depends(email_usuario)):
     """Responde preguntas en lenguaje natural usando RAG + Gemini"""
     try:
         logger.info(f"Pregunta RAG recibida: {request.pregunta}")
@@ -74,10 +92,10 @@ async def consultar_rag(request: ConsultaRAGRequest,
             contexto_datos=personas
         )
         
-        # Registrar en logs
-        await _registrar_log(
+        # Registrar en logs (en segundo plano)
+        _registrar_log(
             tipo_operacion="CONSULTAR_RAG",
-            usuario_email=_extraer_email(credentials.credentials),
+            usuario_email=email,
             pregunta_rag=f"Pregunta: {request.pregunta}",
             respuesta_rag=respuesta,
             token=credentials.credentials          
@@ -114,6 +132,18 @@ async def health_check():
     }
 
 
+@app.get("/metricas")
+async def metricas():
+    """Lecturas de contexto a ROBLE realizadas y colapsadas, tiempos por operación y cola de auditoría"""
+    if roble_client is None:
+        return {"auditoria": auditoria.stats()}
+    return {
+        "roble_singleflight": roble_client.singleflight.stats(),
+        "roble_http": roble_client.http.stats(),
+        "auditoria": auditoria.stats(),
+    }
+
+
 @app.get("/info")
 async def info():
     """Información del servicio RAG"""
@@ -128,29 +158,12 @@ async def info():
 
 # ========== FUNCIONES AUXILIARES ==========
 
-async def _registrar_log(tipo_operacion: str, usuario_email: str, pregunta_rag: str, respuesta_rag: str,token):
-    """Registra operación en servicio de logs"""
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        async with httpx.AsyncClient(timeout=config.SERVICE_TIMEOUT) as client:
-            await client.post(
-                f"{config.LOGS_URL}/registrar",
-                json={
-                    "tipo_operacion": tipo_operacion,
-                    "usuario_email": usuario_email,
-                    "pregunta_rag": pregunta_rag,
-                    "respuesta_rag": respuesta_rag
-                },
-                headers=headers
-            )
-    except Exception as e:
-        logger.warning(f"No se pudo registrar en log: {str(e)}")
-
-
-def _extraer_email(token: str) -> str:
-    """Extrae email del token JWT"""
-    try:
-        payload = jwt.decode(token, options={"verify_signature": False})
-        return payload.get("email", "desconocido")
-    except:
-        return "desconocido"
\ No newline at end of file
+def _registrar_log(tipo_operacion: str, usuario_email: str, pregunta_rag: str, respuesta_rag: str,token):
+    """Encola la operación para el servicio de logs (se envía en segundo plano)"""
+    auditoria.emitir(
+        token,
+        tipo_operacion=tipo_operacion,
+        usuario_email=usuario_email,
+        pregunta_rag=pregunta_rag,
+        respuesta_rag=respuesta_rag,
+    )
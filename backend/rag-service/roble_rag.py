@@ -1,6 +1,9 @@
-import httpx
 import logging
 from config import config
+from compartido.singleflight import SingleFlight
+from compartido.json_stream import iterar_array_json
+from compartido.proyeccion import proyectar, params_lectura
+from compartido.roble_http import RobleClient, RobleHTTPError
 
 logger = logging.getLogger(__name__)
 
@@ -10,31 +13,39 @@ class RobleRAGClient:
     
     def __init__(self):
         self.base_url = config.ROBLE_DATABASE_URL
-        self.timeout = config.ROBLE_TIMEOUT
+        # Pool compartido por todas las llamadas del proceso
+        self.http = RobleClient(
+            base_url=self.base_url,
+            timeout=config.ROBLE_TIMEOUT,
+            max_conexiones=config.ROBLE_POOL_MAX_CONNECTIONS,
+            max_keepalive=config.ROBLE_POOL_MAX_KEEPALIVE,
+            reintentos=config.ROBLE_REINTENTOS,
+        )
+        # Consultas concurrentes del mismo token comparten la lectura
+        self.singleflight = SingleFlight()
         logger.info(f"RobleRAGClient inicializado")
     
     async def obtener_todas_personas(self, token: str) -> list:
         """Obtiene todas las personas para el contexto de RAG"""
+        return await self.singleflight.do(token, lambda: self._obtener_todas_personas(token))
+
+    async def _obtener_todas_personas(self, token: str) -> list:
+        logger.debug("Obteniendo todas las personas")
+
+        campos = config.RAG_CAMPOS_CONTEXTO
+        params = params_lectura({"tableName": config.TABLA_PERSONAS}, campos, config.ROBLE_CAMPOS_PARAM)
+
         try:
-            logger.debug("Obteniendo todas las personas")
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    f"{self.base_url}/read",
-                    params={"tableName": config.TABLA_PERSONAS},
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code not in [200, 201]:
-                    logger.warning(f"No se encontraron personas: {response.status_code}")
-                    return []
-                
-                datos = response.json()
-                logger.info(f"Se obtuvieron {len(datos) if isinstance(datos, list) else 1} personas")
-                
-                return datos if isinstance(datos, list) else [datos]
-                
-        except httpx.RequestError as e:
-            logger.error(f"Error conectando a ROBLE: {str(e)}")
-            raise Exception(f"Error conectando a ROBLE: {str(e)}")
+            async with self.http.stream("GET", "/read", token, params=params) as response:
+                # Se proyecta mientras se decodifica: la foto de cada
+                # persona no se acumula en memoria
+                datos = [
+                    proyectar(persona, campos)
+                    async for persona in iterar_array_json(response.aiter_bytes())
+                ]
+        except RobleHTTPError as e:
+            logger.warning(f"No se encontraron personas: {e.status_code}")
+            return []
 
+        logger.info(f"Se obtuvieron {len(datos)} personas")
+        return datos
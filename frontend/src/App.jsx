@@ -4,6 +4,41 @@ import { LogOut, Plus, Edit2, Search, Trash2, FileText, AlertCircle, CheckCircle
 const API_URL = '';
 
 const PLACEHOLDER_IMAGE = "data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='200' height='200' viewBox='0 0 200 200'%3E%3Crect width='200' height='200' fill='%23f8fafc'/%3E%3Cpath d='M100 85c-13.8 0-25 11.2-25 25s11.2 25 25 25 25-11.2 25-25-11.2-25-25-25zm0 40c-8.3 0-15-6.7-15-15s6.7-15 15-15 15 6.7 15 15-6.7 15-15 15z' fill='%23cbd5e1'/%3E%3Cpath d='M140 150c0-22.1-17.9-40-40-40s-40 17.9-40 40v10h80v-10z' fill='%23cbd5e1'/%3E%3C/svg%3E";
+
+const esFotoAlmacen = (foto) => Boolean(foto) && foto.startsWith('/personas/fotos/');
+
+// Las fotos del almacén se piden como miniatura donde se muestran pequeñas
+const miniaturaFoto = (foto, ancho) =>
+  esFotoAlmacen(foto) ? `${foto}?ancho=${ancho}` : foto;
+
+// Las fotos del almacén piden token: se descargan con fetch y se muestran
+// como blob. Las que siguen en línea (base64) se muestran directamente.
+const FotoPersona = ({ foto, token, ...props }) => {
+  const [src, setSrc] = useState(esFotoAlmacen(foto) ? PLACEHOLDER_IMAGE : (foto || PLACEHOLDER_IMAGE));
+
+  useEffect(() => {
+    if (!esFotoAlmacen(foto)) {
+      setSrc(foto || PLACEHOLDER_IMAGE);
+      return;
+    }
+    let url = null;
+    let cancelado = false;
+    fetch(`${API_URL}${foto}`, { headers: { 'Authorization': `Bearer ${token}` } })
+      .then((response) => (response.ok ? response.blob() : Promise.reject(response.status)))
+      .then((blob) => {
+        if (cancelado) return;
+        url = URL.createObjectURL(blob);
+        setSrc(url);
+      })
+      .catch(() => { if (!cancelado) setSrc(PLACEHOLDER_IMAGE); });
+    return () => {
+      cancelado = true;
+      if (url) URL.revokeObjectURL(url);
+    };
+  }, [foto, token]);
+
+  return <img src={src} {...props} />;
+};
 // NUEVO COMPONENTE - Agregar después de PLACEHOLDER_IMAGE y antes de validaciones
 const LogDetailRow = ({ log }) => {
   const [isExpanded, setIsExpanded] = useState(false);
@@ -1177,19 +1212,19 @@ export default function App() {
 
   const fetchStats = async () => {
     try {
-      const response = await fetch(`${API_URL}/logs?`, {
+      const response = await fetch(`${API_URL}/logs/estadisticas?granularidad=dia&detalle=false`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       const data = await response.json();
-      if (response.ok && data.data) {
-        const logsData = Array.isArray(data.data) ? data.data : [];
+      if (response.ok && data.totales) {
+        const totales = data.totales;
         setStats({
-          total: logsData.length,
-          created: logsData.filter(l => l.tipo_operacion === 'CREAR').length,
-          modified: logsData.filter(l => l.tipo_operacion === 'MODIFICAR').length,
-          consulted: logsData.filter(l => l.tipo_operacion === 'CONSULTAR').length,
-          consultedRag: logsData.filter(l => l.tipo_operacion === 'CONSULTAR_RAG').length,
-          deleted: logsData.filter(l => l.tipo_operacion === 'ELIMINAR').length
+          total: data.total || 0,
+          created: totales.CREAR || 0,
+          modified: totales.MODIFICAR || 0,
+          consulted: totales.CONSULTAR || 0,
+          consultedRag: totales.CONSULTAR_RAG || 0,
+          deleted: totales.ELIMINAR || 0
         });
       }
     } catch (error) {
@@ -1637,6 +1672,8 @@ export default function App() {
       const params = new URLSearchParams();
       if (filtroLogs.tipo_operacion) params.append('tipo_operacion', filtroLogs.tipo_operacion);
       if (filtroLogs.documento) params.append('documento', filtroLogs.documento);
+      if (filtroLogs.fecha_desde) params.append('fecha_desde', filtroLogs.fecha_desde);
+      if (filtroLogs.fecha_hasta) params.append('fecha_hasta', filtroLogs.fecha_hasta);
 
       const response = await fetch(`${API_URL}/logs?${params}`, {
         headers: { 'Authorization': `Bearer ${token}` }
@@ -2512,9 +2549,10 @@ export default function App() {
                     {todasLasPersonas.map((persona, idx) => (
                       <tr key={idx} className="border-b border-slate-200 hover:bg-blue-50 transition-all duration-300">
                         <td className="p-4">
-                          <img 
-                            src={persona.foto || PLACEHOLDER_IMAGE} 
-                            alt="Foto" 
+                          <FotoPersona
+                            foto={miniaturaFoto(persona.foto, 128)}
+                            token={token}
+                            alt="Foto"
                             className="w-16 h-16 rounded-lg object-cover border-2 border-slate-200 shadow-sm"
                             onError={(e) => { e.target.src = PLACEHOLDER_IMAGE; }}
                           />
@@ -2557,9 +2595,10 @@ export default function App() {
             <Card title="Información de la Persona" icon={User}>
               <div className="bg-blue-50 p-6 rounded-xl mb-6 border-2 border-blue-200 transition-all duration-300 hover:bg-blue-100">
                 <div className="flex items-start gap-6">
-                  <img 
-                    src={personaConsultada.foto || PLACEHOLDER_IMAGE} 
-                    alt="Foto de perfil" 
+                  <FotoPersona
+                    foto={personaConsultada.foto}
+                    token={token}
+                    alt="Foto de perfil"
                     className="w-32 h-32 rounded-xl object-cover border-4 border-white shadow-md transition-all duration-300 hover:scale-105"
                     onError={(e) => { e.target.src = PLACEHOLDER_IMAGE; }}
                   />
@@ -2665,9 +2704,10 @@ export default function App() {
               <Card title="Datos Actuales" icon={User}>
                 <div className="bg-amber-50 p-6 rounded-xl transition-all duration-300 hover:bg-amber-100">
                   <div className="flex items-start gap-6">
-                    <img 
-                      src={personaConsultada.foto || PLACEHOLDER_IMAGE} 
-                      alt="Foto de perfil" 
+                    <FotoPersona
+                      foto={personaConsultada.foto}
+                      token={token}
+                      alt="Foto de perfil"
                       className="w-24 h-24 rounded-xl object-cover border-4 border-white shadow-md transition-all duration-300 hover:scale-105"
                       onError={(e) => { e.target.src = PLACEHOLDER_IMAGE; }}
                     />
@@ -2844,9 +2884,10 @@ export default function App() {
                 </div>
                 <div className="space-y-3 bg-white p-4 rounded-lg transition-all duration-300 hover:bg-slate-50">
                   <div className="flex justify-center mb-4">
-                    <img 
-                      src={personaConsultada.foto || PLACEHOLDER_IMAGE} 
-                      alt="Foto de perfil" 
+                    <FotoPersona
+                      foto={personaConsultada.foto}
+                      token={token}
+                      alt="Foto de perfil"
                       className="w-24 h-24 rounded-xl object-cover border-4 border-slate-200 shadow-md transition-all duration-300 hover:scale-105"
                       onError={(e) => { e.target.src = PLACEHOLDER_IMAGE; }}
                     />